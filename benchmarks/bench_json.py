@@ -0,0 +1,46 @@
+"""
+Compare the JSON codecs the connection can use (see openstack.api.codecs)
+on a large ``/servers/detail`` payload.
+
+Usage: python benchmarks/bench_json.py [megabytes] [repeat]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from openstack.api.codecs import available_codecs, get_codec
+from payloads import servers_of_size
+
+
+def best_of(repeat, fn, *args):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        fn(*args)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main(argv):
+    megabytes = float(argv and argv[0] or 10)
+    repeat = int(argv[1:] and argv[1] or 5)
+    body, encoded = servers_of_size(megabytes, get_codec('stdlib'))
+    size = len(encoded) / (1024.0 * 1024.0)
+    print "%d servers, %.1f MB encoded, best of %d" % (
+        len(body['servers']), size, repeat)
+    print "%-12s %14s %14s" % ('codec', 'decode ms/MB', 'encode ms/MB')
+    for name in available_codecs():
+        codec = get_codec(name)
+        decode = best_of(repeat, codec.loads, encoded)
+        encode = best_of(repeat, codec.dumps, body)
+        print "%-12s %14.1f %14.1f" % (name, decode * 1000 / size,
+                                       encode * 1000 / size)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,245 @@
+"""
+A local stand-in for the Compute API, for benchmarking the client without
+a real cloud.
+
+It answers authentication, ``/limits``, server listings (with the
+``limit``/``marker``, ``name`` and ``status`` query parameters), single
+servers, server actions and deletes, with configurable latency, number of
+servers and error rate. Responses are gzipped when the client asks.
+
+Usage: python benchmarks/fakeserver.py [--port PORT] [--servers N]
+                                        [--latency MS] [--error-rate FRACTION]
+"""
+
+import BaseHTTPServer
+import SocketServer
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import urlparse
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from openstack.api.codecs import get_codec
+from payloads import server
+
+ACCOUNT = '123456'
+
+
+class FakeAPI(object):
+    """
+    The fake API's state and settings, shared by every request handler.
+
+    :param servers: How many servers the account has.
+    :param latency: Seconds to wait before answering each request.
+    :param error_rate: The fraction of requests (other than authentication)
+                       to answer with a ``503``, which the client can retry.
+    :param max_limit: The most servers to list at once, whatever ``limit``
+                      the client asks for, like Nova's ``osapi_max_limit``.
+    """
+    def __init__(self, servers=1000, latency=0, error_rate=0, seed=None,
+                 max_limit=1000):
+        self.latency = latency
+        self.max_limit = max_limit
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.codec = get_codec()
+        self.tokens = 0
+        self._lock = threading.Lock()
+        self.set_servers(servers)
+
+    def set_servers(self, n):
+        # Encode each server once up front, so that listing 100,000 of
+        # them is a string join rather than a benchmark of the server.
+        self.servers = [server(i) for i in xrange(n)]
+        self.encoded = [self.codec.dumps(s) for s in self.servers]
+
+    def new_token(self):
+        self._lock.acquire()
+        try:
+            self.tokens += 1
+            return 'token-%d' % self.tokens
+        finally:
+            self._lock.release()
+
+    def should_fail(self):
+        self._lock.acquire()
+        try:
+            return self.random.random() < self.error_rate
+        finally:
+            self._lock.release()
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send each response in one go, rather than a write per header line,
+    # so that Nagle's algorithm doesn't add delays of its own.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _handle(self, method):
+        api = self.server.api
+        length = int(self.headers.get('content-length') or 0)
+        if length:
+            self.rfile.read(length)
+        if api.latency:
+            time.sleep(api.latency)
+
+        url = urlparse.urlsplit(self.path)
+        path = url.path.rstrip('/')
+        query = dict(urlparse.parse_qsl(url.query))
+        if path == '/v1.0':
+            return self._auth()
+        prefix = '/v1.0/%s' % ACCOUNT
+        if not path.startswith(prefix):
+            return self._error(404, 'itemNotFound', 'No such URL.')
+        path = path[len(prefix):]
+        if api.should_fail():
+            return self._error(503, 'serviceUnavailable', 'Try again.',
+                               {'Retry-After': '0'})
+
+        parts = path.strip('/').split('/')
+        if method == 'GET' and path == '/limits':
+            return self._send(200, api.codec.dumps({'limits': {
+                'rate': [], 'absolute': {'maxTotalRAMSize': 51200}}}))
+        if method == 'GET' and path in ('/servers', '/servers/detail'):
+            return self._list(query, detail=path.endswith('detail'))
+        if parts[0] == 'servers' and len(parts) >= 2 and parts[1].isdigit():
+            i = int(parts[1])
+            if i >= len(api.servers):
+                return self._error(404, 'itemNotFound', 'No such server.')
+            if method == 'GET' and len(parts) == 2:
+                return self._send(200, '{"server": %s}' % api.encoded[i])
+            if method in ('POST', 'PUT', 'DELETE'):
+                return self._send(202 if method != 'PUT' else 204, '')
+        self._error(404, 'itemNotFound', 'No such URL.')
+
+    def _auth(self):
+        api = self.server.api
+        management_url = 'http://%s:%d/v1.0/%s' % (
+            self.server.server_address + (ACCOUNT,))
+        self._send(204, '', {
+            'X-Auth-Token': api.new_token(),
+            'X-Server-Management-Url': management_url,
+        })
+
+    def _list(self, query, detail):
+        api = self.server.api
+        start = 0
+        if 'marker' in query:
+            start = int(query['marker']) + 1
+        end = len(api.servers)
+        if 'name' in query or 'status' in query:
+            indexes = [i for i in xrange(start, end)
+                       if query.get('name', '') in api.servers[i]['name'] and
+                          query.get('status',
+                                    api.servers[i]['status']) ==
+                              api.servers[i]['status']]
+            indexes = indexes[:self._limit(query)]
+        else:
+            end = min(end, start + self._limit(query))
+            indexes = xrange(start, end)
+        if detail:
+            items = [api.encoded[i] for i in indexes]
+        else:
+            items = [api.codec.dumps({'id': i, 'name': api.servers[i]['name']})
+                     for i in indexes]
+        self._send(200, '{"servers": [%s]}' % ', '.join(items))
+
+    def _limit(self, query):
+        limit = self.server.api.max_limit
+        if 'limit' in query:
+            limit = min(limit, int(query['limit']))
+        return limit
+
+    def _error(self, status, kind, message, headers=None):
+        body = self.server.api.codec.dumps(
+            {kind: {'code': status, 'message': message}})
+        self._send(status, body, headers)
+
+    def _send(self, status, body, headers=None):
+        headers = dict(headers or {})
+        if body:
+            headers['Content-Type'] = 'application/json'
+            if 'gzip' in self.headers.get('accept-encoding', ''):
+                compressor = zlib.compressobj(1, zlib.DEFLATED,
+                                              16 + zlib.MAX_WBITS)
+                body = compressor.compress(body) + compressor.flush()
+                headers['Content-Encoding'] = 'gzip'
+        headers['Content-Length'] = str(len(body))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+
+class FakeServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    The fake API, served from a background thread. Its ``auth_url`` is
+    what to give clients as theirs.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    # The default backlog of 5 leaves bulk()'s concurrent connections
+    # waiting on SYN retries, which would be timed as the client's.
+    request_queue_size = 128
+
+    def __init__(self, api, port=0):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port), Handler)
+        self.api = api
+        self.auth_url = 'http://127.0.0.1:%d/v1.0' % self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', type=int, default=8774)
+    parser.add_argument('--servers', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='milliseconds to wait before each response')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of requests to fail with a 503')
+    args = parser.parse_args(argv)
+
+    api = FakeAPI(args.servers, args.latency / 1000.0, args.error_rate)
+    httpd = FakeServer(api, args.port)
+    # The benchmark runner reads this line to find out where we are.
+    print httpd.auth_url
+    sys.stdout.flush()
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
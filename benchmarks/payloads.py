@@ -0,0 +1,43 @@
+"""
+Synthetic API payloads for the benchmarks, shaped like real responses.
+"""
+
+
+def server(i):
+    """
+    A server as it appears in ``/servers/detail``.
+    """
+    return {
+        "id": i,
+        "name": "server-%05d" % i,
+        "imageId": 2 + i % 5,
+        "flavorId": 1 + i % 6,
+        "hostId": "e4d909c290d0fb1ca068ffaddf22cbd0%08x" % i,
+        "status": ("ACTIVE", "BUILD", "REBOOT", "RESIZE")[i % 4],
+        "progress": i % 101,
+        "addresses": {
+            "public": ["67.23.%d.%d" % (i // 256 % 256, i % 256)],
+            "private": ["10.176.%d.%d" % (i // 256 % 256, i % 256)],
+        },
+        "metadata": {
+            "Server Label": "Web Head %d" % i,
+            "Image Version": "2.1",
+        },
+    }
+
+
+def servers(n):
+    """
+    A ``/servers/detail`` response body with ``n`` servers.
+    """
+    return {"servers": [server(i) for i in xrange(n)]}
+
+
+def servers_of_size(megabytes, codec):
+    """
+    A ``/servers/detail`` response body that encodes to about ``megabytes``
+    MB, returned along with its encoding.
+    """
+    sample = len(codec.dumps(servers(100)))
+    body = servers(int(megabytes * 1024 * 1024 * 100 / sample))
+    return body, codec.dumps(body)
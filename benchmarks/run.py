@@ -0,0 +1,261 @@
+"""
+Benchmark the client's hot paths against a local fake API.
+
+Each benchmark runs in a fresh Python process, so its peak memory is its
+own, while the fake API (see fakeserver.py) runs in this one. Results can
+be saved, and later runs compared against them to catch regressions.
+
+Usage: python benchmarks/run.py [--latency MS] [--error-rate FRACTION]
+                                [--save FILE] [--compare FILE] [NAME ...]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from openstack.api.codecs import get_codec
+from fakeserver import FakeAPI, FakeServer
+import payloads
+
+
+def _client(options, **kwargs):
+    from openstack.compute import Compute
+    # With --error-rate the failures are steady rather than an outage, so
+    # let every request retry rather than run out of retry budget.
+    return Compute(username='bench', apikey='bench',
+                   auth_url=options.auth_url, config_file=os.devnull,
+                   retries=options.retries, retry_backoff=0.01,
+                   retry_budget=1, **kwargs)
+
+
+def _expect(count, expected):
+    # A benchmark that quietly did less work would look like a speedup.
+    if count != expected:
+        raise SystemExit("Expected %d results, got %d." % (expected, count))
+
+
+def bench_list(options):
+    compute = _client(options)
+    compute.authenticate()
+    return lambda: _expect(len(compute.servers.list()), options.servers)
+
+
+def bench_iter_list(options):
+    compute = _client(options, stream_lists=True)
+    compute.authenticate()
+    # Count without keeping the servers, as a streaming consumer would.
+    return lambda: _expect(sum(1 for server in compute.servers.iter_list()),
+                           options.servers)
+
+
+def bench_findall(options):
+    compute = _client(options)
+    compute.authenticate()
+    # hostId isn't a query filter, so this lists everything and matches
+    # on the client side.
+    host_id = payloads.server(options.servers // 2)['hostId']
+    return lambda: _expect(len(compute.servers.findall(hostId=host_id)), 1)
+
+
+def bench_resources(options):
+    from openstack.api.base import ResourceList
+    compute = _client(options)
+    data = payloads.servers(options.servers)['servers']
+    return lambda: len(list(ResourceList(compute.servers, data)))
+
+
+def bench_json_decode(options):
+    codec = get_codec(options.codec)
+    encoded = codec.dumps(payloads.servers(options.servers))
+    return lambda: codec.loads(encoded)
+
+
+def bench_bulk(options):
+    compute = _client(options)
+    compute.authenticate()
+    ids = range(options.servers)
+    return lambda: compute.servers.bulk('reboot', ids, concurrency=10)
+
+
+def bench_auth(options):
+    compute = _client(options)
+    return lambda: compute.connection.authenticate(force=True)
+
+
+# name -> (function, number of servers, description)
+BENCHMARKS = {
+    'list_1k': (bench_list, 1000, "servers.list(), 1,000 servers"),
+    'list_10k': (bench_list, 10000, "servers.list(), 10,000 servers"),
+    'list_100k': (bench_list, 100000, "servers.list(), 100,000 servers"),
+    'iter_list_100k': (bench_iter_list, 100000,
+                       "servers.iter_list(), streamed, 100,000 servers"),
+    'findall_10k': (bench_findall, 10000,
+                    "servers.findall() by hostId, 10,000 servers"),
+    'resources_10k': (bench_resources, 10000,
+                      "building 10,000 Server objects"),
+    'json_decode_10k': (bench_json_decode, 10000,
+                        "decoding 10,000 servers of JSON"),
+    'bulk_reboot_1k': (bench_bulk, 1000,
+                       "servers.bulk('reboot'), 1,000 servers"),
+    'auth': (bench_auth, 0, "authenticating"),
+}
+
+ORDER = ['auth', 'json_decode_10k', 'resources_10k', 'findall_10k',
+         'list_1k', 'list_10k', 'list_100k', 'iter_list_100k',
+         'bulk_reboot_1k']
+
+
+def peak_memory_mb():
+    # On Linux, ru_maxrss counts the parent's memory at the time it forked
+    # us, the fake API's 100,000 servers and all; VmHWM starts afresh when
+    # the benchmark process starts.
+    try:
+        for line in open('/proc/self/status'):
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+    # ru_maxrss is in kilobytes on Linux, but bytes on Mac OS X.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return peak / 1024.0
+
+
+def measure(op, min_time, min_runs=3):
+    """
+    Run ``op`` at least ``min_runs`` times and for at least ``min_time``
+    seconds, and return the best time for one run.
+    """
+    best = None
+    runs = 0
+    started = time.time()
+    while runs < min_runs or time.time() - started < min_time:
+        start = time.time()
+        op()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+        runs += 1
+    return best, runs
+
+
+def run_child(options):
+    """
+    Run one benchmark in this process and print its results.
+    """
+    function, servers, description = BENCHMARKS[options.child]
+    options.servers = servers
+    op = function(options)
+    best, runs = measure(op, options.min_time)
+    print get_codec().dumps({'seconds': best, 'runs': runs,
+                             'memory': peak_memory_mb()})
+
+
+def run_benchmark(name, options, api):
+    function, servers, description = BENCHMARKS[name]
+    if servers:
+        api.set_servers(servers)
+    cmd = [sys.executable, os.path.abspath(__file__),
+           '--child', name,
+           '--auth-url', options.auth_url,
+           '--retries', str(options.retries),
+           '--codec', options.codec,
+           '--min-time', str(options.min_time)]
+    child = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    output = child.communicate()[0]
+    if child.returncode:
+        raise SystemExit("Benchmark %s failed." % name)
+    return get_codec().loads(output.strip().splitlines()[-1])
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('names', nargs='*', metavar='NAME',
+                        help='benchmarks to run (default: all of %s)'
+                             % ', '.join(ORDER))
+    parser.add_argument('--latency', type=float, default=0,
+                        help='milliseconds the fake API waits per request')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of requests the fake API fails')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='the client\'s "retries" option')
+    parser.add_argument('--codec', default='stdlib',
+                        help='JSON codec for json_decode_10k')
+    parser.add_argument('--min-time', type=float, default=1.0,
+                        help='seconds to keep repeating each benchmark')
+    parser.add_argument('--save', metavar='FILE',
+                        help='save the results to FILE')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare against results saved in FILE')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help='percent slower than --compare to fail at')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--auth-url', help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+
+    if options.child:
+        return run_child(options)
+
+    names = options.names or ORDER
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error("No benchmark %r; choose from %s."
+                         % (name, ', '.join(ORDER)))
+    baseline = {}
+    if options.compare:
+        baseline = get_codec().loads(open(options.compare).read())
+
+    # Let a plain list() have every server, as a deployment with a raised
+    # osapi_max_limit would, so list_100k times 100,000 of them; iter_list()
+    # still pages at the client's max_page_size.
+    most = max([servers for (function, servers, description)
+                in BENCHMARKS.values()])
+    api = FakeAPI(0, options.latency / 1000.0, options.error_rate, seed=0,
+                  max_limit=most)
+    httpd = FakeServer(api)
+    httpd.start()
+    options.auth_url = httpd.auth_url
+
+    results = {}
+    regressions = []
+    print "%-16s %12s %12s %10s  %s" % ('benchmark', 'ms/op', 'ops/sec',
+                                        'peak MB', 'vs. baseline')
+    try:
+        for name in names:
+            result = results[name] = run_benchmark(name, options, api)
+            change = ''
+            if name in baseline:
+                before = baseline[name]['seconds']
+                percent = (result['seconds'] - before) / before * 100
+                change = '%+.1f%%' % percent
+                if percent > options.threshold:
+                    change += '  SLOWER'
+                    regressions.append(name)
+            print "%-16s %12.2f %12.1f %10.1f  %s" % (
+                name, result['seconds'] * 1000, 1 / result['seconds'],
+                result['memory'], change)
+            sys.stdout.flush()
+    finally:
+        httpd.stop()
+
+    if options.save:
+        f = open(options.save, 'w')
+        try:
+            f.write(get_codec().dumps(results))
+        finally:
+            f.close()
+    if regressions:
+        print "%d benchmark(s) more than %g%% slower: %s" % (
+            len(regressions), options.threshold, ', '.join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
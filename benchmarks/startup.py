@@ -0,0 +1,91 @@
+"""
+Measure how quickly the command line gets going: how long after starting
+``openstack-compute list`` it opens its first connection to the API, and
+how long ``openstack-compute help`` takes from start to finish.
+
+Usage: python benchmarks/startup.py [runs]
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+# What the openstack-compute script does, minus setuptools' wrapper
+# (which imports pkg_resources, and so costs as much again).
+SCRIPT = ("import sys; from openstack.compute.shell import main; "
+          "sys.argv[0] = 'openstack-compute'; main()")
+
+
+def spawn(args):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    devnull = open(os.devnull, 'w')
+    return subprocess.Popen([sys.executable, '-c', SCRIPT] + args, env=env,
+                            cwd=ROOT, stdout=devnull, stderr=devnull)
+
+
+def time_to_first_connection(listener):
+    """
+    Run ``openstack-compute list`` against ``listener``, and return the
+    seconds until it connects.
+    """
+    port = listener.getsockname()[1]
+    started = time.time()
+    child = spawn(['-f', os.devnull, '--username', 'bench',
+                   '--apikey', 'bench',
+                   '--auth-url', 'http://127.0.0.1:%d/v1.0' % port, 'list'])
+    conn, addr = listener.accept()
+    connected = time.time()
+    # Turn it away, so that it gives up rather than retrying.
+    conn.recv(65536)
+    conn.sendall('HTTP/1.1 401 Unauthorized\r\nContent-Length: 0\r\n'
+                 'Connection: close\r\n\r\n')
+    conn.close()
+    child.wait()
+    return connected - started
+
+
+def time_to_exit(args):
+    started = time.time()
+    spawn(args).wait()
+    return time.time() - started
+
+
+def time_to_exit_python():
+    started = time.time()
+    subprocess.Popen([sys.executable, '-c', 'pass']).wait()
+    return time.time() - started
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main(argv):
+    runs = int(argv and argv[0] or 20)
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(5)
+
+    results = [
+        ('python -c pass', median(
+            [time_to_exit_python() for i in range(runs)])),
+        ('list: first connection', median(
+            [time_to_first_connection(listener) for i in range(runs)])),
+        ('help', median([time_to_exit(['help']) for i in range(runs)])),
+        ('help list', median(
+            [time_to_exit(['help', 'list']) for i in range(runs)])),
+    ]
+    print "median of %d runs" % runs
+    for name, seconds in results:
+        print "%-24s %8.1f ms" % (name, seconds * 1000)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
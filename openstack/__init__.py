@@ -1,6 +1,10 @@
-try:
+# pkg_resources takes longer to import than the rest of the command-line
+# client put together, so only use it if something has already paid for it
+# (as setuptools' console scripts and namespace .pth files do).
+import sys
+if 'pkg_resources' in sys.modules:
     import pkg_resources
     pkg_resources.declare_namespace(__name__)
-except ImportError:
+else:
     import pkgutil
     __path__ = pkgutil.extend_path(__path__, __name__)
@@ -36,10 +36,11 @@ class FlavorManager(compute.FlavorManager):
     def delete(self, id, purge=False):
         self._delete("/admin/flavors/%s?purge=%s" % (id, purge))
 
-    def list(self):
+    def list(self, **filters):
         """
         Get a list of all flavors.
         
-        :rtype: list of :class:`Flavor`.
+        :rtype: :class:`~openstack.api.base.ResourceList` of :class:`Flavor`.
         """
-        return self._list("/admin/flavors", "flavors")
+        return self._list(self._filtered_url("/admin/flavors", filters),
+                          "flavors")
@@ -2,7 +2,15 @@
 Base utilities to build API operation managers and objects on top of.
 """
 
-from openstack.api.exceptions import NotFound
+import random
+import time
+import urllib
+import urlparse
+
+from openstack.api.cache import TTLCache
+from openstack.api.exceptions import NotFound, WaitTimeout
+from openstack.api.metrics import ListEvent
+from openstack.api.streaming import iter_items
 
 # Python 2.4 compat
 try:
@@ -17,46 +25,174 @@ class Manager(object):
     """
     Managers interact with a particular type of API (servers, flavors, images,
     etc.) and provide CRUD operations for them.
+
+    Lookups through a manager can be cached on the client by calling
+    `enable_cache()`. That's worth doing for collections that rarely change,
+    like flavors and images.
     """
     resource_class = None
 
     def __init__(self, api):
         self.api = api
+        self.cache = None
+
+    def enable_cache(self, ttl=60, maxsize=128):
+        """
+        Cache the results of `list()` and `get()` calls made through this
+        manager for ``ttl`` seconds, holding on to at most ``maxsize`` of
+        them. Creating, updating or deleting anything through this manager
+        empties the cache.
+        """
+        self.cache = TTLCache(ttl, maxsize)
 
-    def _list(self, url, response_key):
-        resp, body = self.api.connection.get(url)
+    def disable_cache(self):
+        """
+        Stop caching, and forget anything cached so far.
+        """
+        self.cache = None
+
+    def _list(self, url, response_key, **kwargs):
+        started = time.time()
+        data = self._cached(('list', url), kwargs, lambda body:
+                            self._extract_list(body, response_key))
+        resources = ResourceList(self, data)
+        connection = self.api.connection
+        if connection.observers:
+            connection.notify('after_list',
+                              ListEvent(self.__class__.__name__, url,
+                                        len(resources), time.time() - started))
+        return resources
+
+    def _iter_list(self, url, response_key, page_size=None, **kwargs):
+        """
+        Like `_list`, but fetch the collection a page at a time, using the
+        ``limit``/``marker`` query parameters, and yield each resource as
+        soon as its page arrives.
+
+        Pages are never bigger than the ``max_page_size`` config option,
+        which should be no more than the API's own cap on ``limit`` (1000
+        for Rackspace, and Nova's default ``osapi_max_limit``): a page
+        shorter than that is taken to be the last.
+
+        With the ``stream_lists`` config option on, each page is parsed
+        as it downloads too, and resources are yielded as soon as their
+        own JSON has arrived.
+        """
+        config = self.api.config
+        page_size = page_size or config.page_size
+        if config.max_page_size:
+            # Never ask for more than the API will send back, so that a
+            # short page is always the last.
+            page_size = min(page_size, config.max_page_size)
+        marker = None
+        previous = set()
+        while True:
+            page_url = with_query(url, {'limit': page_size, 'marker': marker})
+            if config.stream_lists:
+                data = self._stream_list(page_url, response_key, **kwargs)
+            else:
+                resp, body = self.api.connection.get(page_url, **kwargs)
+                data = self._extract_list(body, response_key)
+            ids = set()
+            count = 0
+            for res in data:
+                if res['id'] in previous:
+                    # The API ignored the marker and sent a page we've had
+                    # already; there's no getting any further.
+                    return
+                count += 1
+                marker = res['id']
+                ids.add(marker)
+                yield self.resource_class(self, res)
+            if count < page_size:
+                return
+            previous = ids
+
+    def _stream_list(self, url, response_key, **kwargs):
+        connection = self.api.connection
+        chunks = connection.stream(url, **kwargs)
+        # NOTE(ja): keystone wraps lists up as {'values': [ ... ]}, as in
+        #           _extract_list.
+        paths = [(response_key,), (response_key, 'values')]
+        # If we stop early, dropping the chunks gives the connection up.
+        return iter_items(chunks, paths, connection.codec.loads)
+
+    def _extract_list(self, body, response_key):
+        # A "changes-since" query can get back an empty 304 when nothing
+        # has changed.
+        if body is None:
+            return []
         data = body[response_key]
         # NOTE(ja): keystone returns values as list as {'values': [ ... ]}
         #           unlike other services which just return the list...
         if type(data) is dict:
             data = data['values']
-        return [self.resource_class(self, res) for res in data]
+        return data
 
-    def _get(self, url, response_key):
-        resp, body = self.api.connection.get(url)
-        return self.resource_class(self, body[response_key])
+    def _get(self, url, response_key, **kwargs):
+        info = self._cached(('get', url), kwargs, lambda body:
+                            body[response_key])
+        return self.resource_class(self, info)
 
     def _create(self, url, body, response_key):
+        self._invalidate_cache()
         resp, body = self.api.connection.post(url, body=body)
         return self.resource_class(self, body[response_key])
 
     def _delete(self, url):
+        self._invalidate_cache()
         resp, body = self.api.connection.delete(url)
 
     def _update(self, url, body):
+        self._invalidate_cache()
         resp, body = self.api.connection.put(url, body=body)
 
+    def _cached(self, key, kwargs, extract):
+        """
+        GET the URL in ``key``, returning ``extract(body)``. If caching is
+        on, the extracted data comes from -- or goes into -- the cache.
+
+        Whatever comes out of the cache is a copy, so callers are free to
+        change it. Requests with extra arguments (i.e. a different
+        ``auth_token``) always go to the API.
+        """
+        cache = self.cache
+        if cache is None or kwargs:
+            resp, body = self.api.connection.get(key[1], **kwargs)
+            return extract(body)
+
+        data = cache.get(key)
+        if data is None:
+            resp, body = self.api.connection.get(key[1])
+            data = extract(body)
+            cache.set(key, data)
+        if isinstance(data, list):
+            return [dict(info) for info in data]
+        return dict(data)
+
+    def _invalidate_cache(self):
+        if self.cache is not None:
+            self.cache.invalidate()
+
 
 class ManagerWithFind(Manager):
     """
     Like a `Manager`, but with additional `find()`/`findall()` methods.
     """
+    # Maps the filters `list()` accepts -- and thus the `find()`/`findall()`
+    # arguments that can be narrowed down by the API rather than on the
+    # Python side -- to their query parameters.
+    query_filters = {}
+
+    # Filters that aren't resource attributes, and so can only be applied
+    # by the API.
+    query_only_filters = ()
+
     def find(self, **kwargs):
         """
         Find a single item with attributes matching ``**kwargs``.
 
-        This isn't very efficient: it loads the entire list then filters on
-        the Python side.
+        See `findall()` for how the matching is done.
         """
         rl = self.findall(**kwargs)
         try:
@@ -69,51 +205,271 @@ class ManagerWithFind(Manager):
         """
         Find all items with attributes matching ``**kwargs``.
 
-        This isn't very efficient: it loads the entire list then filters on
-        the Python side.
+        Arguments listed in `query_filters` are passed on to the API so it
+        only sends back likely matches; everything is then compared exactly
+        on the Python side. Without any such arguments this loads the
+        entire list.
         """
         found = []
-        searches = kwargs.items()
+        filters = dict((attr, value) for (attr, value) in kwargs.items()
+                                     if attr in self.query_filters)
+        searches = [(attr, value) for (attr, value) in kwargs.items()
+                                  if attr not in self.query_only_filters]
 
-        for obj in self.list():
+        objs = self.list(**filters)
+        if not isinstance(objs, ResourceList) or objs.data is None:
+            for obj in objs:
+                try:
+                    if all(getattr(obj, attr) == value
+                      for (attr, value) in searches):
+                        found.append(obj)
+                except AttributeError:
+                    continue
+            return found
+
+        # Compare against the raw API data where we can, so only matching
+        # resources ever get built. Attributes the resource class defines
+        # itself (i.e. properties) still need the real resource.
+        cls = self.resource_class
+        for (i, info) in enumerate(objs.data):
             try:
-                if all(getattr(obj, attr) == value
-                  for (attr, value) in searches):
-                    found.append(obj)
-            except AttributeError:
+                for (attr, value) in searches:
+                    if hasattr(cls, attr):
+                        actual = getattr(objs[i], attr)
+                    else:
+                        actual = info[attr]
+                    if actual != value:
+                        break
+                else:
+                    found.append(objs[i])
+            except (AttributeError, KeyError):
                 continue
 
         return found
 
+    def wait_for(self, resources, status='ACTIVE', timeout=None, interval=2,
+                 max_interval=30, fail_status=('ERROR', 'FAILED')):
+        """
+        Wait for resources to reach a status, yielding each one (freshly
+        fetched) as soon as it does::
+
+            for server in compute.servers.wait_for(new_servers):
+                print server.name, server.status
+
+        :param resources: The resources (or their IDs) to wait on.
+        :param status: The status to wait for, or a list of them. Include
+                       ``DELETED`` to wait for resources to go away.
+        :param timeout: Give up and raise :exc:`WaitTimeout` after this many
+                        seconds. ``None`` means wait forever.
+        :param interval: Seconds to wait between checks at first. The wait
+                         doubles, up to ``max_interval``, whenever a check
+                         finds nothing new, and is randomly shortened by up
+                         to half so that many waiters don't poll in step.
+        :param fail_status: Statuses that mean the resource will never get
+                            there; those resources are yielded too, so check
+                            their ``status``.
+
+        However many resources are pending, each check costs a single
+        listing -- paged through with ``iter_list()``, where the manager
+        has one -- plus a `get()` for any resource missing from it.
+        """
+        if isinstance(status, basestring):
+            status = [status]
+        done = list(status) + list(fail_status)
+        pending = dict((getid(res), res) for res in resources)
+        deadline = timeout and time.time() + timeout
+        delay = interval
+
+        # A plain list() stops at the API's cap on how many it returns.
+        listing = getattr(self, 'iter_list', None) or self.list
+        while pending:
+            current = {}
+            for obj in listing():
+                if obj.id in pending:
+                    current[obj.id] = obj
+            progress = False
+            for id, res in pending.items():
+                obj = current.get(id)
+                if obj is None:
+                    # Make sure it's really gone, and didn't just miss the
+                    # listing.
+                    try:
+                        obj = self.get(id)
+                    except NotFound:
+                        if 'DELETED' not in status:
+                            raise NotFound(404, "%s %s has gone away." %
+                                           (self.resource_class.__name__, id))
+                if obj is None:
+                    obj = res
+                elif getattr(obj, 'status', None) not in done:
+                    continue
+                del pending[id]
+                progress = True
+                yield obj
+            if not pending:
+                return
+
+            if progress:
+                delay = interval
+            else:
+                delay = min(delay * 2, max_interval)
+            pause = random.uniform(delay / 2.0, delay)
+            if deadline:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise WaitTimeout(details=pending.values())
+                pause = min(pause, remaining)
+            time.sleep(pause)
+
+    def _filtered_url(self, url, filters):
+        """
+        Add the query parameters for the given `list()` filters onto ``url``.
+        """
+        params = {}
+        for (attr, value) in filters.items():
+            try:
+                params[self.query_filters[attr]] = value
+            except KeyError:
+                raise TypeError("Can't filter %s by %r." %
+                                (self.resource_class.__name__, attr))
+        return with_query(url, params)
+
+
+class ResourceList(object):
+    """
+    The list of resources returned by `Manager._list()`.
+
+    It holds on to the decoded API data and only builds each `Resource` the
+    first time it's asked for, so taking the ``len()`` of a listing, or
+    filtering it with `ManagerWithFind.findall()`, doesn't pay for building
+    every resource. Otherwise it acts like a list: it supports indexing,
+    slicing, iteration, ``index()`` and ``count()``, and compares equal to
+    a list of the same resources. Changing it -- ``sort()``, ``append()``
+    and the rest -- builds every resource first, and from then on it's a
+    plain list underneath.
+    """
+    def __init__(self, manager, data):
+        self.manager = manager
+        self.data = data
+        self._resources = [None] * len(data)
+
+    def __len__(self):
+        return len(self._resources)
+
+    def __getitem__(self, i):
+        if self.data is None:
+            return self._resources[i]
+        if isinstance(i, slice):
+            return ResourceList(self.manager, self.data[i])
+        res = self._resources[i]
+        if res is None:
+            res = self.manager.resource_class(self.manager, self.data[i])
+            self._resources[i] = res
+        return res
+
+    def __getslice__(self, i, j):
+        # Python 2 still calls this for simple x[i:j] slices.
+        return self[max(0, i):max(0, j):]
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def __reversed__(self):
+        for i in xrange(len(self) - 1, -1, -1):
+            yield self[i]
+
+    def index(self, value, *args):
+        return list(self).index(value, *args)
+
+    def count(self, value):
+        return list(self).count(value)
+
+    def _materialize(self):
+        """
+        Build every resource, and drop the raw data, ready for changes.
+        """
+        if self.data is not None:
+            self._resources = list(self)
+            self.data = None
+        return self._resources
+
+    def __iadd__(self, other):
+        self._materialize().extend(other)
+        return self
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, ResourceList)):
+            return False
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def _list_method(name):
+    def method(self, *args, **kwargs):
+        return getattr(self._materialize(), name)(*args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = getattr(list, name).__doc__
+    return method
+
+for _name in ('append', 'extend', 'insert', 'pop', 'remove', 'reverse',
+              'sort', '__setitem__', '__delitem__', '__setslice__',
+              '__delslice__'):
+    setattr(ResourceList, _name, _list_method(_name))
+del _name
+
 
 class Resource(object):
     """
     A resource represents a particular instance of an object (server, flavor,
     etc). This is pretty much just a bag for attributes.
+
+    The attributes are looked up in the ``_info`` dict the API sent back
+    rather than copied onto the instance, so each field is only stored
+    once; with ``manager`` and ``_info`` in slots, most resources don't
+    need an instance dict at all. Attributes set on a resource shadow its
+    ``_info`` until fresh details for them arrive.
     """
+    __slots__ = ('manager', '_info', '__dict__', '__weakref__')
+
     def __init__(self, manager, info):
         self.manager = manager
         self._info = info
         self._add_details(info)
 
     def _add_details(self, info):
-        # FIXME(ja): tenants breaks this - also some data is in _info and some in
-        #            base dict (as in this function) is odd?
-        for (k, v) in info.iteritems():
-            try:
-                setattr(self, k, v)
-            except:
-                pass
+        if info is self._info:
+            return
+        # Drop anything set on the instance that the new details replace.
+        shadowed = getattr(self, '__dict__', {})
+        for k in info:
+            shadowed.pop(k, None)
+        self._info.update(info)
 
     def __getattr__(self, k):
-        if k not in self.__dict__:
+        # Only called once normal lookup has failed, i.e. for anything
+        # that isn't a slot, class attribute or instance attribute.
+        if k == '_info' or k.startswith('__'):
+            raise AttributeError(k)
+        try:
+            return self._info[k]
+        except KeyError:
             raise AttributeError(k)
-        else:
-            return self.__dict__[k]
 
     def __repr__(self):
-        reprkeys = sorted(k for k in self.__dict__.keys()
-                            if k[0] != '_' and k != 'manager')
+        keys = set(self._info.keys()) | set(getattr(self, '__dict__', {}))
+        reprkeys = sorted(k for k in keys if k[0] != '_' and k != 'manager')
         info = ", ".join("%s=%s" % (k, getattr(self, k)) for k in reprkeys)
         return "<%s %s>" % (self.__class__.__name__, info)
 
@@ -129,6 +485,18 @@ class Resource(object):
         return self._info == other._info
 
 
+def with_query(url, params):
+    """
+    Add the given query parameters onto ``url``, skipping any whose value
+    is ``None``.
+    """
+    scheme, netloc, path, query, frag = urlparse.urlsplit(url)
+    query = urlparse.parse_qsl(query)
+    query.extend(sorted((k, v) for (k, v) in params.items() if v is not None))
+    query = urllib.urlencode(query)
+    return urlparse.urlunsplit((scheme, netloc, path, query, frag))
+
+
 def getid(obj):
     """
     Abstracts the common pattern of allowing both an object or an object's ID
@@ -0,0 +1,87 @@
+"""
+Client-side caching of API responses.
+"""
+
+import threading
+import time
+
+
+class TTLCache(object):
+    """
+    A thread-safe mapping whose entries expire ``ttl`` seconds after being
+    set -- or never, if ``ttl`` is ``None``. Once it holds ``maxsize``
+    entries, the least recently used one is dropped to make room.
+    """
+    def __init__(self, ttl=60, maxsize=128):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # key -> [expires, last_used, value]
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Get the value for ``key``, or ``default`` if it's missing or has
+        expired.
+        """
+        self._lock.acquire()
+        try:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            now = time.time()
+            if _expired(entry, now):
+                del self._data[key]
+                return default
+            entry[1] = now
+            return entry[2]
+        finally:
+            self._lock.release()
+
+    def set(self, key, value):
+        """
+        Store ``value`` under ``key``.
+        """
+        self._lock.acquire()
+        try:
+            now = time.time()
+            if key not in self._data and len(self._data) >= self.maxsize:
+                self._evict(now)
+            if self.ttl is None:
+                expires = None
+            else:
+                expires = now + self.ttl
+            self._data[key] = [expires, now, value]
+        finally:
+            self._lock.release()
+
+    def invalidate(self, key=None):
+        """
+        Forget ``key``, or everything if no key is given.
+        """
+        self._lock.acquire()
+        try:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _evict(self, now):
+        expired = [k for (k, entry) in self._data.items()
+                     if _expired(entry, now)]
+        for k in expired:
+            del self._data[k]
+        if len(self._data) >= self.maxsize:
+            # Not min(..., key=...), which is new in Python 2.5.
+            last_used, lru = min([(entry[1], k) for (k, entry)
+                                  in self._data.items()])
+            del self._data[lru]
+
+
+def _expired(entry, now):
+    return entry[0] is not None and entry[0] <= now
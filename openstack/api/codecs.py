@@ -0,0 +1,100 @@
+"""
+Pluggable JSON codecs for encoding request bodies and decoding responses.
+
+Pick one with the ``json_codec`` config option: ``stdlib`` (the default),
+``simplejson``, ``ujson``, ``cjson``, ``orjson``, or ``auto`` for the
+fastest one installed. A comma-separated list is tried in order. Whatever
+is asked for, the standard library's codec is the fallback if nothing
+else can be imported.
+"""
+
+# The order "auto" tries codecs in: fastest first.
+AUTO = ('orjson', 'ujson', 'cjson', 'simplejson', 'stdlib')
+
+
+class Codec(object):
+    """
+    A named pair of ``dumps``/``loads`` functions. ``loads`` raises
+    ``ValueError`` (or a subclass) on bad input, like the stdlib's.
+    """
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return "<Codec: %s>" % self.name
+
+
+def _stdlib():
+    try:
+        import json
+    except ImportError:
+        import simplejson as json
+    return Codec('stdlib', json.dumps, json.loads)
+
+
+def _simplejson():
+    import simplejson
+    return Codec('simplejson', simplejson.dumps, simplejson.loads)
+
+
+def _ujson():
+    import ujson
+    return Codec('ujson', ujson.dumps, ujson.loads)
+
+
+def _cjson():
+    import cjson
+
+    # cjson's DecodeError isn't a ValueError, which callers rely on to tell
+    # a body that isn't JSON.
+    def loads(text):
+        try:
+            return cjson.decode(text)
+        except cjson.DecodeError, e:
+            raise ValueError(str(e))
+    return Codec('cjson', cjson.encode, loads)
+
+
+def _orjson():
+    import orjson
+    return Codec('orjson', orjson.dumps, orjson.loads)
+
+
+_loaders = {
+    'stdlib': _stdlib,
+    'json': _stdlib,
+    'simplejson': _simplejson,
+    'ujson': _ujson,
+    'cjson': _cjson,
+    'orjson': _orjson,
+}
+
+_codecs = {}
+
+
+def get_codec(names='stdlib'):
+    """
+    Get the first :class:`Codec` in the comma-separated ``names`` that can
+    be imported, falling back to the stdlib codec.
+    """
+    for name in names.split(','):
+        name = name.strip().lower()
+        if name == 'auto':
+            return get_codec(','.join(AUTO))
+        if name not in _codecs:
+            try:
+                _codecs[name] = _loaders[name]()
+            except (KeyError, ImportError):
+                _codecs[name] = None
+        if _codecs[name] is not None:
+            return _codecs[name]
+    return get_codec('stdlib')
+
+
+def available_codecs():
+    """
+    The names of every codec that can be imported here.
+    """
+    return [name for name in AUTO if get_codec(name).name == name]
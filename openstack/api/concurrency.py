@@ -0,0 +1,231 @@
+"""
+Small helpers for running API calls concurrently on a pool of threads.
+"""
+
+import Queue
+import sys
+import threading
+import time
+
+from openstack.api.base import Manager
+
+
+class Future(object):
+    """
+    The eventual result of a call submitted to a :class:`WorkerPool`.
+    """
+    def __init__(self):
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        """
+        Has the call finished (successfully or not)?
+        """
+        return self._done.isSet()
+
+    def result(self, timeout=None):
+        """
+        Wait for the call to finish and return its result, re-raising any
+        exception it raised.
+        """
+        self._wait(timeout)
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Wait for the call to finish and return the exception it raised, or
+        ``None`` if it succeeded.
+        """
+        self._wait(timeout)
+        if self._exc_info:
+            return self._exc_info[1]
+        return None
+
+    def add_done_callback(self, fn):
+        """
+        Call ``fn(future)`` once the call finishes -- right away, in this
+        thread, if it already has.
+        """
+        self._lock.acquire()
+        try:
+            if not self._done.isSet():
+                self._callbacks.append(fn)
+                return
+        finally:
+            self._lock.release()
+        fn(self)
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exc_info(self, exc_info):
+        self._exc_info = exc_info
+        self._finish()
+
+    def _wait(self, timeout):
+        self._done.wait(timeout)
+        if not self._done.isSet():
+            raise RuntimeError("Timed out waiting for result.")
+
+    def _finish(self):
+        self._lock.acquire()
+        try:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        finally:
+            self._lock.release()
+        for fn in callbacks:
+            fn(self)
+
+
+class WorkerPool(object):
+    """
+    A fixed number of threads running submitted calls in order.
+
+    The threads are started on first use and are daemonic, so a forgotten
+    pool won't keep the process alive.
+    """
+    def __init__(self, size=10):
+        self.size = size
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedule ``fn(*args, **kwargs)`` to run and return its
+        :class:`Future`.
+        """
+        future = Future()
+        self._start()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def shutdown(self, wait=True):
+        """
+        Stop the threads once everything already submitted has run.
+        """
+        self._lock.acquire()
+        try:
+            threads, self._threads = self._threads, []
+        finally:
+            self._lock.release()
+        for t in threads:
+            self._queue.put(None)
+        if wait:
+            for t in threads:
+                t.join()
+
+    def _start(self):
+        self._lock.acquire()
+        try:
+            while len(self._threads) < self.size:
+                t = threading.Thread(target=self._work)
+                t.setDaemon(True)
+                t.start()
+                self._threads.append(t)
+        finally:
+            self._lock.release()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            try:
+                result = fn(*args, **kwargs)
+            except:
+                future.set_exc_info(sys.exc_info())
+            else:
+                future.set_result(result)
+
+
+class Throttle(object):
+    """
+    Spaces calls out so that no more than ``rate`` start per second, across
+    all the threads sharing the throttle.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        Block until it's this caller's turn.
+        """
+        self._lock.acquire()
+        try:
+            now = time.time()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        finally:
+            self._lock.release()
+        if start > now:
+            time.sleep(start - now)
+
+
+class AsyncManager(object):
+    """
+    Wraps a :class:`~openstack.api.base.Manager` so that its public methods
+    return a :class:`Future` right away instead of blocking.
+
+    The manager's own methods do the work on a :class:`WorkerPool`, so
+    every URL and request body is built exactly as it is for blocking
+    calls.
+    """
+    def __init__(self, manager, pool):
+        self.manager = manager
+        self.pool = pool
+
+    def __getattr__(self, name):
+        attr = getattr(self.manager, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def submit(*args, **kwargs):
+            return self.pool.submit(attr, *args, **kwargs)
+        submit.__name__ = name
+        submit.__doc__ = attr.__doc__
+        return submit
+
+
+class AsyncClient(object):
+    """
+    A non-blocking view of a top-level client (:class:`Compute`,
+    :class:`Admin`, :class:`Extras`, :class:`Account`, ...).
+
+    ::
+
+        >>> compute = AsyncClient(Compute(username=USERNAME, apikey=API_KEY))
+        >>> future = compute.servers.list()
+        >>> future.add_done_callback(lambda f: handle(f.result()))
+
+    Each manager on the client is wrapped in an :class:`AsyncManager`, and
+    all of them share one :class:`WorkerPool` of ``concurrency`` threads.
+    Raise the ``pool_max_per_host`` config option along with it to actually
+    have that many requests in flight.
+    """
+    def __init__(self, client, concurrency=10):
+        self.client = client
+        self.pool = WorkerPool(concurrency)
+        for name, value in vars(client).items():
+            if isinstance(value, Manager):
+                setattr(self, name, AsyncManager(value, self.pool))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def close(self):
+        """
+        Stop the worker threads once outstanding calls have finished.
+        """
+        self.pool.shutdown()
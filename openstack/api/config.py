@@ -2,7 +2,6 @@ __version__ = '2.0a1'
 
 import os
 import ConfigParser
-from distutils.util import strtobool
 
 
 DEFAULT_CONFIG_FILE = os.path.expanduser('~/.openstack/compute.conf')
@@ -25,7 +24,29 @@ class Config(object):
         'management_url': None,
         'user_agent': 'python-openstack-compute/%s' % __version__,
         'allow_cache': False,
+        'revalidate': False,
+        'revalidate_maxsize': 256,
         'cloud_api': 'RACKSPACE',
+        'pool_maxsize': 10,
+        'pool_max_per_host': 4,
+        'pool_idle_timeout': 60,
+        'page_size': 1000,
+        'max_page_size': 1000,
+        'json_codec': 'stdlib',
+        'stream_lists': False,
+        'compress_responses': True,
+        'compress_requests_threshold': 0,
+        'token_cache': False,
+        'token_ttl': 86400,
+        'token_refresh_margin': 300,
+        'retries': 0,
+        'retry_backoff': 0.5,
+        'retry_max_backoff': 30.0,
+        'retry_max_delay': 60.0,
+        'retry_budget': 0.1,
+        'rate_limits': '',
+        'rate_limits_from_api': False,
+        'index_ttl': 300,
     }
 
     def __init__(self, config_file, env, overrides,
@@ -75,4 +96,20 @@ class Config(object):
         for key, value in self.DEFAULTS.iteritems():
             if isinstance(value, bool)\
                and not isinstance(self.config[key], bool):
-                self.config[key] = strtobool(self.config[key])
+                self.config[key] = _strtobool(self.config[key])
+            elif isinstance(value, (int, float))\
+               and isinstance(self.config[key], basestring):
+                self.config[key] = type(value)(self.config[key])
+
+
+def _strtobool(value):
+    """
+    Like distutils.util.strtobool, without importing distutils, which is
+    slow enough to matter to the command line's start-up time.
+    """
+    value = value.lower()
+    if value in ('y', 'yes', 't', 'true', 'on', '1'):
+        return 1
+    elif value in ('n', 'no', 'f', 'false', 'off', '0'):
+        return 0
+    raise ValueError("invalid truth value %r" % (value,))
@@ -1,11 +1,10 @@
+import httplib
+import sys
+import threading
 import time
 import urlparse
 import urllib
-import httplib2
-try:
-    import json
-except ImportError:
-    import simplejson as json
+import zlib
 
 # Python 2.5 compat fix
 if not hasattr(urlparse, 'parse_qsl'):
@@ -13,70 +12,411 @@ if not hasattr(urlparse, 'parse_qsl'):
     urlparse.parse_qsl = cgi.parse_qsl
 
 from openstack.api import exceptions
+from openstack.api.cache import TTLCache
+from openstack.api.codecs import get_codec
+from openstack.api.metrics import RequestEvent
+from openstack.api.pool import get_pool
+from openstack.api.ratelimit import RateLimiter, limits_from_api, parse_limits
+from openstack.api.retry import RetryPolicy
+from openstack.api.tokencache import DEFAULT_TOKEN_CACHE_FILE, TokenCache
 
 
-class ApiConnection(httplib2.Http):
+class ApiConnection(object):
+    """
+    Talks JSON to an OpenStack API endpoint.
 
-    def __init__(self, config):
-        super(ApiConnection, self).__init__()
+    The actual HTTP is done over keep-alive connections checked out of a
+    :class:`~openstack.api.pool.ConnectionPool`. By default that's the
+    process-wide pool for this config's pool settings, so every client
+    built with the same settings reuses the same connections.
+
+    A connection is safe to share between threads: each request gets its
+    own pooled HTTP connection, requests never modify the caller's
+    arguments or the connection's own state, and authentication happens at
+    most once no matter how many threads need it at the same time. To make
+    a request as someone else, pass ``auth_token`` to :meth:`get`,
+    :meth:`post`, :meth:`put` or :meth:`delete` rather than changing
+    :attr:`auth_token`, which is shared by every thread.
+
+    Tokens are kept in a :class:`~openstack.api.tokencache.TokenCache`
+    shared by every client in the process, and -- if the ``token_cache``
+    config option is on -- saved under ``~/.openstack/`` for other
+    processes too. Tokens are renewed shortly before they expire, and a
+    request that fails with a 401 is retried once with a fresh token.
+
+    If the ``retries`` config option is set, requests that are rate limited
+    or hit a transient server error are retried as the
+    :class:`~openstack.api.retry.RetryPolicy` allows. Pass
+    ``idempotent=True`` to retry a POST that's safe to repeat, or
+    ``idempotent=False`` to never retry a request.
+
+    Requests are held back to stay inside the rate limits given by the
+    ``rate_limits`` config option and, after :meth:`load_rate_limits`, the
+    account's own limits from the API. The limits are shared by every
+    thread using the connection.
+
+    Observers added with :meth:`add_observer` are told about every request
+    made; see :mod:`openstack.api.metrics`.
+    """
+
+    def __init__(self, config, pool=None):
         self.config = config
+        self.pool = pool or get_pool(config)
+        # Per-thread overrides of self.pool; see use_pool().
+        self._local = threading.local()
+        self.codec = get_codec(self.config.json_codec)
         self.management_url = self.config.management_url
         self.auth_token = self.config.auth_token
+        self.token_expires = None
+        self.token_margin = 0
+        self._auth_lock = threading.Lock()
+        if self.config.token_cache:
+            self.token_cache = TokenCache(DEFAULT_TOKEN_CACHE_FILE)
+        else:
+            self.token_cache = TokenCache()
+        # (url, auth token) -> (etag, last modified, raw body), for
+        # revalidation.
+        self._validators = TTLCache(ttl=None,
+                                    maxsize=self.config.revalidate_maxsize)
+        self.retry_policy = RetryPolicy(
+            retries=self.config.retries,
+            backoff=self.config.retry_backoff,
+            max_backoff=self.config.retry_max_backoff,
+            max_delay=self.config.retry_max_delay,
+            budget=self.config.retry_budget)
+        self.rate_limiter = RateLimiter(parse_limits(self.config.rate_limits))
+        self._limits_loaded = False
+        self._limits_lock = threading.Lock()
+        self.observers = []
+
+    def use_pool(self, pool):
+        """
+        Send requests made from the calling thread over ``pool`` rather
+        than :attr:`pool`, until called again with ``None``.
+        """
+        self._local.pool = pool
 
-        # httplib2 overrides
-        self.force_exception_to_status_code = True
+    def _pool(self):
+        return getattr(self._local, 'pool', None) or self.pool
 
-    def request(self, *args, **kwargs):
-        kwargs.setdefault('headers', {})
+    def add_observer(self, observer):
+        """
+        Tell ``observer`` about every request from now on.
+        """
+        self.observers = self.observers + [observer]
+
+    def remove_observer(self, observer):
+        self.observers = [o for o in self.observers if o is not observer]
+
+    def notify(self, name, event):
+        """
+        Call the ``name`` method of every observer that has one.
+        """
+        for observer in self.observers:
+            method = getattr(observer, name, None)
+            if method is not None:
+                method(event)
+
+    def request(self, uri, method='GET', **kwargs):
+        idempotent = kwargs.pop('idempotent', None)
+        kwargs['headers'] = dict(kwargs.get('headers') or {})
         kwargs['headers']['User-Agent'] = self.config.user_agent
+        kwargs['headers']['Accept-Encoding'] = self._accept_encoding()
         if 'body' in kwargs:
             kwargs['headers']['Content-Type'] = 'application/json'
-            kwargs['body'] = json.dumps(kwargs['body'])
+            kwargs['body'] = self.codec.dumps(kwargs['body'])
+            threshold = self.config.compress_requests_threshold
+            if threshold and len(kwargs['body']) >= threshold:
+                kwargs['headers']['Content-Encoding'] = 'gzip'
+                kwargs['body'] = _gzip(kwargs['body'])
+
+        attempt = 0
+        while True:
+            event = RequestEvent(method, uri, self.management_url, attempt,
+                                 len(kwargs.get('body') or ''))
+            self.notify('before_request', event)
+            pool = self._pool()
+            http = pool.acquire(uri)
+            event.lap('wait')
+            event.new_connection = not http.connections
+            try:
+                resp, content = http.request(uri, method, **kwargs)
+            except:
+                pool.release(uri, http, discard=True)
+                event.lap('transfer')
+                event.finish(error=sys.exc_info()[1])
+                self.notify('after_request', event)
+                raise
+            pool.release(uri, http)
+            event.lap('transfer')
+            # Kept for revalidation, which remembers the body as sent
+            # rather than a copy of what it decodes to.
+            resp.content = content
+            body = self._loads(content)
+            event.lap('decode')
+            event.finish(resp.status, len(content or ''))
+            self.notify('after_request', event)
+            delay = self.retry_policy.delay(method, resp, body, attempt,
+                                            idempotent)
+            if delay is None:
+                break
+            time.sleep(delay)
+            attempt += 1
+
+        self._raise_for_status(resp.status, resp, body)
+        return resp, body
+
+    def _decode(self, status, resp, body):
+        """
+        Decode a response body, raising the matching exception for errors.
+        """
+        body = self._loads(body)
+        self._raise_for_status(status, resp, body)
+        return body
 
-        resp, body = super(ApiConnection, self).request(*args, **kwargs)
+    def _loads(self, body):
         if body:
             try:
-                body = json.loads(body)
+                body = self.codec.loads(body)
             except ValueError:
                 # OpenStack is JSON expect when it's not -- error messages
                 # sometimes aren't actually JSON.
                 body = {'error': {'message': body}}
         else:
             body = None
+        return body
 
-        if resp.status in (400, 401, 403, 404, 413, 500):
+    def _raise_for_status(self, status, resp, body):
+        # Any other server error (a 503, say) is raised too, once retrying
+        # has given up on it, rather than passed off as a response.
+        if status in (400, 401, 403, 404, 413) or status >= 500:
             raise exceptions.from_response(resp, body)
 
-        return resp, body
-
     def _cs_request(self, url, method, **kwargs):
-        if not self.management_url:
-            self.authenticate()
+        self._ensure_authenticated()
+        given_token = kwargs.pop('auth_token', None)
+        auth_token = given_token or self.auth_token
+        kwargs['headers'] = dict(kwargs.get('headers') or {})
+        kwargs['headers']['X-Auth-Token'] = auth_token
+        self.rate_limiter.wait(method, url)
 
         # Perform the request once. If we get a 401 back then it
         # might be because the auth token expired, so try to
         # re-authenticate and try again. If it still fails, bail.
         try:
-            kwargs.setdefault('headers', {})['X-Auth-Token'] = self.auth_token
             resp, body = self.request(self.management_url + url,
                                       method,
                                       **kwargs)
             return resp, body
-        except exceptions.Unauthorized, ex:
-            raise ex
-#            try:
-#                self.authenticate()
-#                resp, body = self.request(self.management_url + url,
-#                                          method,
-#                                          **kwargs)
-#                return resp, body
-#            except exceptions.Unauthorized:
-#                raise ex
+        except exceptions.Unauthorized:
+            if given_token or not self._can_authenticate():
+                raise
+            self._reauthenticate(auth_token)
+            kwargs['headers']['X-Auth-Token'] = self.auth_token
+            return self.request(self.management_url + url, method, **kwargs)
+
+    def _can_authenticate(self):
+        return bool(self.config.username and self.config.apikey)
+
+    def _ensure_authenticated(self):
+        if not self.management_url or self._token_expiring():
+            self._auth_lock.acquire()
+            try:
+                # Another thread may have authenticated while we waited.
+                if not self.management_url:
+                    self.authenticate()
+                elif self._token_expiring():
+                    self.authenticate(force=True)
+            finally:
+                self._auth_lock.release()
+        # Outside the auth lock: fetching the limits is a request of its
+        # own, which may need to authenticate again. Checked here rather
+        # than in authenticate(), which callers may have done themselves.
+        if self.config.rate_limits_from_api and not self._limits_loaded:
+            self._load_rate_limits_once()
+
+    def _load_rate_limits_once(self):
+        self._limits_lock.acquire()
+        try:
+            if not self._limits_loaded:
+                # Not every deployment has /limits; carry on without them
+                # if not.
+                try:
+                    self.load_rate_limits()
+                except exceptions.ApiException:
+                    pass
+        finally:
+            self._limits_lock.release()
+
+    def load_rate_limits(self):
+        """
+        Fetch the account's rate limits from the API, and stay inside them
+        (as well as those in the ``rate_limits`` config option) from now on.
+        """
+        # Set first: the request for them mustn't go looking for them too.
+        self._limits_loaded = True
+        resp, body = self.get('/limits')
+        self.rate_limiter.limits = (parse_limits(self.config.rate_limits) +
+                                    limits_from_api(body or {}))
+
+    def _token_expiring(self):
+        return (self.token_expires is not None and
+                self.token_expires - self.token_margin <= time.time() and
+                self._can_authenticate())
+
+    def _reauthenticate(self, stale_token):
+        """
+        Replace ``stale_token``, which the API has just rejected. However
+        many threads find out at once, only the first authenticates again;
+        the rest just pick up the new token.
+        """
+        self._auth_lock.acquire()
+        try:
+            if self.auth_token == stale_token:
+                self.token_cache.invalidate(self.config.auth_url,
+                                            self.config.username,
+                                            self.config.apikey,
+                                            stale_token)
+                self.authenticate(force=True)
+        finally:
+            self._auth_lock.release()
 
     def get(self, url, **kwargs):
+        if self.config.revalidate and not self.config.allow_cache:
+            return self._revalidating_get(url, **kwargs)
         url = self._munge_get_url(url)
         return self._cs_request(url, 'GET', **kwargs)
 
+    def stream(self, url, chunk_size=64 * 1024, **kwargs):
+        """
+        GET ``url``, but instead of the decoded body return an iterator over
+        the raw body text, read ``chunk_size`` bytes at a time as it
+        arrives. Errors are raised before anything is returned, as for
+        :meth:`get`.
+
+        The connection goes back to the pool once the body has been read
+        to the end. Close the iterator to give up early; the connection is
+        then thrown away rather than reused.
+        """
+        self._ensure_authenticated()
+        given_token = kwargs.get('auth_token')
+        auth_token = given_token or self.auth_token
+        headers = dict(kwargs.get('headers') or {})
+        headers['User-Agent'] = self.config.user_agent
+        headers['Accept-Encoding'] = self._accept_encoding()
+        headers['X-Auth-Token'] = auth_token
+        self.rate_limiter.wait('GET', url)
+        url = self._munge_get_url(url)
+
+        # As in _cs_request: a 401 may just mean the token has expired or
+        # been revoked, so re-authenticate and try once more.
+        try:
+            return self._stream(url, headers, chunk_size)
+        except exceptions.Unauthorized:
+            if given_token or not self._can_authenticate():
+                raise
+            self._reauthenticate(auth_token)
+            headers['X-Auth-Token'] = self.auth_token
+            return self._stream(url, headers, chunk_size)
+
+    def _stream(self, url, headers, chunk_size):
+        uri = self.management_url + url
+
+        attempt = 0
+        while True:
+            event = RequestEvent('GET', uri, self.management_url, attempt)
+            self.notify('before_request', event)
+            pool = self._pool()
+            http = pool.acquire(uri)
+            event.lap('wait')
+            event.new_connection = not http.connections
+            try:
+                conn, resp = self._stream_request(http, uri, headers)
+                event.lap('headers')
+                if resp.status < 300:
+                    return ChunkReader(self, pool, uri, http, conn, resp,
+                                       chunk_size, event)
+                # Errors (and a "changes-since" 304) are small; read them
+                # whole.
+                content = resp.read()
+                encoding = resp.getheader('content-encoding')
+                if content and encoding in ('gzip', 'deflate'):
+                    content = zlib.decompress(content, _AUTO_WBITS)
+            except:
+                pool.release(uri, http, discard=True)
+                event.lap('transfer')
+                event.finish(error=sys.exc_info()[1])
+                self.notify('after_request', event)
+                raise
+            pool.release(uri, http)
+            event.lap('transfer')
+            event.finish(resp.status, len(content))
+            self.notify('after_request', event)
+            import httplib2
+            resp = httplib2.Response(resp)
+            body = self._loads(content)
+            delay = self.retry_policy.delay('GET', resp, body, attempt)
+            if delay is None:
+                break
+            time.sleep(delay)
+            attempt += 1
+
+        self._raise_for_status(resp.status, resp, body)
+        return iter([])
+
+    def _stream_request(self, http, uri, headers):
+        """
+        Send a GET over one of the pooled ``Http`` object's keep-alive
+        connections (making one if need be), and return the connection
+        and the not-yet-read response.
+        """
+        scheme, authority, path, query, frag = urlparse.urlsplit(uri)
+        path = urlparse.urlunsplit(('', '', path, query, ''))
+        key = '%s:%s' % (scheme, authority)
+        conn = http.connections.get(key)
+        if conn is None:
+            conn = http.connections[key] = self._new_stream_connection(
+                http, scheme, authority)
+
+        # A kept-alive connection may have been closed by the server since
+        # it was last used; if so, reconnect and try once more.
+        for attempt in (1, 2):
+            try:
+                conn.request('GET', path, headers=headers)
+                return conn, conn.getresponse()
+            except (httplib.HTTPException, IOError):
+                conn.close()
+                if attempt == 2:
+                    raise
+
+    def _new_stream_connection(self, http, scheme, authority):
+        """
+        Make a connection the way the ``Http`` object ``http`` itself
+        would, so that streamed GETs go through the same proxy, with the
+        same timeout and certificate checks, as every other request.
+        """
+        import httplib2
+        connection_type = httplib2.SCHEME_TO_CONNECTION[scheme]
+        proxy_info = getattr(http, 'proxy_info', None)
+        if hasattr(http, '_get_proxy_info'):
+            proxy_info = http._get_proxy_info(scheme, authority)
+        kwargs = {'timeout': http.timeout, 'proxy_info': proxy_info}
+        if scheme == 'https':
+            # Older httplib2s have fewer of these; pass on what there is.
+            for name in ('ca_certs', 'disable_ssl_certificate_validation',
+                         'ssl_version'):
+                if hasattr(http, name):
+                    kwargs[name] = getattr(http, name)
+            certs = list(http.certificates.iter(authority))
+            if certs:
+                kwargs['key_file'], kwargs['cert_file'] = certs[0][:2]
+        return connection_type(authority, **kwargs)
+
+    def _accept_encoding(self):
+        if self.config.compress_responses:
+            return 'gzip, deflate'
+        return 'identity'
+
     def post(self, url, **kwargs):
         return self._cs_request(url, 'POST', **kwargs)
 
@@ -86,14 +426,101 @@ class ApiConnection(httplib2.Http):
     def delete(self, url, **kwargs):
         return self._cs_request(url, 'DELETE', **kwargs)
 
-    def authenticate(self):
-        headers = {
-            'X-Auth-User': self.config.username,
-            'X-Auth-Key': self.config.apikey,
-        }
-        resp, body = self.request(self.config.auth_url, 'GET', headers=headers)
-        self.management_url = resp['x-server-management-url']
-        self.auth_token = resp['x-auth-token']
+    def authenticate(self, force=False):
+        """
+        Get a token, from the token cache if there's one there that isn't
+        about to expire, or else from the auth service. Pass ``force=True``
+        to skip the cache.
+        """
+        auth_url, username = self.config.auth_url, self.config.username
+        apikey = self.config.apikey
+        cached = None
+        if not force:
+            cached = self.token_cache.get(auth_url, username, apikey,
+                                          self._refresh_margin(
+                                              self.config.token_ttl))
+        if cached:
+            auth_token, management_url, expires = cached
+        else:
+            headers = {
+                'X-Auth-User': username,
+                'X-Auth-Key': apikey,
+            }
+            resp, body = self.request(auth_url, 'GET', headers=headers)
+            auth_token = resp['x-auth-token']
+            management_url = resp['x-server-management-url']
+            expires = self._token_expiry(resp)
+            self.token_cache.set(auth_url, username, apikey, auth_token,
+                                 management_url, expires)
+
+        # Set the token first: other threads take a management_url as the
+        # sign that authentication is done.
+        self.auth_token = auth_token
+        self.token_expires = expires
+        self.token_margin = self._refresh_margin(expires - time.time())
+        self.management_url = management_url
+
+    def _refresh_margin(self, lifetime):
+        """
+        How long before a token with ``lifetime`` seconds left expires to
+        renew it: ``token_refresh_margin``, but no more than half the
+        lifetime, so that short-lived tokens aren't renewed on every
+        request.
+        """
+        return min(self.config.token_refresh_margin, lifetime / 2.0)
+
+    def _token_expiry(self, resp):
+        """
+        Work out when a new token expires: from the ``X-Auth-Token-Expires``
+        header if the auth service sends one (either a number of seconds or
+        an HTTP date), and ``token_ttl`` seconds from now if not.
+        """
+        import rfc822
+        expires = resp.get('x-auth-token-expires')
+        if expires:
+            if expires.isdigit():
+                return time.time() + int(expires)
+            parsed = rfc822.parsedate_tz(expires)
+            if parsed:
+                return rfc822.mktime_tz(parsed)
+        return time.time() + self.config.token_ttl
+
+    def _revalidating_get(self, url, **kwargs):
+        """
+        GET ``url``, but make it a conditional GET if we've fetched it
+        before.
+
+        The ``ETag``/``Last-Modified`` validators and the raw body of each
+        response are remembered. The next GET for the same URL sends them
+        back as ``If-None-Match``/``If-Modified-Since``, and if the API
+        answers ``304 Not Modified`` the remembered body is decoded afresh
+        instead of transferring it again. ``Cache-Control: no-cache`` makes
+        sure no cache along the way answers for the API.
+        """
+        self._ensure_authenticated()
+        key = (url, kwargs.get('auth_token') or self.auth_token)
+        cached = self._validators.get(key)
+        headers = dict(kwargs.get('headers') or {})
+        headers['Cache-Control'] = 'no-cache'
+        if cached:
+            etag, modified, body = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if modified:
+                headers['If-Modified-Since'] = modified
+        kwargs['headers'] = headers
+
+        resp, body = self._cs_request(url, 'GET', **kwargs)
+        if resp.status == 304 and cached:
+            return resp, self._loads(cached[2])
+
+        etag = resp.get('etag')
+        modified = resp.get('last-modified')
+        if resp.status == 200 and (etag or modified):
+            self._validators.set(key, (etag, modified, resp.content))
+        else:
+            self._validators.invalidate(key)
+        return resp, body
 
     def _munge_get_url(self, url):
         """
@@ -113,3 +540,83 @@ class ApiConnection(httplib2.Http):
             query.append(('fresh', str(time.time())))
             query = urllib.urlencode(query)
             return urlparse.urlunsplit((scheme, netloc, path, query, frag))
+
+
+# Tells zlib to detect and handle either a gzip or a zlib header.
+_AUTO_WBITS = 32 + zlib.MAX_WBITS
+
+
+def _gzip(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ChunkReader(object):
+    """
+    Iterates over a streamed response body, a chunk at a time, for
+    :meth:`ApiConnection.stream`.
+
+    Once the body has been read to the end, the connection goes back to
+    the pool. Closing the reader before then -- or dropping the last
+    reference to it -- throws the connection away instead, since there's
+    unread response on it.
+
+    (A class rather than a generator because Python 2.4 doesn't allow a
+    ``yield`` inside ``try``/``finally``.)
+    """
+    def __init__(self, api, pool, uri, http, conn, resp, chunk_size, event):
+        self.api = api
+        self.pool = pool
+        self.uri = uri
+        self.http = http
+        self.conn = conn
+        self.resp = resp
+        self.chunk_size = chunk_size
+        self.event = event
+        self.received = 0
+        self.done = False
+        if resp.getheader('content-encoding') in ('gzip', 'deflate'):
+            self.decoder = zlib.decompressobj(_AUTO_WBITS)
+        else:
+            self.decoder = None
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        if self.done:
+            raise StopIteration
+        try:
+            chunk = self.resp.read(self.chunk_size)
+            last = not chunk
+            if self.decoder and last:
+                chunk = self.decoder.flush()
+            elif self.decoder:
+                chunk = self.decoder.decompress(chunk)
+        except:
+            self._finish(False)
+            raise
+        self.received += len(chunk)
+        if last:
+            self._finish(True)
+            if not chunk:
+                raise StopIteration
+        return chunk
+
+    def close(self):
+        if not self.done:
+            self._finish(False)
+
+    def __del__(self):
+        self.close()
+
+    def _finish(self, finished):
+        self.done = True
+        if not finished:
+            self.conn.close()
+        self.pool.release(self.uri, self.http, discard=not finished)
+        # The transfer time includes however long the caller took over
+        # each chunk, since it's read as they ask for it.
+        self.event.lap('transfer')
+        self.event.finish(self.resp.status, self.received)
+        self.api.notify('after_request', self.event)
@@ -52,6 +52,21 @@ class OverLimit(ApiException):
     http_status = 413
     message = "Over limit"
 
+
+class WaitTimeout(ApiException):
+    """
+    Resources didn't reach the status being waited for in time. This isn't
+    an HTTP error, so ``code`` is ``None``; ``details`` is a list of the
+    resources still pending.
+    """
+    message = "Timed out waiting for status"
+
+    def __init__(self, message=None, details=None):
+        ApiException.__init__(self, None, message, details)
+
+    def __str__(self):
+        return self.message
+
 # In Python 2.4 Exception is old-style and doesn't have a __subclasses__()
 # so we can do this:
 #     _code_map = dict((c.http_status, c)
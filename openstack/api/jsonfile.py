@@ -0,0 +1,54 @@
+"""
+Reading and writing the small JSON files -- the token cache, the name
+index -- that the client keeps between processes.
+"""
+
+import os
+import tempfile
+
+from openstack.api.codecs import get_codec
+
+
+def load(path, codec=None):
+    """
+    Read the JSON object in the file at ``path``, or ``{}`` if there isn't
+    one there (or it can't be read).
+    """
+    codec = codec or get_codec()
+    try:
+        f = open(path)
+        try:
+            return codec.loads(f.read())
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return {}
+
+
+def save(path, data, codec=None):
+    """
+    Write ``data`` as JSON to the file at ``path``, readable by its owner
+    alone, and return whether that worked.
+
+    The data is written to a temporary file that is then renamed over the
+    old one, so that other processes never see a half-written file.
+    """
+    codec = codec or get_codec()
+    directory = os.path.dirname(path)
+    try:
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0700)
+        # mkstemp makes the file readable by us alone.
+        fd, tmp = tempfile.mkstemp(dir=directory or os.curdir)
+        try:
+            try:
+                os.write(fd, codec.dumps(data))
+            finally:
+                os.close(fd)
+            os.rename(tmp, path)
+        except:
+            os.unlink(tmp)
+            raise
+    except (IOError, OSError):
+        return False
+    return True
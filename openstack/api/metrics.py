@@ -0,0 +1,239 @@
+"""
+Instrumentation: seeing where the time goes in API calls.
+
+Add an observer to a client's connection and it's told about every request
+made through it::
+
+    >>> stats = RequestStats()
+    >>> compute.connection.add_observer(stats)
+    >>> compute.servers.list()
+    >>> stats.summary()['GET /servers/detail']['p99']
+
+An observer is any object with some of these methods, each called with an
+event describing what happened:
+
+``before_request(event)``
+    A :class:`RequestEvent` for a request about to be sent. Only its
+    ``method``, ``url``, ``template``, ``attempt`` and ``bytes_sent`` are
+    filled in yet.
+
+``after_request(event)``
+    The same :class:`RequestEvent`, once the response has been read and
+    decoded (or the request raised).
+
+``after_list(event)``
+    A :class:`ListEvent` for each list fetched by a manager.
+
+Observers are called in the thread making the request, so they should be
+quick, and thread-safe if the client is shared between threads.
+"""
+
+import bisect
+import re
+import threading
+import time
+import urlparse
+
+# Path segments that identify a particular resource: numeric IDs and UUIDs.
+_ID_SEGMENT = re.compile(r'/(\d+|[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}'
+                         r'[0-9a-fA-F]{12})(?=/|$)')
+
+
+def url_template(url, base=None):
+    """
+    Turn a request URL into a template shared by every request to the same
+    endpoint: the part after ``base`` (or else just the path), without the
+    query string, and with resource IDs replaced by ``{id}``. I.e.
+    ``/servers/1234/action`` becomes ``/servers/{id}/action``.
+    """
+    if base and url.startswith(base):
+        url = url[len(base):].split('?', 1)[0]
+    else:
+        url = urlparse.urlsplit(url)[2]
+    return _ID_SEGMENT.sub('/{id}', url)
+
+
+class RequestEvent(object):
+    """
+    What happened during one HTTP request (each retry is a request of its
+    own, with a higher ``attempt``).
+
+    ``timings`` maps each phase of the request to the seconds spent in it:
+
+    ``wait``
+        Waiting for a connection from the pool.
+    ``transfer``
+        Sending the request and reading the response: connecting (if
+        ``new_connection``), server time and the body download.
+    ``headers``
+        For streamed requests, the part of that up to the response headers
+        arriving (the rest is ``transfer``).
+    ``decode``
+        Decoding the JSON body.
+
+    ``elapsed`` is the total. ``bytes_sent`` and ``bytes_received`` are
+    the sizes of the request and response bodies (the response after any
+    decompression). ``error`` is the exception if the request raised
+    rather than getting a response.
+    """
+    def __init__(self, method, url, base=None, attempt=0, bytes_sent=0):
+        self.method = method
+        self.url = url
+        self.base = base
+        self.attempt = attempt
+        self.bytes_sent = bytes_sent
+        self.bytes_received = 0
+        self.status = None
+        self.error = None
+        self.new_connection = False
+        self.timings = {}
+        self.started = self._last = time.time()
+        self.elapsed = None
+
+    @property
+    def template(self):
+        return url_template(self.url, self.base)
+
+    def lap(self, phase):
+        """
+        Record the time since the last lap as spent in ``phase``.
+        """
+        now = time.time()
+        self.timings[phase] = self.timings.get(phase, 0) + now - self._last
+        self._last = now
+
+    def finish(self, status=None, bytes_received=0, error=None):
+        self.status = status
+        self.bytes_received = bytes_received
+        self.error = error
+        self.elapsed = self._last - self.started
+
+
+class ListEvent(object):
+    """
+    A list fetched by a manager's ``_list()``: ``count`` resources from
+    ``url`` in ``elapsed`` seconds, all told -- the request (or requests,
+    if it was retried or re-authenticated), decoding and building the
+    list. Each :class:`Resource` is only built when it's first used, so
+    that cost falls wherever that is instead.
+    """
+    def __init__(self, manager, url, count, elapsed):
+        self.manager = manager
+        self.url = url
+        self.count = count
+        self.elapsed = elapsed
+
+    @property
+    def template(self):
+        return url_template(self.url)
+
+
+class Histogram(object):
+    """
+    A histogram of durations in seconds, with buckets growing by 10% from
+    0.1ms to beyond 10 minutes, so it takes the same memory however many
+    values go into it and its percentiles are within 10%.
+    """
+    BOUNDS = [0.0001 * 1.1 ** i for i in range(170)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def mean(self):
+        return self.count and self.total / self.count
+
+    def percentile(self, p):
+        """
+        The duration ``p`` percent of values were at or below (as the upper
+        bound of its bucket, but never above the largest value seen).
+        """
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                if i < len(self.BOUNDS):
+                    return min(self.BOUNDS[i], self.max)
+                return self.max
+        return self.max
+
+
+class RequestStats(object):
+    """
+    An observer that keeps a latency :class:`Histogram` per endpoint.
+
+    Requests are grouped by method and URL template, i.e. ``GET
+    /servers/{id}``; lists fetched by managers by manager and template,
+    i.e. ``ServerManager /servers/detail``.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._lock.acquire()
+        try:
+            self.endpoints = {}
+        finally:
+            self._lock.release()
+
+    def after_request(self, event):
+        key = '%s %s' % (event.method, event.template)
+        self._add(key, event.elapsed, event.bytes_sent + event.bytes_received,
+                  event.error is not None or event.status >= 400)
+
+    def after_list(self, event):
+        key = '%s %s' % (event.manager, event.template)
+        self._add(key, event.elapsed, 0, False)
+
+    def _add(self, key, elapsed, nbytes, failed):
+        self._lock.acquire()
+        try:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = {
+                    'histogram': Histogram(),
+                    'bytes': 0,
+                    'errors': 0,
+                }
+            stats['histogram'].add(elapsed)
+            stats['bytes'] += nbytes
+            stats['errors'] += failed
+        finally:
+            self._lock.release()
+
+    def summary(self):
+        """
+        Return a dict of endpoint -> dict of ``count``, ``errors``,
+        ``bytes`` and the ``mean``, ``p50``, ``p90``, ``p99`` and ``max``
+        latencies in seconds.
+        """
+        self._lock.acquire()
+        try:
+            summary = {}
+            for key, stats in self.endpoints.items():
+                hist = stats['histogram']
+                summary[key] = {
+                    'count': hist.count,
+                    'errors': stats['errors'],
+                    'bytes': stats['bytes'],
+                    'mean': hist.mean(),
+                    'p50': hist.percentile(50),
+                    'p90': hist.percentile(90),
+                    'p99': hist.percentile(99),
+                    'max': hist.max,
+                }
+            return summary
+        finally:
+            self._lock.release()
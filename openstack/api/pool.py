@@ -0,0 +1,177 @@
+"""
+A thread-safe pool of keep-alive HTTP connections, shared between clients.
+"""
+
+import threading
+import time
+import urlparse
+
+
+class ConnectionPool(object):
+    """
+    A pool of :class:`httplib2.Http` objects, keyed by scheme and host.
+
+    Each ``Http`` object keeps its own keep-alive connection open, and is
+    only ever checked out to one caller at a time, so many threads can talk
+    to the same endpoint at once without sharing any httplib2 state.
+
+    :param maxsize: the most idle connections to keep around, across all
+                    hosts. The least recently used ones are closed first.
+    :param max_per_host: the most connections to have checked out to any
+                         one host at once; callers block until one frees
+                         up. ``0`` means no limit.
+    :param idle_timeout: close connections that have sat unused for this
+                         many seconds. ``0`` means never.
+    """
+    def __init__(self, maxsize=10, max_per_host=4, idle_timeout=60):
+        self.maxsize = maxsize
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        # host -> list of (last_used, http), most recently used last.
+        self._idle = {}
+        # host -> number of connections currently checked out.
+        self._in_use = {}
+        self._cond = threading.Condition()
+
+    def acquire(self, url):
+        """
+        Check out a connection for talking to the host in ``url``.
+
+        Every connection acquired must be given back with :meth:`release`.
+        """
+        host = _host_key(url)
+        self._cond.acquire()
+        try:
+            stale = self._evict_idle()
+            while self.max_per_host and \
+                  self._in_use.get(host, 0) >= self.max_per_host:
+                self._cond.wait()
+            self._in_use[host] = self._in_use.get(host, 0) + 1
+            idle = self._idle.get(host)
+            if idle:
+                http = idle.pop()[1]
+            else:
+                http = None
+        finally:
+            self._cond.release()
+
+        _close_all(stale)
+        if http is None:
+            http = self._new_connection()
+        return http
+
+    def release(self, url, http, discard=False):
+        """
+        Return a connection to the pool.
+
+        Pass ``discard=True`` if the connection may be in a bad state (i.e.
+        the request on it raised), and it'll be closed instead of reused.
+        """
+        host = _host_key(url)
+        stale = []
+        self._cond.acquire()
+        try:
+            self._in_use[host] -= 1
+            if discard:
+                stale.append(http)
+            else:
+                self._idle.setdefault(host, []).append((time.time(), http))
+                stale.extend(self._evict_idle())
+                stale.extend(self._evict_overflow())
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+        _close_all(stale)
+
+    def clear(self):
+        """
+        Close every idle connection in the pool.
+        """
+        self._cond.acquire()
+        try:
+            stale = [http for idle in self._idle.values()
+                          for (last_used, http) in idle]
+            self._idle.clear()
+        finally:
+            self._cond.release()
+        _close_all(stale)
+
+    def _new_connection(self):
+        # httplib2 (and the email package it brings along) is imported
+        # here rather than up top, so that command lines that never make a
+        # request -- "help", say -- don't pay for it.
+        import httplib2
+        http = httplib2.Http()
+        http.force_exception_to_status_code = True
+        return http
+
+    def _evict_idle(self):
+        """
+        Drop connections idle for longer than ``idle_timeout``; call with
+        the lock held. Returns the dropped connections for closing.
+        """
+        if not self.idle_timeout:
+            return []
+        cutoff = time.time() - self.idle_timeout
+        stale = []
+        for host, idle in self._idle.items():
+            fresh = [(t, http) for (t, http) in idle if t >= cutoff]
+            stale.extend(http for (t, http) in idle if t < cutoff)
+            if fresh:
+                self._idle[host] = fresh
+            else:
+                del self._idle[host]
+        return stale
+
+    def _evict_overflow(self):
+        """
+        Drop the least recently used connections beyond ``maxsize``; call
+        with the lock held. Returns the dropped connections for closing.
+        """
+        entries = [(t, host, http) for (host, idle) in self._idle.items()
+                                   for (t, http) in idle]
+        overflow = len(entries) - self.maxsize
+        if overflow <= 0:
+            return []
+        entries.sort()
+        stale = []
+        for (t, host, http) in entries[:overflow]:
+            self._idle[host].remove((t, http))
+            if not self._idle[host]:
+                del self._idle[host]
+            stale.append(http)
+        return stale
+
+
+def _host_key(url):
+    scheme, netloc = urlparse.urlsplit(url)[:2]
+    return '%s://%s' % (scheme.lower(), netloc.lower())
+
+
+def _close_all(https):
+    for http in https:
+        for conn in http.connections.values():
+            conn.close()
+        http.connections.clear()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(config):
+    """
+    Get the process-wide :class:`ConnectionPool` for the given config.
+
+    Clients whose configs ask for the same pool settings share one pool, and
+    thus share keep-alive connections to any host they have in common.
+    """
+    key = (config.pool_maxsize, config.pool_max_per_host,
+           config.pool_idle_timeout)
+    _pools_lock.acquire()
+    try:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(*key)
+        return _pools[key]
+    finally:
+        _pools_lock.release()
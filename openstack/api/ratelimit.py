@@ -0,0 +1,150 @@
+"""
+Client-side rate limiting, to stay inside the account's API limits.
+"""
+
+import re
+import threading
+import time
+
+# Seconds in each unit the API gives limits in.
+UNITS = {
+    'SECOND': 1,
+    'MINUTE': 60,
+    'HOUR': 60 * 60,
+    'DAY': 24 * 60 * 60,
+}
+
+
+class TokenBucket(object):
+    """
+    Lets through ``value`` calls per ``unit``, shared by every thread using
+    the bucket.
+
+    The bucket starts full (or with ``remaining`` tokens), so a burst of up
+    to ``value`` calls goes straight through; after that, callers are let
+    through one at a time, evenly spaced, in the order they asked.
+    """
+    def __init__(self, value, unit='MINUTE', remaining=None):
+        self.capacity = float(value)
+        self.fill_rate = value / float(UNITS[unit.upper()])
+        if remaining is None:
+            remaining = value
+        self.tokens = float(min(remaining, value))
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Take a token, blocking until there's one to take.
+        """
+        self._lock.acquire()
+        try:
+            now = time.time()
+            self.tokens = min(self.capacity, self.tokens +
+                              (now - self._updated) * self.fill_rate)
+            self._updated = now
+            # Going into debt reserves the next token for this caller, so
+            # waiting callers don't race each other for it.
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return
+            wait = -self.tokens / self.fill_rate
+        finally:
+            self._lock.release()
+        time.sleep(wait)
+
+
+class Limit(object):
+    """
+    A rate limit on requests with a given HTTP verb and a path matching a
+    regex, i.e. ``Limit('POST', '^/servers', 50, 'DAY')``.
+    """
+    def __init__(self, verb, regex, value, unit='MINUTE', remaining=None):
+        self.verb = verb.upper()
+        self.regex = regex
+        self.value = value
+        self.unit = unit.upper()
+        self.bucket = TokenBucket(value, self.unit, remaining)
+        self._pattern = re.compile(regex)
+
+    def __repr__(self):
+        return "<Limit: %s %s %s/%s>" % (self.verb, self.regex, self.value,
+                                         self.unit)
+
+    def matches(self, method, path):
+        return self.verb in ('*', method) and self._pattern.search(path)
+
+
+class RateLimiter(object):
+    """
+    Holds requests back until every :class:`Limit` they fall under lets
+    them through.
+    """
+    def __init__(self, limits=()):
+        self.limits = list(limits)
+
+    def wait(self, method, path):
+        """
+        Block until a ``method`` request to ``path`` (relative to the
+        management URL) is allowed.
+
+        Limits match against the query string too -- the API limits
+        ``changes-since`` queries on their own -- less the ``fresh``
+        parameter the connection adds to defeat caching.
+        """
+        path = _without_fresh(path)
+        for limit in self.limits:
+            if limit.matches(method, path):
+                limit.bucket.take()
+
+
+def _without_fresh(path):
+    if '?' not in path:
+        return path
+    path, query = path.split('?', 1)
+    query = '&'.join(p for p in query.split('&')
+                     if p and not p.startswith('fresh='))
+    if query:
+        return '%s?%s' % (path, query)
+    return path
+
+
+def parse_limits(spec):
+    """
+    Parse limits from config: ``VERB:REGEX:VALUE/UNIT`` separated by
+    semicolons, i.e. ``"POST:.*:10/MINUTE;GET:^/servers:100/MINUTE"``.
+    """
+    limits = []
+    for part in (spec or '').split(';'):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            verb, rest = part.split(':', 1)
+            regex, rate = rest.rsplit(':', 1)
+            value, unit = rate.split('/')
+            limits.append(Limit(verb, regex, int(value), unit))
+        except (ValueError, KeyError):
+            raise ValueError("Bad rate limit %r; expected VERB:REGEX:VALUE/UNIT"
+                             % part)
+    return limits
+
+
+def limits_from_api(body):
+    """
+    Build :class:`Limit`\s from a ``GET /limits`` response.
+
+    Understands both the v1.0 format, with one entry per verb and regex,
+    and the v1.1 one, which groups the verbs' limits under each regex.
+    """
+    limits = []
+    for rate in body.get('limits', {}).get('rate', []):
+        if 'limit' in rate:
+            for limit in rate['limit']:
+                limits.append(Limit(limit['verb'], rate['regex'],
+                                    limit['value'], limit['unit'],
+                                    limit.get('remaining')))
+        else:
+            limits.append(Limit(rate['verb'], rate['regex'], rate['value'],
+                                rate['unit'], rate.get('remaining')))
+    return limits
@@ -0,0 +1,136 @@
+"""
+Retrying requests that were rate limited or hit a transient server error.
+"""
+
+import calendar
+import random
+import threading
+import time
+
+# Safe to repeat: doing them twice has the same effect as doing them once.
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+# Worth retrying: rate limited, timed out, or a (probably) passing server
+# problem.
+RETRYABLE_STATUSES = (408, 413, 500, 502, 503, 504)
+
+# Means the request was turned away without being acted on, so it's safe
+# to retry even if it isn't idempotent.
+REJECTED_STATUSES = (413,)
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed request should be retried, and after how long.
+
+    :param retries: How many times to retry any one request. ``0`` turns
+                    retrying off.
+    :param backoff: The base delay, in seconds. The nth retry waits a random
+                    time up to ``backoff * 2 ** n`` ("full jitter"), so that
+                    many clients retrying at once don't stay in step.
+    :param max_backoff: The longest backoff delay.
+    :param max_delay: The longest the API can ask us to wait with a
+                      ``Retry-After``; any longer and the request fails
+                      instead.
+    :param budget: Retries earned per request made. Retries are only made
+                   while there's budget for them (up to ten can be banked),
+                   so that when the API is down for good clients back off
+                   rather than multiplying the load on it.
+
+    Requests are only retried if they're idempotent (GET, PUT, DELETE...)
+    or were rejected by rate limiting before anything was done, unless the
+    caller says the request is idempotent.
+    """
+    def __init__(self, retries=0, backoff=0.5, max_backoff=30, max_delay=60,
+                 budget=0.1):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_delay = max_delay
+        self.budget = RetryBudget(budget)
+
+    def delay(self, method, resp, body, attempt, idempotent=None):
+        """
+        Return how many seconds to wait before retrying the request, or
+        ``None`` if it shouldn't be retried.
+
+        :param attempt: How many retries have been made already.
+        """
+        if attempt == 0:
+            self.budget.deposit()
+        if attempt >= self.retries or resp.status not in RETRYABLE_STATUSES:
+            return None
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if not idempotent and resp.status not in REJECTED_STATUSES:
+            return None
+
+        delay = retry_after(resp, body)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_backoff,
+                                          self.backoff * 2 ** attempt))
+        elif delay > self.max_delay:
+            return None
+
+        if not self.budget.withdraw():
+            return None
+        return delay
+
+
+class RetryBudget(object):
+    """
+    A thread-safe allowance of retries: each request earns ``ratio`` of a
+    retry, and up to ``limit`` can be saved up.
+    """
+    def __init__(self, ratio, limit=10):
+        self.ratio = ratio
+        self.limit = limit
+        self.tokens = float(limit)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        self._lock.acquire()
+        try:
+            self.tokens = min(self.limit, self.tokens + self.ratio)
+        finally:
+            self._lock.release()
+
+    def withdraw(self):
+        self._lock.acquire()
+        try:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+        finally:
+            self._lock.release()
+
+
+def retry_after(resp, body):
+    """
+    How many seconds the API asked us to wait, or ``None`` if it didn't say.
+
+    Looks at the ``Retry-After`` header (seconds, or an HTTP date) and then
+    the ``retryAfter`` field Rackspace puts in over-limit errors (an ISO
+    8601 time).
+    """
+    value = resp.get('retry-after')
+    if value:
+        value = value.strip()
+        if value.isdigit():
+            return int(value)
+        import rfc822
+        parsed = rfc822.parsedate_tz(value)
+        if parsed:
+            return max(0, rfc822.mktime_tz(parsed) - time.time())
+
+    if isinstance(body, dict) and body:
+        error = body.values()[0]
+        if isinstance(error, dict) and error.get('retryAfter'):
+            try:
+                when = time.strptime(error['retryAfter'][:19],
+                                     '%Y-%m-%dT%H:%M:%S')
+            except ValueError:
+                return None
+            return max(0, calendar.timegm(when) - time.time())
+    return None
@@ -0,0 +1,175 @@
+"""
+Incremental parsing of large JSON list responses.
+
+Rather than buffering a whole ``/servers/detail`` response and decoding it
+in one go, :func:`iter_items` reads the body a chunk at a time and decodes
+each element of the list as soon as all of it has arrived. Memory use stays
+at roughly one element plus one chunk, however long the list is.
+"""
+
+import re
+
+# A complete JSON string, escapes and all.
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+# The characters that matter when finding our way to the list.
+_STRUCTURE = re.compile(r'[\[\]{}",]')
+# The characters that matter when finding the end of a list element.
+_NESTING = re.compile(r'[\[\]{}"]')
+# The end of a number, true, false or null.
+_SCALAR_END = re.compile(r'[\s,\]}]')
+# The start of the next list element, or the end of the list.
+_NEXT_ITEM = re.compile(r'[^\s,]')
+
+
+def iter_items(chunks, paths, loads):
+    """
+    Yield the decoded elements of a JSON array as its text arrives.
+
+    :param chunks: An iterable of strings that together make up a JSON
+                   document.
+    :param paths: The places the array might be, each as a tuple of object
+                  keys from the top of the document, i.e. ``('servers',)``
+                  or ``('tenants', 'values')``. The first array found at
+                  any of them is the one used.
+    :param loads: The function to decode each element with.
+
+    If the document has no array at any of the paths, nothing is yielded.
+    Once the array has been read, the rest of ``chunks`` is consumed too.
+    """
+    parser = _Parser(chunks, paths, loads)
+    for item in parser.items():
+        yield item
+    for chunk in parser.chunks:
+        pass
+
+
+class _Parser(object):
+
+    def __init__(self, chunks, paths, loads):
+        self.chunks = iter(chunks)
+        self.paths = set(tuple(path) for path in paths)
+        self.loads = loads
+        self.buf = ''
+        self.pos = 0
+
+    def items(self):
+        # Walk the document structure until we get to the array. Each
+        # frame on the stack is [is_object, path, last_key, expecting_key];
+        # the path is None inside arrays, which we never look into.
+        stack = []
+        while True:
+            m = _STRUCTURE.search(self.buf, self.pos)
+            if m is None:
+                # Nothing but whitespace and scalars left; skip them.
+                self.pos = len(self.buf)
+                if not self._fill():
+                    return
+                continue
+
+            c = m.group()
+            self.pos = m.start()
+            if c == '"':
+                s = _STRING.match(self.buf, self.pos)
+                if s is None:
+                    if not self._fill():
+                        return
+                    continue
+                self.pos = s.end()
+                if stack and stack[-1][0] and stack[-1][3]:
+                    stack[-1][2] = self.loads(s.group())
+                    stack[-1][3] = False
+                continue
+
+            self.pos += 1
+            if c == '{':
+                stack.append([True, self._child_path(stack), None, True])
+            elif c == '[':
+                path = self._child_path(stack)
+                if path in self.paths:
+                    for item in self._array_items():
+                        yield item
+                    return
+                stack.append([False, None, None, False])
+            elif c in '}]':
+                if stack:
+                    stack.pop()
+            elif c == ',':
+                if stack and stack[-1][0]:
+                    stack[-1][3] = True
+
+    def _array_items(self):
+        while True:
+            m = _NEXT_ITEM.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise ValueError("JSON ended in the middle of a list.")
+                continue
+            self.pos = m.start()
+            if m.group() == ']':
+                self.pos += 1
+                return
+
+            end = self._value_end()
+            while end is None:
+                if not self._fill():
+                    raise ValueError("JSON ended in the middle of a list.")
+                end = self._value_end()
+            item = self.loads(self.buf[self.pos:end])
+            self.pos = end
+            yield item
+
+    def _value_end(self):
+        """
+        Find where the value starting at ``self.pos`` ends, or return None
+        if it hasn't all arrived yet.
+        """
+        buf = self.buf
+        c = buf[self.pos]
+        if c == '"':
+            m = _STRING.match(buf, self.pos)
+            return m and m.end()
+        if c not in '{[':
+            m = _SCALAR_END.search(buf, self.pos)
+            return m and m.start()
+
+        depth = 0
+        i = self.pos
+        while True:
+            m = _NESTING.search(buf, i)
+            if m is None:
+                return None
+            c = m.group()
+            if c == '"':
+                s = _STRING.match(buf, m.start())
+                if s is None:
+                    return None
+                i = s.end()
+                continue
+            i = m.end()
+            if c in '{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return i
+
+    def _child_path(self, stack):
+        if not stack:
+            return ()
+        is_object, path, key, expecting_key = stack[-1]
+        if not is_object or path is None:
+            return None
+        return path + (key,)
+
+    def _fill(self):
+        """
+        Read another chunk, dropping what's been parsed already. Returns
+        False once there's nothing left to read.
+        """
+        for chunk in self.chunks:
+            if chunk:
+                self.buf = self.buf[self.pos:] + chunk
+                self.pos = 0
+                return True
+        return False
@@ -0,0 +1,110 @@
+"""
+Caching of auth tokens between clients and between processes.
+"""
+
+import os
+import threading
+import time
+
+# Python 2.4 compat
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+from openstack.api import jsonfile
+from openstack.api.codecs import get_codec
+
+DEFAULT_TOKEN_CACHE_FILE = os.path.expanduser('~/.openstack/tokens.json')
+
+
+class TokenCache(object):
+    """
+    Remembers the token and management URL from each authentication, keyed
+    by auth URL, username and a digest of the API key, until the token
+    expires. Only a client with the same key gets a cached token, so wrong
+    credentials never authenticate on the strength of someone else's.
+
+    Tokens are always shared between every client in the process. Given a
+    ``path``, they're also saved to (and read from) that file, readable
+    only by its owner, so that short-lived processes can reuse them too.
+    """
+    # Shared by every TokenCache in the process.
+    _memory = {}
+    _lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = path
+        self.codec = get_codec()
+
+    def get(self, auth_url, username, apikey, margin=0):
+        """
+        Get a ``(token, management_url, expires)`` tuple for the given
+        credentials, or ``None`` if there isn't one that's good for at
+        least another ``margin`` seconds.
+        """
+        key = self._key(auth_url, username, apikey)
+        self._lock.acquire()
+        try:
+            entry = self._memory.get(key)
+            if entry is None and self.path:
+                entry = self._load().get(key)
+                if entry is not None:
+                    entry = tuple(entry)
+                    self._memory[key] = entry
+        finally:
+            self._lock.release()
+        if entry is None or entry[2] - margin <= time.time():
+            return None
+        return entry
+
+    def set(self, auth_url, username, apikey, token, management_url,
+            expires):
+        """
+        Remember a fresh token.
+        """
+        key = self._key(auth_url, username, apikey)
+        entry = (token, management_url, expires)
+        self._lock.acquire()
+        try:
+            self._memory[key] = entry
+            if self.path:
+                entries = self._load()
+                entries[key] = entry
+                self._save(entries)
+        finally:
+            self._lock.release()
+
+    def invalidate(self, auth_url, username, apikey, token):
+        """
+        Forget the cached token for the given credentials, but only if it's
+        ``token`` -- i.e. it hasn't already been replaced by a fresh one.
+        """
+        key = self._key(auth_url, username, apikey)
+        self._lock.acquire()
+        try:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] == token:
+                del self._memory[key]
+            if self.path:
+                entries = self._load()
+                if key in entries and entries[key][0] == token:
+                    del entries[key]
+                    self._save(entries)
+        finally:
+            self._lock.release()
+
+    def _key(self, auth_url, username, apikey):
+        if isinstance(apikey, unicode):
+            apikey = apikey.encode('utf-8')
+        return '%s %s %s' % (auth_url, username,
+                             sha1(apikey or '').hexdigest())
+
+    def _load(self):
+        return jsonfile.load(self.path, self.codec)
+
+    def _save(self, entries):
+        now = time.time()
+        entries = dict((k, v) for (k, v) in entries.items() if v[2] > now)
+        # The cache is only an optimization; carry on if it can't be saved.
+        jsonfile.save(self.path, entries, self.codec)
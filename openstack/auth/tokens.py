@@ -59,11 +59,5 @@ class TenantManager(base.ManagerWithFind):
     resource_class = Tenant
 
     def for_token(self, token):
-        # FIXME(ja): now that tenants & tokens are separate managers we shouldn't
-        # need the uglyness of setting token this way?
-        orig = self.api.connection.auth_token
-        self.api.connection.auth_token = token
-        rval = self._list('tenants', "tenants")
-        self.api.connection.auth_token = orig
-        return rval
+        return self._list('tenants', "tenants", auth_token=token)
 
@@ -1,7 +1,6 @@
 __version__ = '2.0a1'
 
 import os
-from distutils.util import strtobool
 from openstack.api.connection import ApiConnection
 from openstack.api.config import Config
 from openstack.compute.backup_schedules import (BackupSchedule, BackupScheduleManager,
@@ -63,8 +62,7 @@ class Compute(object):
         Returns on success; raises :exc:`~openstack.compute.Unauthorized` if
         the credentials are wrong.
         """
-        pass
-        #self.connection.authenticate()
+        self.connection.authenticate()
 
     def _get_config(self, kwargs):
         """
@@ -1,3 +1,3 @@
 # maps supported api versions to the optional features that they support
-API_OPTIONS = { 'RACKSPACE' : ['IPGROUPS'],
+API_OPTIONS = { 'RACKSPACE' : ['IPGROUPS', 'EPOCH_CHANGES_SINCE', 'IMAGEID_FILTERS'],
                 'OPENSTACK' : [] }
\ No newline at end of file
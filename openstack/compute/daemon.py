@@ -0,0 +1,354 @@
+"""
+A local daemon that keeps authenticated :class:`~openstack.compute.Compute`
+clients -- and their pools of open connections -- between runs of the
+command line, so that a script running hundreds of ``openstack-compute``
+commands only pays for authentication and connecting once.
+
+``openstack-compute --session <subcommand> ...`` (or setting
+``OPENSTACK_COMPUTE_SESSION``) forwards the subcommand to the daemon,
+starting it first if it isn't running. The daemon listens on a Unix socket
+only its owner can use, runs each subcommand in a thread of its own, and
+exits once it's been idle for a while.
+
+The protocol is a line of JSON each way: the client sends its ``argv``,
+environment and working directory, and the daemon answers with ``{"stdout": ...}`` and
+``{"stderr": ...}`` lines as the subcommand prints, then ``{"exit": N}``.
+"""
+
+import SocketServer
+import argparse
+import errno
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+from openstack.api.codecs import get_codec
+
+DEFAULT_SOCKET = os.path.expanduser('~/.openstack/compute.sock')
+DEFAULT_IDLE_TIMEOUT = 600
+
+# Subcommands the client always runs itself: ones that read local files
+# or stdin, prompt at the terminal, or don't talk to the API at all.
+LOCAL_COMMANDS = ('batch', 'boot', 'help', 'root-password')
+
+# What the client runs to start a daemon.
+SCRIPT = "from openstack.compute.daemon import main; main()"
+
+
+class ThreadLocalStream(object):
+    """
+    Stands in for ``sys.stdout`` or ``sys.stderr``, sending what each thread
+    writes to whatever stream that thread has set with :meth:`redirect` --
+    or to ``default`` if it hasn't.
+    """
+    def __init__(self, default):
+        self.__dict__['default'] = default
+        self.__dict__['_local'] = threading.local()
+
+    def redirect(self, stream):
+        self._local.stream = stream
+
+    def _stream(self):
+        return getattr(self._local, 'stream', None) or self.default
+
+    def __getattr__(self, name):
+        return getattr(self._stream(), name)
+
+    def __setattr__(self, name, value):
+        # ``print`` sets ``softspace`` on the file it's printing to.
+        setattr(self._stream(), name, value)
+
+
+class Channel(object):
+    """
+    A file-like object that sends everything written to it over a daemon
+    connection, as ``{name: data}`` lines.
+    """
+    def __init__(self, wfile, name, lock):
+        self.wfile = wfile
+        self.name = name
+        self.lock = lock
+        self.softspace = 0
+
+    def write(self, data):
+        if not data:
+            return
+        if isinstance(data, str):
+            data = data.decode('utf-8', 'replace')
+        send(self.wfile, {self.name: data}, self.lock)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def send(wfile, message, lock):
+    line = get_codec().dumps(message) + '\n'
+    lock.acquire()
+    try:
+        wfile.write(line)
+        wfile.flush()
+    finally:
+        lock.release()
+
+
+class SessionHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        request = get_codec().loads(line)
+        lock = threading.Lock()
+        stdout = Channel(self.wfile, 'stdout', lock)
+        stderr = Channel(self.wfile, 'stderr', lock)
+        self.server.busy(1)
+        sys.stdout.redirect(stdout)
+        sys.stderr.redirect(stderr)
+        try:
+            status = self.server.run(request['argv'], request.get('env') or {},
+                                     request.get('cwd') or os.getcwd())
+        finally:
+            sys.stdout.redirect(None)
+            sys.stderr.redirect(None)
+            self.server.busy(-1)
+        try:
+            send(self.wfile, {'exit': status}, lock)
+        except socket.error:
+            # The client went away before it heard how it went.
+            pass
+
+
+class SessionDaemon(SocketServer.ThreadingMixIn,
+                    SocketServer.UnixStreamServer):
+    """
+    Serves subcommands on the Unix socket at ``path``, sharing one
+    :class:`~openstack.compute.Compute` client between every command with
+    the same credentials and settings, until it's been idle for
+    ``idle_timeout`` seconds.
+    """
+    daemon_threads = True
+
+    def __init__(self, path=DEFAULT_SOCKET, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0700)
+        if os.path.exists(path):
+            try:
+                connect(path).close()
+            except socket.error:
+                # Left behind by a daemon that didn't exit cleanly.
+                os.unlink(path)
+            else:
+                raise socket.error(errno.EADDRINUSE,
+                                   "A daemon is already listening on %s" % path)
+        # Create the socket readable and writable by its owner alone.
+        umask = os.umask(0077)
+        try:
+            SocketServer.UnixStreamServer.__init__(self, path, SessionHandler)
+        finally:
+            os.umask(umask)
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.clients = {}
+        self._lock = threading.Lock()
+        self._running = 0
+        self._last_active = time.time()
+
+    def busy(self, delta):
+        self._lock.acquire()
+        try:
+            self._running += delta
+            self._last_active = time.time()
+        finally:
+            self._lock.release()
+
+    def idle_for(self):
+        self._lock.acquire()
+        try:
+            if self._running:
+                return 0
+            return time.time() - self._last_active
+        finally:
+            self._lock.release()
+
+    def client(self, env, cwd, **kwargs):
+        """
+        Get the client for these ``Compute`` arguments and environment,
+        making one if there isn't one already (or if the config file has
+        changed since).
+        """
+        from openstack.compute import Compute, DEFAULT_CONFIG_FILE
+        if kwargs.get('config_file'):
+            kwargs['config_file'] = os.path.join(cwd, kwargs['config_file'])
+        try:
+            mtime = os.path.getmtime(kwargs.get('config_file') or
+                                     DEFAULT_CONFIG_FILE)
+        except OSError:
+            mtime = None
+        key = (tuple(sorted(kwargs.items())), mtime,
+               tuple(sorted((k, v) for (k, v) in env.items()
+                            if k.startswith('OPENSTACK_COMPUTE_'))))
+        self._lock.acquire()
+        try:
+            client = self.clients.get(key)
+            if client is None:
+                client = self.clients[key] = Compute(env=env, **kwargs)
+            return client
+        finally:
+            self._lock.release()
+
+    def run(self, argv, env, cwd):
+        """
+        Run one subcommand, as ``openstack-compute`` would, and return its
+        exit status.
+        """
+        from openstack.compute.shell import ComputeShell, CommandError
+        shell = ComputeShell()
+        shell.allow_session = False
+        shell._api_class = lambda **kwargs: self.client(env, cwd, **kwargs)
+        try:
+            shell.main(argv)
+            return 0
+        except CommandError, e:
+            print >> sys.stderr, e
+            return 1
+        except SystemExit, e:
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+            print >> sys.stderr, e.code
+            return 1
+        except Exception:
+            traceback.print_exc()
+            return 1
+
+    def serve_until_idle(self):
+        if not isinstance(sys.stdout, ThreadLocalStream):
+            sys.stdout = ThreadLocalStream(sys.stdout)
+        if not isinstance(sys.stderr, ThreadLocalStream):
+            sys.stderr = ThreadLocalStream(sys.stderr)
+        try:
+            # Not serve_forever() and shutdown(), which are new in Python
+            # 2.6: wait for each connection no longer than there's left
+            # before going idle.
+            while True:
+                idle = self.idle_for()
+                if idle >= self.idle_timeout:
+                    break
+                try:
+                    ready = select.select([self], [], [],
+                                          min(self.idle_timeout - idle, 5))[0]
+                except select.error, e:
+                    if e.args[0] != errno.EINTR:
+                        raise
+                    continue
+                if ready:
+                    self.handle_request()
+        finally:
+            self.server_close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def connect(path=DEFAULT_SOCKET):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        raise
+    return sock
+
+
+def spawn(path=DEFAULT_SOCKET, timeout=10):
+    """
+    Start a daemon in the background, and return a connection to it once
+    it's listening.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p or os.curdir for p in sys.path)
+    env.pop('OPENSTACK_COMPUTE_SESSION', None)
+    devnull = open(os.devnull, 'r+')
+    subprocess.Popen([sys.executable, '-c', SCRIPT, '--socket', path],
+                     env=env, close_fds=True, preexec_fn=os.setsid,
+                     stdin=devnull, stdout=devnull, stderr=devnull)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return connect(path)
+        except socket.error:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.02)
+
+
+def forward(argv, path=DEFAULT_SOCKET):
+    """
+    Run a subcommand in the daemon at ``path`` (starting one if need be),
+    copying its output to ours, and return its exit status.
+    """
+    try:
+        sock = connect(path)
+    except socket.error, e:
+        # e.args rather than e.errno, which socket.error only has from
+        # Python 2.6.
+        if e.args[0] not in (errno.ENOENT, errno.ECONNREFUSED):
+            raise
+        sock = spawn(path)
+    codec = get_codec()
+    f = sock.makefile('r+b')
+    try:
+        f.write(codec.dumps({'argv': argv, 'env': dict(os.environ),
+                             'cwd': os.getcwd()}) + '\n')
+        f.flush()
+        for line in f:
+            message = codec.loads(line)
+            if 'exit' in message:
+                return message['exit']
+            for name, stream in (('stdout', sys.stdout), ('stderr', sys.stderr)):
+                if name in message:
+                    stream.write(message[name].encode('utf-8'))
+                    stream.flush()
+    finally:
+        f.close()
+        sock.close()
+    # The daemon went away before telling us how it went.
+    print >> sys.stderr, "The session daemon exited unexpectedly."
+    return 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog = 'openstack-compute-daemon',
+        description = __doc__.strip().split('\n\n')[0],
+    )
+    parser.add_argument('--socket',
+        metavar = 'PATH',
+        default = DEFAULT_SOCKET,
+        help = 'Path of the Unix socket to listen on (default: %s)' % DEFAULT_SOCKET)
+    parser.add_argument('--idle-timeout',
+        metavar = 'SECONDS',
+        type = float,
+        default = DEFAULT_IDLE_TIMEOUT,
+        help = 'Exit after this long without a command (default: %s)' % DEFAULT_IDLE_TIMEOUT)
+    args = parser.parse_args(argv)
+    # Tidy away the socket when killed, too.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    SessionDaemon(args.socket, args.idle_timeout).serve_until_idle()
+
+
+if __name__ == '__main__':
+    main()
@@ -12,14 +12,22 @@ class FlavorManager(base.ManagerWithFind):
     Manage :class:`Flavor` resources.
     """
     resource_class = Flavor
+    # The API can only filter on minimums; exact matches are done locally.
+    query_filters = {
+        'ram': 'minRam',
+        'disk': 'minDisk',
+    }
     
-    def list(self):
+    def list(self, **filters):
         """
         Get a list of all flavors.
         
-        :rtype: list of :class:`Flavor`.
+        :param filters: Only get flavors with at least this much ``ram``
+                        or ``disk``.
+        :rtype: :class:`~openstack.api.base.ResourceList` of :class:`Flavor`.
         """
-        return self._list("/flavors/detail", "flavors")
+        return self._list(self._filtered_url("/flavors/detail", filters),
+                          "flavors")
         
     def get(self, flavor):
         """
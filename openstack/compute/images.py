@@ -18,6 +18,12 @@ class ImageManager(base.ManagerWithFind):
     Manage :class:`Image` resources.
     """
     resource_class = Image
+    query_filters = {
+        'name': 'name',
+        'status': 'status',
+        'changes_since': 'changes-since',
+    }
+    query_only_filters = ('changes_since',)
     
     def get(self, image):
         """
@@ -28,13 +34,28 @@ class ImageManager(base.ManagerWithFind):
         """
         return self._get("/images/%s" % base.getid(image), "image")
     
-    def list(self):
+    def list(self, **filters):
         """
         Get a list of all images.
         
-        :rtype: list of :class:`Image`
+        :param filters: Only get images matching these; any of ``name``,
+                        ``status`` or ``changes_since`` (a timestamp).
+        :rtype: :class:`~openstack.api.base.ResourceList` of :class:`Image`
         """
-        return self._list("/images/detail", "images")
+        return self._list(self._filtered_url("/images/detail", filters),
+                          "images")
+
+    def iter_list(self, page_size=None, **filters):
+        """
+        Iterate over all images, fetching them a page at a time.
+        
+        :param page_size: How many images to fetch per request. Defaults
+                          to the ``page_size`` config option.
+        :param filters: As for :meth:`list`.
+        :rtype: iterator of :class:`Image`
+        """
+        return self._iter_list(self._filtered_url("/images/detail", filters),
+                               "images", page_size)
     
     def create(self, name, server):
         """
@@ -0,0 +1,137 @@
+"""
+An index of resource names to IDs, kept on disk between runs of the
+command line so that naming a server (or image, flavor or IP group) doesn't
+cost a listing of every one of them each time.
+"""
+
+import os
+import threading
+import time
+
+from openstack.api import jsonfile
+from openstack.api.codecs import get_codec
+from openstack.api.exceptions import NotFound
+
+DEFAULT_INDEX_FILE = os.path.expanduser('~/.openstack/index.json')
+
+# Resource class name -> (URL, response key) of the short listing of that
+# kind of resource, which has just the IDs and names.
+LISTINGS = {
+    'Server': ('/servers', 'servers'),
+    'Image': ('/images', 'images'),
+    'Flavor': ('/flavors', 'flavors'),
+    'IPGroup': ('/shared_ip_groups', 'sharedIpGroups'),
+}
+
+
+class NameIndex(object):
+    """
+    Maps the names of an account's resources to their IDs, from one short
+    listing of each kind, trusted for ``ttl`` seconds.
+
+    Given a ``path``, the index is saved to (and read from) that file,
+    readable only by its owner. Names missing from the index, and IDs that
+    turn out to be gone or renamed, make it refresh, but only once per
+    kind for each :class:`NameIndex`; ``refresh=True`` makes that happen
+    on first use instead.
+    """
+    def __init__(self, api, path=DEFAULT_INDEX_FILE, ttl=300, refresh=False):
+        self.api = api
+        self.path = path
+        self.ttl = ttl
+        self.codec = get_codec()
+        self._entries = None
+        self._refreshed = set()
+        self._force = refresh
+        self._lock = threading.Lock()
+
+    def find(self, manager, name):
+        """
+        Get the resource called ``name``, as ``manager.find(name=name)``
+        would, but by ID.
+        """
+        kind = manager.resource_class.__name__
+        while True:
+            for id in self.ids(manager, name):
+                try:
+                    resource = manager.get(id)
+                except NotFound:
+                    continue
+                if resource.name == name:
+                    return resource
+            if kind in self._refreshed:
+                raise NotFound(404, "No %s matching %s." %
+                               (kind, {'name': name}))
+            self.refresh(manager)
+
+    def ids(self, manager, name):
+        """
+        The IDs of the resources called ``name``, refreshing the index first
+        if it's out of date or doesn't know the name.
+        """
+        entry = self._entry(manager)
+        ids = [id for (id, n) in entry['items'] if n == name]
+        if not ids and manager.resource_class.__name__ not in self._refreshed:
+            entry = self.refresh(manager)
+            ids = [id for (id, n) in entry['items'] if n == name]
+        return ids
+
+    def refresh(self, manager):
+        """
+        Re-list the manager's resources into the index.
+        """
+        url, response_key = LISTINGS[manager.resource_class.__name__]
+        # Page through the listing: the API caps how many it returns at once.
+        return self.update(manager, manager._iter_list(url, response_key))
+
+    def update(self, manager, resources):
+        """
+        Replace the manager's part of the index with ``resources``, i.e.
+        from a listing fetched for some other reason.
+        """
+        kind = manager.resource_class.__name__
+        entry = {
+            'updated': time.time(),
+            'items': [(r.id, r.name) for r in resources],
+        }
+        self._lock.acquire()
+        try:
+            self._refreshed.add(kind)
+            entries = self._load()
+            entries[self._key(kind)] = entry
+            self._save(entries)
+        finally:
+            self._lock.release()
+        return entry
+
+    def _entry(self, manager):
+        kind = manager.resource_class.__name__
+        self._lock.acquire()
+        try:
+            entry = self._load().get(self._key(kind))
+        finally:
+            self._lock.release()
+        if entry is None or (self._force and kind not in self._refreshed) \
+           or entry['updated'] + self.ttl <= time.time():
+            entry = self.refresh(manager)
+        return entry
+
+    def _key(self, kind):
+        config = self.api.config
+        return '%s %s %s' % (config.auth_url, config.username, kind)
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            if self.path:
+                self._entries = jsonfile.load(self.path, self.codec)
+        return self._entries
+
+    def _save(self, entries):
+        if not self.path:
+            return
+        now = time.time()
+        entries = dict((k, v) for (k, v) in entries.items()
+                       if v['updated'] + self.ttl > now)
+        # The index is only an optimization; carry on if it can't be saved.
+        jsonfile.save(self.path, entries, self.codec)
@@ -17,7 +17,7 @@ class IPGroupManager(base.ManagerWithFind):
         """
         Get a list of all groups.
         
-        :rtype: list of :class:`IPGroup`
+        :rtype: :class:`~openstack.api.base.ResourceList` of :class:`IPGroup`
         """
         return self._list("/shared_ip_groups/detail", "sharedIpGroups")
         
@@ -1,8 +1,17 @@
+import threading
+import time
+
 from openstack.api import base
+from openstack.api.concurrency import Throttle, WorkerPool
+from openstack.api.pool import ConnectionPool
 from openstack.compute.api import API_OPTIONS
 
 REBOOT_SOFT, REBOOT_HARD = 'SOFT', 'HARD'
 
+# ServerManager methods that can be run across many servers with bulk().
+BULK_ACTIONS = ('delete', 'update', 'share_ip', 'unshare_ip', 'reboot',
+                'rebuild', 'resize', 'confirm_resize', 'revert_resize')
+
 class Server(base.Resource):
     def __repr__(self):
         return "<Server: %s>" % self.name
@@ -117,9 +126,138 @@ class Server(base.Resource):
         else:
             return u''
     
+class ServerIndex(object):
+    """
+    A local copy of every server, kept up to date cheaply.
+
+    The first :meth:`refresh` lists every server; after that, each refresh
+    only asks for servers that changed since the one before, so polling
+    costs scale with how much is changing rather than with the number of
+    servers. Get one with :meth:`ServerManager.sync_index`.
+
+    Servers are looked up by ID (``index[id]``), and iterating over the
+    index gives every known :class:`Server`.
+    """
+    ADDED, UPDATED, DELETED = 'added', 'updated', 'deleted'
+
+    def __init__(self, manager, skew=60):
+        """
+        :param manager: The :class:`ServerManager` to sync from.
+        :param skew: How many seconds to overlap each query with the one
+                     before, to allow for the client's and API's clocks
+                     disagreeing.
+        """
+        self.manager = manager
+        self.skew = skew
+        self.servers = {}
+        self.last_sync = None
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def __getitem__(self, id):
+        return self.servers[id]
+
+    def __contains__(self, id):
+        return id in self.servers
+
+    def __iter__(self):
+        return iter(self.servers.values())
+
+    def __len__(self):
+        return len(self.servers)
+
+    def subscribe(self, listener):
+        """
+        Call ``listener(event, server)`` for every change found by
+        :meth:`refresh`, where ``event`` is one of :attr:`ADDED`,
+        :attr:`UPDATED` or :attr:`DELETED`.
+        """
+        self._listeners.append(listener)
+
+    def refresh(self):
+        """
+        Bring the index up to date.
+
+        :rtype: list of ``(event, server)`` tuples for what changed.
+        """
+        self._lock.acquire()
+        try:
+            started = time.time()
+            if self.last_sync is None:
+                # Paged, as a plain list() stops at the API's cap.
+                servers = list(self.manager.iter_list())
+                seen = set(s.id for s in servers)
+                events = [(self.DELETED, self.servers.pop(id))
+                          for id in self.servers.keys() if id not in seen]
+            else:
+                since = self._changes_since(self.last_sync - self.skew)
+                servers = self.manager.iter_list(changes_since=since)
+                events = []
+
+            for server in servers:
+                if getattr(server, 'status', None) == 'DELETED':
+                    if server.id in self.servers:
+                        del self.servers[server.id]
+                        events.append((self.DELETED, server))
+                elif server.id not in self.servers:
+                    self.servers[server.id] = server
+                    events.append((self.ADDED, server))
+                elif self.servers[server.id]._info != server._info:
+                    self.servers[server.id] = server
+                    events.append((self.UPDATED, server))
+            self.last_sync = started
+        finally:
+            self._lock.release()
+
+        for event, server in events:
+            for listener in self._listeners:
+                listener(event, server)
+        return events
+
+    def reset(self):
+        """
+        Make the next :meth:`refresh` do a full listing again.
+        """
+        self.last_sync = None
+
+    def _changes_since(self, when):
+        cloud_api = self.manager.api.config.cloud_api
+        if 'EPOCH_CHANGES_SINCE' in API_OPTIONS[cloud_api]:
+            return int(when)
+        return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(when))
+
+
 class ServerManager(base.ManagerWithFind):
     resource_class = Server
 
+    @property
+    def query_filters(self):
+        # The v1.0 API filters by imageId and flavorId, like the servers'
+        # own attributes; v1.1 by image and flavor.
+        if 'IMAGEID_FILTERS' in API_OPTIONS[self.api.config.cloud_api]:
+            return {
+                'name': 'name',
+                'status': 'status',
+                'imageId': 'imageId',
+                'flavorId': 'flavorId',
+                'changes_since': 'changes-since',
+            }
+        return {
+            'name': 'name',
+            'status': 'status',
+            'image': 'image',
+            'flavor': 'flavor',
+            'changes_since': 'changes-since',
+        }
+
+    @property
+    def query_only_filters(self):
+        # v1.1 servers' image and flavor are dicts, not IDs, so only the
+        # API can match those.
+        if 'IMAGEID_FILTERS' in API_OPTIONS[self.api.config.cloud_api]:
+            return ('changes_since',)
+        return ('changes_since', 'image', 'flavor')
+
     def get(self, server):
         """
         Get a server.
@@ -129,12 +267,40 @@ class ServerManager(base.ManagerWithFind):
         """
         return self._get("/servers/%s" % base.getid(server), "server")
 
-    def list(self):
+    def list(self, **filters):
         """
         Get a list of servers.
-        :rtype: list of :class:`Server`
+
+        :param filters: Only get servers matching these; any of ``name``,
+                        ``status``, ``imageId`` and ``flavorId`` (or
+                        ``image`` and ``flavor``, for the OPENSTACK
+                        ``cloud_api``) or ``changes_since`` (a
+                        timestamp).
+        :rtype: :class:`~openstack.api.base.ResourceList` of :class:`Server`
         """
-        return self._list("/servers/detail", "servers")
+        return self._list(self._filtered_url("/servers/detail", filters),
+                          "servers")
+
+    def iter_list(self, page_size=None, **filters):
+        """
+        Iterate over all servers, fetching them a page at a time.
+
+        :param page_size: How many servers to fetch per request. Defaults
+                          to the ``page_size`` config option.
+        :param filters: As for :meth:`list`.
+        :rtype: iterator of :class:`Server`
+        """
+        return self._iter_list(self._filtered_url("/servers/detail", filters),
+                               "servers", page_size)
+
+    def sync_index(self, skew=60):
+        """
+        Get a :class:`ServerIndex` of every server, ready to keep up to date
+        with :meth:`ServerIndex.refresh`.
+        """
+        index = ServerIndex(self, skew)
+        index.refresh()
+        return index
 
     def create(self, name, image, flavor, ipgroup=None, meta=None, files=None):
         """
@@ -295,6 +461,71 @@ class ServerManager(base.ManagerWithFind):
         """
         self._action('revertResize', server)
 
+    def bulk(self, action, servers, concurrency=10, rate=None, **kwargs):
+        """
+        Run the same action against many servers at once.
+
+        :param action: The name of the method to call for each server: one
+                       of ``delete``, ``update``, ``share_ip``,
+                       ``unshare_ip``, ``reboot``, ``rebuild``, ``resize``,
+                       ``confirm_resize`` or ``revert_resize``.
+        :param servers: The :class:`Server`\s (or their IDs) to act on.
+        :param concurrency: How many requests to have in flight at once.
+        :param rate: If given, start no more than this many requests per
+                     second.
+
+        Any other keyword arguments are passed along to the action, i.e.
+        ``servers.bulk('reboot', servers, type=REBOOT_HARD)``.
+
+        Requests go out over a connection pool of the call's own, with
+        room for ``concurrency`` connections to the API, rather than the
+        client's pool (which is shared, and held to ``pool_max_per_host``).
+        Set the ``retries``
+        option, so that requests turned away by rate limiting are retried
+        once the API allows rather than failing, and ``rate_limits`` (or
+        ``rate_limits_from_api``) to keep under the account's limits in
+        the first place.
+
+        Returns a list of ``(server, result, exception)`` tuples in the
+        same order as ``servers``. A failure against one server doesn't
+        stop the others; its exception is returned instead of raised.
+        """
+        if action not in BULK_ACTIONS:
+            raise ValueError("Can't run %r in bulk; choose one of %s."
+                             % (action, ", ".join(BULK_ACTIONS)))
+        method = getattr(self, action)
+        throttle = rate and Throttle(rate)
+
+        servers = list(servers)
+        workers = max(1, min(concurrency, len(servers)))
+        connection = self.api.connection
+        connections = ConnectionPool(maxsize=workers, max_per_host=workers,
+                                     idle_timeout=0)
+
+        def run(server):
+            if throttle:
+                throttle.wait()
+            connection.use_pool(connections)
+            try:
+                return method(server, **kwargs)
+            finally:
+                connection.use_pool(None)
+
+        pool = WorkerPool(workers)
+        try:
+            futures = [pool.submit(run, server) for server in servers]
+            results = []
+            for server, future in zip(servers, futures):
+                error = future.exception()
+                if error is None:
+                    results.append((server, future.result(), None))
+                else:
+                    results.append((server, None, error))
+            return results
+        finally:
+            pool.shutdown()
+            connections.clear()
+
     def _action(self, action, server, info=None):
         """
         Perform a server "action" -- reboot/rebuild/resize/etc.
@@ -4,22 +4,26 @@ Command-line interface to the OpenStack Compute API.
 
 import argparse
 import getpass
-import httplib2
 import os
-import prettytable
 import sys
 from openstack import compute
-
-# Choices for flags.
-DAY_CHOICES = [getattr(compute, i).lower()
-               for i in dir(compute)
-               if i.startswith('BACKUP_WEEKLY_')]
-HOUR_CHOICES = [getattr(compute, i).lower()
-                for i in dir(compute)
-                if i.startswith('BACKUP_DAILY_')]
+from openstack.api.codecs import get_codec
+from openstack.compute.index import DEFAULT_INDEX_FILE, NameIndex
+
+# Choices for flags: the BACKUP_WEEKLY_* and BACKUP_DAILY_* constants,
+# spelled out rather than searched for on every run.
+DAY_CHOICES = ['disabled', 'sunday', 'monday', 'tuesday', 'wednesday',
+               'thursday', 'friday', 'saturday']
+HOUR_CHOICES = ['disabled', 'h_0000_0200', 'h_0200_0400', 'h_0400_0600',
+                'h_0600_0800', 'h_0800_1000', 'h_1000_1200', 'h_1200_1400',
+                'h_1400_1600', 'h_1600_1800', 'h_1800_2000', 'h_2000_2200',
+                'h_2200_0000']
 
 def pretty_choice_list(l): return ', '.join("'%s'" % i for i in l)
 
+# Output formats for --format.
+FORMATS = ['table', 'json', 'jsonl', 'csv']
+
 # Sentinal for boot --key
 AUTO_KEY = object()
 
@@ -43,8 +47,28 @@ class ComputeShell(object):
     # Hook for the test suite to inject a fake server.
     _api_class = compute.Compute
 
+    # Whether --session may hand the subcommand to the session daemon;
+    # the daemon turns it off for the shells it runs.
+    allow_session = True
+
     def __init__(self):
-        self.parser = argparse.ArgumentParser(
+        # Only the global arguments are parsed up front; the subcommand's
+        # own parser is built once we know which one it is. Building one
+        # for every subcommand is left to `get_full_parser()`, for help
+        # and errors.
+        self.parser = self.get_base_parser()
+        self.parser.add_argument('-h', '--help',
+            action = 'store_true',
+            help = argparse.SUPPRESS,
+        )
+        self.parser.add_argument('command_name', nargs='?',
+            help = argparse.SUPPRESS)
+        self.parser.add_argument('command_args', nargs=argparse.REMAINDER,
+            help = argparse.SUPPRESS)
+        self.subcommands = {}
+
+    def get_base_parser(self):
+        parser = argparse.ArgumentParser(
             prog = 'openstack-compute',
             description = __doc__.strip(),
             epilog = 'See "openstack-compute help COMMAND" for help on a specific command.',
@@ -53,64 +77,132 @@ class ComputeShell(object):
         )
 
         # Global arguments
-        self.parser.add_argument('-h', '--help',
-            action = 'help',
-            help = argparse.SUPPRESS,
-        )
-
-        self.parser.add_argument('--debug',
+        parser.add_argument('--debug',
             default = False,
             action = 'store_true',
             help = argparse.SUPPRESS)
 
-        self.parser.add_argument('-f', '--config-file',
+        parser.add_argument('-f', '--config-file',
             metavar = 'PATH',
             default = None,
             help = 'Path to config file (default: ~/.openstack/compute.conf)')
-        self.parser.add_argument('--username',
+        parser.add_argument('--username',
             help = 'Account username. Required if not in a config file/environ.')
-        self.parser.add_argument('--apikey',
+        parser.add_argument('--apikey',
             help = 'Account API key. Required if not in a config file/environ.')
-        self.parser.add_argument('--auth-url',
+        parser.add_argument('--auth-url',
             help = "Service URL (default: Rackspace's US auth URL)")
-        self.parser.add_argument('--allow-cache',
+        parser.add_argument('--allow-cache',
             action = 'store_true',
             default = False,
             help = "Allow the API to returned cached results.")
-        self.parser.add_argument('--cloud-api',
+        parser.add_argument('--cloud-api',
             help = "API of the cloud service to be managed: either RACKSPACE or OPENSTACK")
+        parser.add_argument('--format',
+            choices = FORMATS,
+            default = 'table',
+            help = "Output format: a sorted 'table' (the default), or "\
+                   "'json', 'jsonl' (a JSON object per line) or 'csv', "\
+                   "which are printed as the results arrive.")
+        parser.add_argument('--refresh-index',
+            action = 'store_true',
+            default = False,
+            help = "Refresh the index of names to IDs (kept for "\
+                   "index_ttl seconds) before looking up any names.")
+        parser.add_argument('--session',
+            action = 'store_true',
+            default = bool(env('OPENSTACK_COMPUTE_SESSION')),
+            help = "Run the command in a background session that stays "\
+                   "authenticated between commands (default: "\
+                   "env[OPENSTACK_COMPUTE_SESSION]).")
+        return parser
 
-        # Subcommands
-        subparsers = self.parser.add_subparsers(metavar='<subcommand>')
-        self.subcommands = {}
+    def get_full_parser(self):
+        """
+        Build the parser with every subcommand registered on it.
+        """
+        parser = self.get_base_parser()
+        parser.add_argument('-h', '--help',
+            action = 'help',
+            help = argparse.SUPPRESS,
+        )
+        subparsers = parser.add_subparsers(metavar='<subcommand>')
 
         # Everything that's do_* is a subcommand.
         for attr in (a for a in dir(self) if a.startswith('do_')):
             # I prefer to be hypen-separated instead of underscores.
             command = attr[3:].replace('_', '-')
-            callback = getattr(self, attr)
-            desc = callback.__doc__ or ''
-            help = desc.strip().split('\n')[0]
-            arguments = getattr(callback, 'arguments', [])
+            self.get_subcommand_parser(command, subparsers)
+        return parser
+
+    def get_subcommand_parser(self, command, subparsers=None):
+        """
+        Build the parser for one subcommand -- on ``subparsers`` if given,
+        or on its own if not.
+        """
+        callback = getattr(self, 'do_%s' % command.replace('-', '_'))
+        desc = callback.__doc__ or ''
+        help = desc.strip().split('\n')[0]
+        arguments = getattr(callback, 'arguments', [])
 
+        if subparsers is not None:
             subparser = subparsers.add_parser(command,
                 help = help,
                 description = desc,
                 add_help=False,
                 formatter_class = ComputeHelpFormatter
             )
-            subparser.add_argument('-h', '--help',
-                action = 'help',
-                help = argparse.SUPPRESS,
+        else:
+            subparser = argparse.ArgumentParser(
+                prog = '%s %s' % (self.parser.prog, command),
+                description = desc,
+                add_help=False,
+                formatter_class = ComputeHelpFormatter
             )
-            self.subcommands[command] = subparser
-            for (args, kwargs) in arguments:
-                subparser.add_argument(*args, **kwargs)
-            subparser.set_defaults(func=callback)
+        subparser.add_argument('-h', '--help',
+            action = 'help',
+            help = argparse.SUPPRESS,
+        )
+        self.subcommands[command] = subparser
+        for (args, kwargs) in arguments:
+            subparser.add_argument(*args, **kwargs)
+        subparser.set_defaults(func=callback)
+        return subparser
+
+    def is_subcommand(self, command):
+        return (command is not None and
+                hasattr(self, 'do_%s' % command.replace('-', '_')))
+
+    def parse_args(self, argv):
+        """
+        Parse the command line, only building the parser for the subcommand
+        it names -- unless it asks for help or doesn't name a subcommand, in
+        which case the full parser prints the help or error.
+        """
+        args = self.parser.parse_args(argv)
+        command = args.command_name
+        if args.help or not self.is_subcommand(command) or command == 'help':
+            return self.get_full_parser().parse_args(argv)
+        subparser = self.get_subcommand_parser(command)
+        return subparser.parse_args(args.command_args, namespace=args)
 
     def main(self, argv):
+        # Hand the command to the session daemon without parsing any more
+        # of it here; the daemon will.
+        if self.allow_session:
+            args = self.parser.parse_args(argv)
+            if args.session:
+                from openstack.compute import daemon
+            if args.session and not args.help and \
+               self.is_subcommand(args.command_name) and \
+               args.command_name not in daemon.LOCAL_COMMANDS:
+                status = daemon.forward([a for a in argv if a != '--session'])
+                if status:
+                    raise SystemExit(status)
+                return 0
+
         # Parse args and call whatever callback was selected
-        args = self.parser.parse_args(argv)
+        args = self.parse_args(argv)
 
         # Short-circuit and deal with help right away.
         if args.func == self.do_help:
@@ -119,6 +211,7 @@ class ComputeShell(object):
 
         # Deal with global arguments
         if args.debug:
+            import httplib2
             httplib2.debuglevel = 1
 
         self.compute = self._api_class(
@@ -141,6 +234,15 @@ class ComputeShell(object):
         except compute.Unauthorized:
             raise CommandError("Invalid Cloud Servers credentials.")
 
+        # Look names up in an index of names to IDs, rather than listing
+        # everything each time; an index_ttl of 0 keeps none between runs.
+        ttl = self.compute.config.index_ttl
+        self.index = NameIndex(self.compute,
+            path = ttl and DEFAULT_INDEX_FILE or None,
+            ttl = ttl,
+            refresh = args.refresh_index,
+        )
+
         args.func(args)
 
     @arg('command', metavar='<subcommand>', nargs='?', help='Display help for <subcommand>')
@@ -149,12 +251,12 @@ class ComputeShell(object):
         Display help about this program or one of its subcommands.
         """
         if args.command:
-            if args.command in self.subcommands:
-                self.subcommands[args.command].print_help()
+            if self.is_subcommand(args.command):
+                self.get_subcommand_parser(args.command).print_help()
             else:
                 raise CommandError("'%s' is not a valid subcommand." % args.command)
         else:
-            self.parser.print_help()
+            self.get_full_parser().print_help()
 
     @arg('server', metavar='<server>', help='Name or ID of server.')
     @arg('--enable', dest='enabled', default=None, action='store_true', help='Enable backups.')
@@ -183,7 +285,7 @@ class ComputeShell(object):
         if backup:
             server.backup_schedule.update(**backup)
         else:
-            print_dict(server.backup_schedule._info)
+            print_dict(server.backup_schedule._info, args.format)
 
     @arg('server', metavar='<server>', help='Name or ID of server.')
     def do_backup_schedule_delete(self, args):
@@ -193,6 +295,129 @@ class ComputeShell(object):
         server = self._find_server(args.server)
         server.backup_schedule.delete()
 
+    @arg('file',
+         metavar = '<file>',
+         nargs = '?',
+         default = '-',
+         help = "File of commands, one per line (default: stdin).")
+    @arg('--concurrency',
+         metavar = '<n>',
+         type = int,
+         default = 4,
+         help = "How many commands to run at once (default: 4). Raise the "\
+                "pool_max_per_host option to match.")
+    def do_batch(self, args):
+        """
+        Run many commands, one per line of a file, over one client.
+
+        Each line is a subcommand and its arguments as they'd be typed (i.e.
+        "reboot --hard web1"), or a JSON list of them; blank lines and
+        lines starting with # are skipped. As each command finishes, a JSON
+        object is printed with its line number, command (as a list of
+        arguments, or of just the line if it couldn't be parsed), exit
+        status and output.
+        """
+        import shlex
+        import threading
+        from openstack.api.concurrency import WorkerPool
+        from openstack.compute.daemon import ThreadLocalStream
+
+        if args.concurrency < 1:
+            raise CommandError("--concurrency must be at least 1.")
+        if args.file == '-':
+            lines = sys.stdin
+        else:
+            try:
+                lines = open(args.file)
+            except IOError, e:
+                raise CommandError("Can't open '%s': %s" % (args.file, e))
+
+        # Each command's output is captured from its own thread, while
+        # the results go to the real stdout.
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = ThreadLocalStream(stdout), ThreadLocalStream(stderr)
+        codec = get_codec()
+        lock = threading.Lock()
+        # Don't read further ahead of the commands running than this.
+        pending = threading.Semaphore(args.concurrency * 2)
+        failed = []
+
+        def report(number, argv, status, out, err):
+            result = {'line': number, 'command': argv, 'status': status,
+                      'stdout': out, 'stderr': err}
+            lock.acquire()
+            try:
+                if status:
+                    failed.append(number)
+                stdout.write(_dumps_record(codec, result,
+                    ['line', 'command', 'status', 'stdout', 'stderr']) + '\n')
+                stdout.flush()
+            finally:
+                lock.release()
+
+        def done(future, number, argv):
+            report(number, argv, *future.result())
+            pending.release()
+
+        pool = WorkerPool(args.concurrency)
+        try:
+            # readline() rather than iterating, which reads ahead, so that
+            # commands piped in start as soon as they arrive.
+            number = 0
+            for line in iter(lines.readline, ''):
+                number += 1
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    if line.startswith('['):
+                        argv = [unicode(a).encode('utf-8') for a in codec.loads(line)]
+                    else:
+                        argv = shlex.split(line)
+                except ValueError, e:
+                    report(number, [line], 1, u'', u"Can't parse line: %s" % e)
+                    continue
+                pending.acquire()
+                future = pool.submit(self._run_batch_command, argv, args.format)
+                future.add_done_callback(
+                    lambda f, number=number, argv=argv: done(f, number, argv))
+            pool.shutdown()
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+        if failed:
+            raise SystemExit(1)
+
+    def _run_batch_command(self, argv, format):
+        """
+        Run one command for do_batch, and return its exit status and what
+        it printed to stdout and stderr.
+        """
+        import StringIO
+        out, err = StringIO.StringIO(), StringIO.StringIO()
+        sys.stdout.redirect(out)
+        sys.stderr.redirect(err)
+        try:
+            try:
+                command = argv and argv[0]
+                if not self.is_subcommand(command) or command in ('batch', 'root-password'):
+                    raise CommandError("'%s' can't be run in a batch." % command)
+                parser = self.get_subcommand_parser(command)
+                args = parser.parse_args(argv[1:], namespace=argparse.Namespace(format=format))
+                args.func(args)
+                status = 0
+            except SystemExit, e:
+                status = e.code or 0
+                if not isinstance(status, int):
+                    print >> sys.stderr, status
+                    status = 1
+            except Exception, e:
+                print >> sys.stderr, e
+                status = 1
+        finally:
+            sys.stdout.redirect(None)
+            sys.stderr.redirect(None)
+        return (status, _text(out.getvalue()), _text(err.getvalue()))
+
     @arg('--flavor',
          default = None,
          metavar = '<flavor>',
@@ -267,15 +492,20 @@ class ComputeShell(object):
                 raise CommandError("Can't open '%s': %s" % (keyfile, e))
 
         server = self.compute.servers.create(args.name, image, flavor, ipgroup, metadata, files)
-        print_dict(server._info)
+        print_dict(server._info, args.format)
 
     def do_flavor_list(self, args):
         """Print a list of available 'flavors' (sizes of servers)."""
-        print_list(self.compute.flavors.list(), ['ID', 'Name', 'RAM', 'Disk'])
+        print_list(self.compute.flavors.list(), ['ID', 'Name', 'RAM', 'Disk'],
+                   fmt=args.format)
 
     def do_image_list(self, args):
         """Print a list of available images to boot from."""
-        print_list(self.compute.images.list(), ['ID', 'Name', 'Status'])
+        if args.format == 'table':
+            images = self.compute.images.list()
+        else:
+            images = self.compute.images.iter_list()
+        print_list(images, ['ID', 'Name', 'Status'], fmt=args.format)
 
     @arg('server', metavar='<server>', help='Name or ID of server.')
     @arg('name', metavar='<name>', help='Name for the new image.')
@@ -283,7 +513,7 @@ class ComputeShell(object):
         """Create a new image by taking a snapshot of a running server."""
         server = self._find_server(args.server)
         image = self.compute.images.create(args.name, server)
-        print_dict(image._info)
+        print_dict(image._info, args.format)
 
     @arg('image', metavar='<image>', help='Name or ID of image.')
     def do_image_delete(self, args):
@@ -314,18 +544,26 @@ class ComputeShell(object):
 
     def do_ipgroup_list(self, args):
         """Show IP groups."""
+        ipgroups = self.compute.ipgroups.list()
+        # Every group's servers' names, from one fresh listing of them all
+        # (which goes into the name index too): names shown from the index
+        # alone could be out of date.
+        names = {}
+        if [group for group in ipgroups if group.servers]:
+            names = dict(self.index.refresh(self.compute.servers)['items'])
         def pretty_server_list(ipgroup):
-            return ", ".join(self.compute.servers.get(id).name for id in ipgroup.servers)
+            return ", ".join(names.get(id, str(id)) for id in ipgroup.servers)
 
-        print_list(self.compute.ipgroups.list(),
+        print_list(ipgroups,
                    fields = ['ID', 'Name', 'Server List'],
-                   formatters = {'Server List': pretty_server_list})
+                   formatters = {'Server List': pretty_server_list},
+                   fmt = args.format)
 
     @arg('group', metavar='<group>', help='Name or ID of group.')
     def do_ipgroup_show(self, args):
         """Show details about a particular IP group."""
         group = self._find_ipgroup(args.group)
-        print_dict(group._info)
+        print_dict(group._info, args.format)
 
     @arg('name', metavar='<name>', help='What to name this new group.')
     @arg('server', metavar='<server>', nargs='?',
@@ -337,7 +575,7 @@ class ComputeShell(object):
         else:
             server = None
         group = self.compute.ipgroups.create(args.name, server)
-        print_dict(group._info)
+        print_dict(group._info, args.format)
 
     @arg('group', metavar='<group>', help='Name or ID of group.')
     def do_ipgroup_delete(self, args):
@@ -346,7 +584,14 @@ class ComputeShell(object):
 
     def do_list(self, args):
         """List active servers."""
-        print_list(self.compute.servers.list(), ['ID', 'Name', 'Status', 'Public IP', 'Private IP'])
+        # Other than tables, which are sorted, print each server as soon
+        # as its page arrives.
+        if args.format == 'table':
+            servers = self.compute.servers.list()
+        else:
+            servers = self.compute.servers.iter_list()
+        print_list(servers, ['ID', 'Name', 'Status', 'Public IP', 'Private IP'],
+                   fmt=args.format)
 
     @arg('--hard',
         dest = 'reboot_type',
@@ -416,7 +661,7 @@ class ComputeShell(object):
         info['flavor'] = self._find_flavor(info.pop('flavorId')).name
         info['image'] = self._find_image(info.pop('imageId')).name
 
-        print_dict(info)
+        print_dict(info, args.format)
 
     @arg('server', metavar='<server>', help='Name or ID of server.')
     def do_delete(self, args):
@@ -448,7 +693,7 @@ class ComputeShell(object):
             if isinstance(name_or_id, int) or name_or_id.isdigit():
                 return manager.get(int(name_or_id))
             else:
-                return manager.find(name=name_or_id)
+                return self.index.find(manager, name_or_id)
         except compute.NotFound:
             raise CommandError("No %s with a name or ID of '%s' exists."
                                % (manager.resource_class.__name__.lower(), name_or_id))
@@ -461,27 +706,95 @@ class ComputeHelpFormatter(argparse.HelpFormatter):
         super(ComputeHelpFormatter, self).start_section(heading)
 
 # Helpers
-def print_list(objs, fields, formatters={}):
+def print_list(objs, fields, formatters={}, fmt='table'):
+    """
+    Print ``objs`` as a table sorted by the first field, or -- in any other
+    of the FORMATS -- a record at a time, in the order they come.
+    """
+    if fmt != 'table':
+        keys = [field.lower().replace(' ', '_') for field in fields]
+        print_records((dict(zip(keys, _row(o, fields, formatters)))
+                       for o in objs), keys, fmt)
+        return
+
+    import prettytable
     pt = prettytable.PrettyTable([f for f in fields], caching=False)
     pt.aligns = ['l' for f in fields]
 
     for o in objs:
-        row = []
-        for field in fields:
-            if field in formatters:
-                row.append(formatters[field](o))
-            else:
-                row.append(getattr(o, field.lower().replace(' ', '_'), ''))
-        pt.add_row(row)
+        pt.add_row(_row(o, fields, formatters))
 
     pt.printt(sortby=fields[0])
 
-def print_dict(d):
+def _row(o, fields, formatters):
+    row = []
+    for field in fields:
+        if field in formatters:
+            row.append(formatters[field](o))
+        else:
+            row.append(getattr(o, field.lower().replace(' ', '_'), ''))
+    return row
+
+def print_dict(d, fmt='table'):
+    if fmt == 'csv':
+        print_records(({'property': k, 'value': v} for (k, v) in sorted(d.items())),
+                      ['property', 'value'], fmt)
+        return
+    if fmt != 'table':
+        print get_codec().dumps(d)
+        return
+
+    import prettytable
     pt = prettytable.PrettyTable(['Property', 'Value'], caching=False)
     pt.aligns = ['l', 'l']
     [pt.add_row(list(r)) for r in d.iteritems()]
     pt.printt(sortby='Property')
 
+def print_records(records, keys, fmt):
+    """
+    Print dicts as they come: as a JSON list, a JSON object per line, or
+    CSV with a header row of ``keys``.
+    """
+    write = sys.stdout.write
+    if fmt == 'csv':
+        import csv
+        writer = csv.writer(sys.stdout)
+        writer.writerow(keys)
+        for record in records:
+            writer.writerow([_csv_value(record[k]) for k in keys])
+        return
+
+    codec = get_codec()
+    if fmt == 'jsonl':
+        for record in records:
+            write(_dumps_record(codec, record, keys) + '\n')
+    else:
+        write('[')
+        separator = '\n'
+        for record in records:
+            write(separator + _dumps_record(codec, record, keys))
+            separator = ',\n'
+        write('\n]\n')
+
+def _dumps_record(codec, record, keys):
+    # A JSON object with its keys in the given order, for a stable format.
+    return '{%s}' % ', '.join('%s: %s' % (codec.dumps(k), codec.dumps(record[k]))
+                              for k in keys)
+
+def _text(s):
+    if isinstance(s, str):
+        return s.decode('utf-8', 'replace')
+    return s
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return get_codec().dumps(value)
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
 def main():
     try:
         ComputeShell().main(sys.argv[1:])
@@ -10,10 +10,11 @@ class Flavor(compute.Flavor):
 class FlavorManager(compute.FlavorManager):
     resource_class = Flavor
 
-    def list(self):
+    def list(self, **filters):
         """
         Get a list of all flavors.
         
-        :rtype: list of :class:`Flavor`.
+        :rtype: :class:`~openstack.api.base.ResourceList` of :class:`Flavor`.
         """
-        return self._list("/extras/flavors", "flavors")
+        return self._list(self._filtered_url("/extras/flavors", filters),
+                          "flavors")
@@ -23,8 +23,13 @@ class ServerManager(compute.ServerManager):
     def get(self, server_id):
         return self._get("/extras/servers/%s" % server_id, "server")
 
-    def list(self):
-        return self._list("/extras/servers", "servers")
+    def list(self, **filters):
+        return self._list(self._filtered_url("/extras/servers", filters),
+                          "servers")
+
+    def iter_list(self, page_size=None, **filters):
+        return self._iter_list(self._filtered_url("/extras/servers", filters),
+                               "servers", page_size)
 
     def update(self, server, name=None, password=None, description=None):
         """
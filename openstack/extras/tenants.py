@@ -28,10 +28,17 @@ class TenantManager(base.ManagerWithFind):
     def list(self):
         """
         Get a list of tenants.
-        :rtype: list of :class:`Tenant`
+        :rtype: :class:`~openstack.api.base.ResourceList` of :class:`Tenant`
         """
         return self._list("/tenants", "tenants")
 
+    def iter_list(self, page_size=None):
+        """
+        Iterate over all tenants, fetching them a page at a time.
+        :rtype: iterator of :class:`Tenant`
+        """
+        return self._iter_list("/tenants", "tenants", page_size)
+
     def update(self, tenant_id, description=None, enabled=None):
         """
         update a tenant with a new name and description
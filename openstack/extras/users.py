@@ -28,6 +28,7 @@ class UserManager(base.ManagerWithFind):
         return self._create('/users', params, "user")
 
     def _create(self, url, body, response_key):
+        self._invalidate_cache()
         resp, body = self.api.connection.put(url, body=body)
         return self.resource_class(self, body[response_key])
 
@@ -37,7 +38,14 @@ class UserManager(base.ManagerWithFind):
     def list(self):
         """
         Get a list of users.
-        :rtype: list of :class:`User`
+        :rtype: :class:`~openstack.api.base.ResourceList` of :class:`User`
         """
         return self._list("/users", "users")
 
+    def iter_list(self, page_size=None):
+        """
+        Iterate over all users, fetching them a page at a time.
+        :rtype: iterator of :class:`User`
+        """
+        return self._iter_list("/users", "users", page_size)
+
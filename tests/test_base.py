@@ -0,0 +1,211 @@
+import unittest
+
+import mock
+
+from openstack.api.base import ResourceList
+from openstack.api.exceptions import NotFound, WaitTimeout
+from tests.utils import FakeAPI, Thing, ThingManager, things
+
+
+class IterListTest(unittest.TestCase):
+
+    def manager(self, n, config=None, **kwargs):
+        return ThingManager(FakeAPI({'/things': ('things', things(n))},
+                                    config=config or {}, **kwargs))
+
+    def ids(self, manager, page_size=None):
+        return [t.id for t in manager.iter_list(page_size)]
+
+    def test_pages(self):
+        manager = self.manager(25)
+        self.assertEqual(self.ids(manager, 10), range(1, 26))
+        self.assertEqual(manager.api.connection.requests,
+                         ['/things?limit=10',
+                          '/things?limit=10&marker=10',
+                          '/things?limit=10&marker=20'])
+
+    def test_streamed_pages(self):
+        manager = self.manager(25, config={'stream_lists': True})
+        self.assertEqual(self.ids(manager, 10), range(1, 26))
+        self.assertEqual(len(manager.api.connection.requests), 3)
+
+    def test_one_page_is_one_request(self):
+        manager = self.manager(3)
+        self.assertEqual(self.ids(manager), [1, 2, 3])
+        self.assertEqual(manager.api.connection.requests,
+                         ['/things?limit=1000'])
+
+    def test_exact_pages_end_with_an_empty_one(self):
+        manager = self.manager(20)
+        self.assertEqual(self.ids(manager, 10), range(1, 21))
+        self.assertEqual(len(manager.api.connection.requests), 3)
+
+    def test_empty(self):
+        manager = self.manager(0)
+        self.assertEqual(self.ids(manager), [])
+        self.assertEqual(len(manager.api.connection.requests), 1)
+
+    def test_page_size_is_capped_at_max_page_size(self):
+        manager = self.manager(2500, max_limit=1000)
+        self.assertEqual(self.ids(manager, 2000), range(1, 2501))
+        self.assertEqual(manager.api.connection.requests,
+                         ['/things?limit=1000',
+                          '/things?limit=1000&marker=1000',
+                          '/things?limit=1000&marker=2000'])
+
+    def test_lower_max_page_size(self):
+        manager = self.manager(250, max_limit=100,
+                               config={'max_page_size': 100})
+        self.assertEqual(self.ids(manager), range(1, 251))
+        self.assertEqual(len(manager.api.connection.requests), 3)
+
+    def test_api_ignoring_the_marker(self):
+        for stream_lists in (False, True):
+            manager = self.manager(3, honor_marker=False,
+                                   config={'stream_lists': stream_lists})
+            self.assertEqual(self.ids(manager, 3), [1, 2, 3])
+            self.assertEqual(len(manager.api.connection.requests), 2)
+
+    def test_stopping_early(self):
+        manager = self.manager(25)
+        items = manager.iter_list(10)
+        self.assertEqual([items.next().id for i in range(5)], range(1, 6))
+        self.assertEqual(len(manager.api.connection.requests), 1)
+
+
+class ResourceListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = ThingManager(FakeAPI({}))
+        self.data = things(5)
+        self.things = ResourceList(self.manager, self.data)
+
+    def built(self, resources):
+        return len([r for r in resources._resources if r is not None])
+
+    def ids(self, resources):
+        return [r.id for r in resources]
+
+    def test_builds_resources_lazily(self):
+        self.assertEqual(len(self.things), 5)
+        self.assertEqual(self.built(self.things), 0)
+        thing = self.things[2]
+        self.assertTrue(isinstance(thing, Thing))
+        self.assertEqual(thing.name, 'thing-3')
+        self.assertTrue(self.things[2] is thing)
+        self.assertEqual(self.built(self.things), 1)
+
+    def test_acts_like_a_list(self):
+        self.assertEqual(self.ids(self.things), [1, 2, 3, 4, 5])
+        self.assertEqual(self.things[-1].id, 5)
+        self.assertEqual(self.ids(self.things[1:3]), [2, 3])
+        self.assertEqual(self.ids(self.things[::-2]), [5, 3, 1])
+        self.assertEqual(self.ids(reversed(self.things)), [5, 4, 3, 2, 1])
+        self.assertEqual(self.things.index(self.things[3]), 3)
+        self.assertEqual(self.things.count(self.things[3]), 1)
+        self.assertRaises(IndexError, lambda: self.things[5])
+
+    def test_slices_stay_lazy(self):
+        part = self.things[1:3]
+        self.assertTrue(isinstance(part, ResourceList))
+        self.assertEqual(self.built(part), 0)
+
+    def test_equality(self):
+        self.assertEqual(self.things, list(self.things))
+        self.assertEqual(self.things, ResourceList(self.manager, self.data))
+        self.assertNotEqual(self.things, list(self.things)[:4])
+        self.assertNotEqual(self.things, tuple(self.things))
+
+    def test_concatenation(self):
+        self.assertEqual(self.ids(self.things + self.things[:1]),
+                         [1, 2, 3, 4, 5, 1])
+        self.assertEqual(self.ids(self.things[:1] + self.things),
+                         [1, 1, 2, 3, 4, 5])
+        self.assertEqual(self.ids([self.things[4]] + self.things[:1]), [5, 1])
+
+    def test_changes(self):
+        self.things.sort(key=lambda thing: -thing.id)
+        self.assertEqual(self.ids(self.things), [5, 4, 3, 2, 1])
+        self.assertEqual(self.things.data, None)
+        self.things.append(self.things[0])
+        del self.things[1:3]
+        self.things.reverse()
+        self.assertEqual(self.ids(self.things), [5, 1, 2, 5])
+        self.assertEqual(self.things.pop().id, 5)
+        self.things += self.things[:1]
+        self.assertEqual(self.ids(self.things), [5, 1, 2, 5])
+        # The data the listing was made from is untouched.
+        self.assertEqual(len(self.data), 5)
+
+    def test_list_returns_one(self):
+        manager = ThingManager(FakeAPI({'/things': ('things', things(3))}))
+        listing = manager.list()
+        self.assertTrue(isinstance(listing, ResourceList))
+        self.assertEqual(self.ids(listing), [1, 2, 3])
+
+
+class ListOnlyManager(ThingManager):
+    iter_list = None
+
+
+class WaitForTest(unittest.TestCase):
+
+    def setUp(self):
+        self.items = things(25, status='BUILD')
+        self.api = FakeAPI({'/things': ('things', self.items)}, max_limit=10,
+                           config={'max_page_size': 10})
+        self.manager = ThingManager(self.api)
+        self.patcher = mock.patch('time.sleep')
+        self.sleep = self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def set_status(self, id, status):
+        self.items[id - 1]['status'] = status
+
+    def test_waits_for_each_across_pages(self):
+        self.set_status(5, 'ACTIVE')
+        # The second check finds the last one done.
+        self.sleep.side_effect = lambda pause: self.set_status(25, 'ACTIVE')
+        done = [(t.id, t.status) for t in self.manager.wait_for([5, 25])]
+        self.assertEqual(done, [(5, 'ACTIVE'), (25, 'ACTIVE')])
+        self.assertEqual(self.sleep.call_count, 1)
+
+    def test_failed(self):
+        self.set_status(20, 'ERROR')
+        done = [(t.id, t.status) for t in self.manager.wait_for([20])]
+        self.assertEqual(done, [(20, 'ERROR')])
+
+    def test_takes_resources(self):
+        self.set_status(3, 'ACTIVE')
+        thing = self.manager.get(3)
+        self.assertEqual(list(self.manager.wait_for([thing])), [thing])
+
+    def test_gone_away(self):
+        self.assertRaises(NotFound, list, self.manager.wait_for([26]))
+
+    def test_deleted(self):
+        self.sleep.side_effect = lambda pause: self.items.pop()
+        done = list(self.manager.wait_for([25], status='DELETED'))
+        self.assertEqual(done, [25])
+
+    def test_missing_from_a_listing_is_checked(self):
+        manager = ListOnlyManager(self.api)
+        self.set_status(25, 'ACTIVE')
+        done = [(t.id, t.status) for t in manager.wait_for([25])]
+        self.assertEqual(done, [(25, 'ACTIVE')])
+
+    @mock.patch('time.time')
+    def test_timeout(self, time):
+        time.return_value = 1000
+        self.set_status(1, 'ACTIVE')
+        waiting = self.manager.wait_for([1, 2], timeout=10)
+        self.assertEqual(waiting.next().id, 1)
+        time.return_value = 1011
+        try:
+            waiting.next()
+        except WaitTimeout, e:
+            self.assertEqual(e.details, [2])
+        else:
+            self.fail("WaitTimeout not raised")
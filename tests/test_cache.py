@@ -0,0 +1,75 @@
+import unittest
+
+import mock
+
+from openstack.api.cache import TTLCache
+
+
+class TTLCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher = mock.patch('time.time')
+        self.time = self.patcher.start()
+        self.time.return_value = 1000
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_get_and_set(self):
+        cache = TTLCache()
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('a', 'default'), 'default')
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('a', 2)
+        self.assertEqual(cache.get('a'), 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_expires(self):
+        cache = TTLCache(ttl=60)
+        cache.set('a', 1)
+        self.time.return_value = 1059
+        self.assertEqual(cache.get('a'), 1)
+        self.time.return_value = 1060
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(len(cache), 0)
+
+    def test_no_ttl_never_expires(self):
+        cache = TTLCache(ttl=None)
+        cache.set('a', 1)
+        self.time.return_value = 10 ** 9
+        self.assertEqual(cache.get('a'), 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=3)
+        for (i, key) in zip(range(3), 'abc'):
+            self.time.return_value = 1000 + i
+            cache.set(key, i)
+        self.time.return_value = 1003
+        cache.get('a')
+        self.time.return_value = 1004
+        cache.set('d', 3)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual([cache.get(k) for k in 'acd'], [0, 2, 3])
+
+    def test_evicts_expired_first(self):
+        cache = TTLCache(ttl=60, maxsize=3)
+        cache.set('old', 0)
+        self.time.return_value = 1050
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.time.return_value = 1060
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual([cache.get(k) for k in ('a', 'b', 'c')], [1, 2, 3])
+
+    def test_invalidate(self):
+        cache = TTLCache()
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.invalidate('a')
+        cache.invalidate('nonesuch')
+        self.assertEqual((cache.get('a'), cache.get('b')), (None, 2))
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
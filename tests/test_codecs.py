@@ -0,0 +1,50 @@
+import sys
+import types
+import unittest
+
+import mock
+
+from openstack.api import codecs
+
+
+class CodecTest(unittest.TestCase):
+
+    def test_bad_input_raises_value_error(self):
+        for name in codecs.available_codecs():
+            codec = codecs.get_codec(name)
+            self.assertRaises(ValueError, codec.loads, '{"servers": [')
+            self.assertRaises(ValueError, codec.loads, 'Not JSON')
+
+    def test_round_trip(self):
+        doc = {'servers': [{'id': 1, 'name': u'caf\xe9'}]}
+        for name in codecs.available_codecs():
+            codec = codecs.get_codec(name)
+            self.assertEqual(codec.loads(codec.dumps(doc)), doc)
+
+    def test_fallback(self):
+        self.assertEqual(codecs.get_codec('nonesuch').name, 'stdlib')
+        self.assertEqual(codecs.get_codec('nonesuch, stdlib').name, 'stdlib')
+
+
+class CjsonTest(unittest.TestCase):
+
+    def setUp(self):
+        cjson = types.ModuleType('cjson')
+
+        class DecodeError(Exception):
+            pass
+
+        def decode(text):
+            raise DecodeError("cannot parse JSON description: %s" % text)
+        cjson.DecodeError = DecodeError
+        cjson.decode = decode
+        cjson.encode = repr
+        self.patcher = mock.patch.dict(sys.modules, {'cjson': cjson})
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_decode_errors_are_value_errors(self):
+        codec = codecs._cjson()
+        self.assertRaises(ValueError, codec.loads, 'Not JSON')
@@ -0,0 +1,245 @@
+import unittest
+
+import httplib2
+import mock
+
+from openstack.api.connection import ApiConnection
+from openstack.api.exceptions import ApiException, NotFound, Unauthorized
+from openstack.api.pool import ConnectionPool
+from openstack.api.tokencache import TokenCache
+from tests.utils import make_config
+
+AUTH_URL = 'https://auth.example.com/v1.0'
+MANAGEMENT_URL = 'https://servers.example.com/v1.0/1234'
+
+LIMITS = {'limits': {'rate': [
+    {'verb': 'POST', 'URI': '*', 'regex': '.*', 'value': 10,
+     'unit': 'MINUTE', 'remaining': 10, 'resetTime': 1244425439},
+]}}
+
+
+class ConnectionTestCase(unittest.TestCase):
+    """
+    Runs an :class:`ApiConnection` against a fake ``request()``, which
+    answers auth requests with a token and anything else with
+    ``self.responses[path]`` (or a 404).
+    """
+    def setUp(self):
+        TokenCache._memory.clear()
+        self.requests = []
+        self.responses = {}
+        self.patcher = mock.patch.object(ApiConnection, 'request',
+                                         self.fake_request)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        TokenCache._memory.clear()
+
+    def connection(self, **overrides):
+        overrides.setdefault('username', 'user')
+        overrides.setdefault('apikey', 'key')
+        overrides.setdefault('auth_url', AUTH_URL)
+        return ApiConnection(make_config(**overrides), ConnectionPool())
+
+    def fake_request(self, url, method='GET', **kwargs):
+        self.requests.append((method, url))
+        if url == AUTH_URL:
+            headers = kwargs['headers']
+            if headers['X-Auth-Key'] != 'key':
+                raise Unauthorized(401, "Unauthorized")
+            token = 'token-%s-%s-%d' % (headers['X-Auth-User'],
+                                        headers['X-Auth-Key'],
+                                        len(self.requests))
+            return {'status': '204', 'x-auth-token': token,
+                    'x-server-management-url': MANAGEMENT_URL}, None
+        path = url[len(MANAGEMENT_URL):].split('?')[0]
+        if path not in self.responses:
+            raise NotFound(404, "Not found")
+        return {'status': '200'}, self.responses[path]
+
+    def paths(self):
+        return [url[len(MANAGEMENT_URL):].split('?')[0]
+                for (method, url) in self.requests if url != AUTH_URL]
+
+
+class AuthenticateTest(ConnectionTestCase):
+
+    def test_token_shared_by_clients_with_the_same_credentials(self):
+        first = self.connection()
+        first.authenticate()
+        second = self.connection()
+        second.authenticate()
+        self.assertEqual(second.auth_token, first.auth_token)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_wrong_api_key_doesnt_get_a_cached_token(self):
+        self.connection().authenticate()
+        self.assertRaises(Unauthorized,
+                          self.connection(apikey='wrong').authenticate)
+        self.assertEqual(len(self.requests), 2)
+
+
+class Response(dict):
+    def __init__(self, status):
+        dict.__init__(self)
+        self.status = status
+
+
+class DecodeTest(ConnectionTestCase):
+
+    def test_server_errors_are_raised(self):
+        conn = self.connection()
+        for status in (500, 502, 503, 504):
+            try:
+                conn._decode(status, Response(status), '')
+            except ApiException, e:
+                self.assertEqual(e.code, status)
+            else:
+                self.fail("%d not raised" % status)
+
+    def test_success(self):
+        conn = self.connection()
+        self.assertEqual(conn._decode(200, Response(200), '{"a": 1}'),
+                         {'a': 1})
+        self.assertEqual(conn._decode(204, Response(204), ''), None)
+
+
+class StreamConnectionTest(ConnectionTestCase):
+
+    def test_https_made_like_httplib2_would(self):
+        http = httplib2.Http(timeout=7, proxy_info=None,
+                             disable_ssl_certificate_validation=True)
+        conn = self.connection()._new_stream_connection(http, 'https',
+                                                        'example.com:8443')
+        self.assertTrue(isinstance(conn, httplib2.HTTPSConnectionWithTimeout))
+        self.assertEqual((conn.host, conn.port), ('example.com', 8443))
+        self.assertEqual(conn.timeout, 7)
+        self.assertTrue(conn.disable_ssl_certificate_validation)
+
+    def test_http_through_a_proxy(self):
+        proxy = httplib2.ProxyInfo(httplib2.socks.PROXY_TYPE_HTTP,
+                                   'proxy.example.com', 3128)
+        http = httplib2.Http(proxy_info=proxy)
+        conn = self.connection()._new_stream_connection(http, 'http',
+                                                        'example.com')
+        self.assertTrue(isinstance(conn, httplib2.HTTPConnectionWithTimeout))
+        self.assertTrue(conn.proxy_info is proxy)
+
+
+class RateLimitsFromApiTest(ConnectionTestCase):
+
+    def setUp(self):
+        ConnectionTestCase.setUp(self)
+        self.responses['/limits'] = LIMITS
+        self.responses['/servers'] = {'servers': []}
+
+    def test_loaded_on_first_request(self):
+        conn = self.connection(rate_limits_from_api=True)
+        conn.get('/servers')
+        conn.get('/servers')
+        self.assertEqual(self.paths(), ['/limits', '/servers', '/servers'])
+        self.assertEqual([l.regex for l in conn.rate_limiter.limits], ['.*'])
+
+    def test_loaded_after_authenticating_explicitly(self):
+        conn = self.connection(rate_limits_from_api=True)
+        conn.authenticate()
+        conn.get('/servers')
+        self.assertEqual(self.paths(), ['/limits', '/servers'])
+        self.assertEqual(len(conn.rate_limiter.limits), 1)
+
+    def test_combined_with_configured_limits(self):
+        conn = self.connection(rate_limits_from_api=True,
+                               rate_limits='GET:^/servers:5/SECOND')
+        conn.get('/servers')
+        self.assertEqual([l.regex for l in conn.rate_limiter.limits],
+                         ['^/servers', '.*'])
+
+    def test_missing_limits_are_only_asked_for_once(self):
+        del self.responses['/limits']
+        conn = self.connection(rate_limits_from_api=True)
+        conn.get('/servers')
+        conn.get('/servers')
+        self.assertEqual(self.paths(), ['/limits', '/servers', '/servers'])
+        self.assertEqual(conn.rate_limiter.limits, [])
+
+    def test_off(self):
+        conn = self.connection()
+        conn.authenticate()
+        conn.get('/servers')
+        self.assertEqual(self.paths(), ['/servers'])
+
+    def test_load_explicitly(self):
+        conn = self.connection()
+        conn.load_rate_limits()
+        self.assertEqual(self.paths(), ['/limits'])
+        self.assertEqual(len(conn.rate_limiter.limits), 1)
+
+
+class RevalidateTest(unittest.TestCase):
+    """
+    Runs conditional GETs against a fake ``httplib2.Http.request()``, which
+    answers with ``self.body`` and an ETag, or a 304 if that's what the
+    client already has.
+    """
+    def setUp(self):
+        TokenCache._memory.clear()
+        self.body = '{"servers": [{"id": 1}]}'
+        self.etag = '"1"'
+        self.sent = []
+        self.patcher = mock.patch.object(httplib2.Http, 'request',
+                                         self.fake_request)
+        self.patcher.start()
+        self.conn = ApiConnection(make_config(username='user', apikey='key',
+                                              auth_url=AUTH_URL,
+                                              revalidate=True),
+                                  ConnectionPool())
+
+    def tearDown(self):
+        self.patcher.stop()
+        TokenCache._memory.clear()
+
+    def fake_request(self, uri, method='GET', **kwargs):
+        if uri == AUTH_URL:
+            return httplib2.Response({'status': '204',
+                                      'x-auth-token': 'token',
+                                      'x-server-management-url':
+                                          MANAGEMENT_URL}), ''
+        headers = kwargs['headers']
+        self.sent.append(headers.get('If-None-Match'))
+        if headers.get('If-None-Match') == self.etag:
+            return httplib2.Response({'status': '304'}), ''
+        return httplib2.Response({'status': '200', 'etag': self.etag}), \
+            self.body
+
+    def test_not_modified(self):
+        resp, first = self.conn.get('/servers')
+        resp, second = self.conn.get('/servers')
+        self.assertEqual(resp.status, 304)
+        self.assertEqual(self.sent, [None, '"1"'])
+        self.assertEqual(second, first)
+
+    def test_each_caller_gets_its_own_body(self):
+        resp, first = self.conn.get('/servers')
+        first['servers'].append({'id': 2})
+        resp, second = self.conn.get('/servers')
+        resp, third = self.conn.get('/servers')
+        self.assertEqual(second, {'servers': [{'id': 1}]})
+        self.assertFalse(third is second)
+
+    def test_modified(self):
+        self.conn.get('/servers')
+        self.body = '{"servers": []}'
+        self.etag = '"2"'
+        resp, body = self.conn.get('/servers')
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(body, {'servers': []})
+        resp, body = self.conn.get('/servers')
+        self.assertEqual(self.sent, [None, '"1"', '"2"'])
+        self.assertEqual(body, {'servers': []})
+
+    def test_nothing_remembered_without_validators(self):
+        self.etag = None
+        self.conn.get('/servers')
+        self.conn.get('/servers')
+        self.assertEqual(self.sent, [None, None])
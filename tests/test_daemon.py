@@ -0,0 +1,108 @@
+import StringIO
+import errno
+import os
+import shutil
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import unittest
+
+from openstack.compute import daemon
+
+
+class EchoDaemon(daemon.SessionDaemon):
+    """
+    Runs "commands" that print their arguments and exit with how many
+    there were.
+    """
+    def run(self, argv, env, cwd):
+        print ' '.join(argv)
+        print >> sys.stderr, env.get('WHO', 'nobody')
+        return len(argv)
+
+
+class SessionDaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'compute.sock')
+        self.streams = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO.StringIO(), StringIO.StringIO()
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.stop()
+        sys.stdout, sys.stderr = self.streams
+        shutil.rmtree(self.dir)
+
+    def start(self, idle_timeout=60):
+        self.server = EchoDaemon(self.path, idle_timeout)
+        self.thread = threading.Thread(target=self.server.serve_until_idle)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.idle_timeout = 0
+        # Wake it up to notice.
+        try:
+            daemon.connect(self.path).close()
+        except socket.error:
+            pass
+        self.thread.join(10)
+        self.assertFalse(self.thread.isAlive())
+        self.server = None
+
+    def test_forward(self):
+        self.start()
+        os.environ['WHO'] = 'me'
+        try:
+            status = daemon.forward(['list', '--all'], self.path)
+        finally:
+            del os.environ['WHO']
+        self.assertEqual(status, 2)
+        self.assertEqual(sys.stdout.getvalue(), 'list --all\n')
+        self.assertEqual(sys.stderr.getvalue(), 'me\n')
+
+    def test_concurrent_commands(self):
+        self.start()
+        statuses = []
+        def forward(i):
+            statuses.append(daemon.forward(['x'] * i, self.path))
+        threads = [threading.Thread(target=forward, args=(i,))
+                   for i in range(1, 6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(sorted(statuses), [1, 2, 3, 4, 5])
+
+    def test_exits_once_idle(self):
+        self.start(idle_timeout=0.2)
+        self.thread.join(10)
+        self.assertFalse(self.thread.isAlive())
+        self.assertFalse(os.path.exists(self.path))
+        self.server = None
+
+    def test_socket_is_private(self):
+        self.start()
+        mode = stat.S_IMODE(os.stat(self.path).st_mode)
+        self.assertEqual(mode & 0077, 0)
+
+    def test_already_running(self):
+        self.start()
+        try:
+            daemon.SessionDaemon(self.path)
+        except socket.error, e:
+            self.assertEqual(e.args[0], errno.EADDRINUSE)
+        else:
+            self.fail("socket.error not raised")
+
+    def test_stale_socket_is_replaced(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        sock.close()
+        self.start()
+        self.assertEqual(daemon.forward(['x'], self.path), 1)
@@ -0,0 +1,93 @@
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+import mock
+
+from openstack.api.exceptions import NotFound
+from openstack.compute.index import NameIndex
+from openstack.compute.servers import ServerManager
+from tests.utils import FakeAPI, things
+
+
+class NameIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'index.json')
+        self.servers = things(2500)
+        self.api = FakeAPI({'/servers': ('servers', self.servers),
+                            '/servers/detail': ('servers', self.servers)})
+        self.requests = self.api.connection.requests
+        self.manager = ServerManager(self.api)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def index(self, **kwargs):
+        return NameIndex(self.api, self.path, **kwargs)
+
+    def listings(self):
+        return len([url for url in self.requests if 'marker' not in url
+                    and url.startswith('/servers?')])
+
+    def test_find(self):
+        server = self.index().find(self.manager, 'thing-2400')
+        self.assertEqual(server.id, 2400)
+        # Three pages of listing, then one GET.
+        self.assertEqual(len(self.requests), 4)
+        self.assertEqual(self.requests[-1], '/servers/2400')
+
+    def test_kept_between_runs(self):
+        self.index().find(self.manager, 'thing-1')
+        del self.requests[:]
+        self.assertEqual(self.index().find(self.manager, 'thing-2').id, 2)
+        self.assertEqual(self.requests, ['/servers/2'])
+
+    def test_readable_by_its_owner_alone(self):
+        self.index().find(self.manager, 'thing-1')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0600)
+
+    def test_new_name_refreshes(self):
+        self.index().find(self.manager, 'thing-1')
+        self.servers.append({'id': 2501, 'name': 'new'})
+        self.assertEqual(self.index().find(self.manager, 'new').id, 2501)
+        self.assertEqual(self.listings(), 2)
+
+    def test_renamed_refreshes(self):
+        self.index().find(self.manager, 'thing-1')
+        self.servers[0]['name'] = 'renamed'
+        self.servers[1]['name'] = 'thing-1'
+        self.assertEqual(self.index().find(self.manager, 'thing-1').id, 2)
+        self.assertEqual(self.listings(), 2)
+
+    def test_missing_refreshes_only_once(self):
+        index = self.index()
+        self.assertRaises(NotFound, index.find, self.manager, 'nonesuch')
+        self.assertRaises(NotFound, index.find, self.manager, 'nonesuch')
+        self.assertEqual(self.listings(), 1)
+
+    def test_refresh_on_first_use(self):
+        self.index().find(self.manager, 'thing-1')
+        self.index(refresh=True).find(self.manager, 'thing-1')
+        self.assertEqual(self.listings(), 2)
+
+    @mock.patch('time.time')
+    def test_expires(self, time):
+        time.return_value = 1000
+        self.index(ttl=300).find(self.manager, 'thing-1')
+        time.return_value = 1299
+        self.index(ttl=300).find(self.manager, 'thing-1')
+        self.assertEqual(self.listings(), 1)
+        time.return_value = 1300
+        self.index(ttl=300).find(self.manager, 'thing-1')
+        self.assertEqual(self.listings(), 2)
+
+    def test_update(self):
+        index = self.index()
+        index.update(self.manager, self.manager.iter_list())
+        del self.requests[:]
+        index.find(self.manager, 'thing-5')
+        self.assertEqual(self.requests, ['/servers/5'])
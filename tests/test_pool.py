@@ -0,0 +1,158 @@
+import threading
+import unittest
+
+import mock
+
+from openstack.api.pool import ConnectionPool
+
+URL = 'http://example.com/v1.0/servers'
+OTHER_URL = 'https://other.example.com/v1.0'
+
+
+def fake_http():
+    http = mock.Mock()
+    http.connections = {'conn': mock.Mock()}
+    return http
+
+
+def closed(http):
+    return not http.connections
+
+
+class PoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher = mock.patch.object(ConnectionPool, '_new_connection',
+                                         side_effect=fake_http)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+
+class ReuseTest(PoolTestCase):
+
+    def test_reuses_released_connections(self):
+        pool = ConnectionPool()
+        http = pool.acquire(URL)
+        pool.release(URL, http)
+        self.assertTrue(pool.acquire(URL) is http)
+
+    def test_hosts_have_their_own_connections(self):
+        pool = ConnectionPool()
+        http = pool.acquire(URL)
+        pool.release(URL, http)
+        self.assertFalse(pool.acquire(OTHER_URL) is http)
+
+    def test_host_is_case_insensitive(self):
+        pool = ConnectionPool()
+        http = pool.acquire(URL)
+        pool.release(URL, http)
+        self.assertTrue(pool.acquire('HTTP://Example.COM/v1.0') is http)
+
+    def test_discarded_connections_are_closed(self):
+        pool = ConnectionPool()
+        http = pool.acquire(URL)
+        pool.release(URL, http, discard=True)
+        self.assertTrue(closed(http))
+        self.assertFalse(pool.acquire(URL) is http)
+
+    def test_clear(self):
+        pool = ConnectionPool()
+        http = pool.acquire(URL)
+        pool.release(URL, http)
+        pool.clear()
+        self.assertTrue(closed(http))
+        self.assertFalse(pool.acquire(URL) is http)
+
+
+class EvictionTest(PoolTestCase):
+
+    def test_least_recently_used_are_evicted_beyond_maxsize(self):
+        pool = ConnectionPool(maxsize=2, max_per_host=0)
+        https = [pool.acquire(URL) for i in range(3)]
+        for http in https:
+            pool.release(URL, http)
+        self.assertTrue(closed(https[0]))
+        self.assertFalse(closed(https[1]))
+        self.assertFalse(closed(https[2]))
+
+    def test_maxsize_is_across_hosts(self):
+        pool = ConnectionPool(maxsize=1)
+        first = pool.acquire(URL)
+        second = pool.acquire(OTHER_URL)
+        pool.release(URL, first)
+        pool.release(OTHER_URL, second)
+        self.assertTrue(closed(first))
+        self.assertFalse(closed(second))
+
+    @mock.patch('time.time')
+    def test_idle_connections_time_out(self, time):
+        pool = ConnectionPool(idle_timeout=60)
+        time.return_value = 1000
+        http = pool.acquire(URL)
+        pool.release(URL, http)
+        time.return_value = 1059
+        self.assertTrue(pool.acquire(URL) is http)
+        pool.release(URL, http)
+        time.return_value = 1120
+        self.assertFalse(pool.acquire(URL) is http)
+        self.assertTrue(closed(http))
+
+    @mock.patch('time.time')
+    def test_zero_idle_timeout_never_times_out(self, time):
+        pool = ConnectionPool(idle_timeout=0)
+        time.return_value = 1000
+        http = pool.acquire(URL)
+        pool.release(URL, http)
+        time.return_value = 10 ** 9
+        self.assertTrue(pool.acquire(URL) is http)
+
+
+class BlockingTest(PoolTestCase):
+
+    def acquire_in_thread(self, pool, url=URL):
+        """
+        Start acquiring a connection in another thread, returning an event
+        set once it has one.
+        """
+        acquired = threading.Event()
+
+        def acquire():
+            pool.acquire(url)
+            acquired.set()
+        thread = threading.Thread(target=acquire)
+        thread.setDaemon(True)
+        thread.start()
+        return acquired
+
+    def test_blocks_at_max_per_host(self):
+        pool = ConnectionPool(max_per_host=2)
+        first = pool.acquire(URL)
+        pool.acquire(URL)
+        acquired = self.acquire_in_thread(pool)
+        acquired.wait(0.2)
+        self.assertFalse(acquired.isSet())
+        pool.release(URL, first)
+        acquired.wait(5)
+        self.assertTrue(acquired.isSet())
+
+    def test_other_hosts_dont_block(self):
+        pool = ConnectionPool(max_per_host=1)
+        pool.acquire(URL)
+        acquired = self.acquire_in_thread(pool, OTHER_URL)
+        acquired.wait(5)
+        self.assertTrue(acquired.isSet())
+
+    def test_zero_max_per_host_never_blocks(self):
+        pool = ConnectionPool(max_per_host=0)
+        for i in range(20):
+            pool.acquire(URL)
+
+    def test_discarding_unblocks(self):
+        pool = ConnectionPool(max_per_host=1)
+        http = pool.acquire(URL)
+        acquired = self.acquire_in_thread(pool)
+        pool.release(URL, http, discard=True)
+        acquired.wait(5)
+        self.assertTrue(acquired.isSet())
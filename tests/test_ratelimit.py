@@ -0,0 +1,131 @@
+import unittest
+
+import mock
+
+from openstack.api.ratelimit import (Limit, RateLimiter, TokenBucket,
+                                     _without_fresh, limits_from_api,
+                                     parse_limits)
+
+
+def describe(limits):
+    return [(l.verb, l.regex, l.value, l.unit, l.bucket.tokens)
+            for l in limits]
+
+
+class ParseLimitsTest(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(parse_limits(None), [])
+        self.assertEqual(parse_limits(''), [])
+        self.assertEqual(parse_limits(' ; '), [])
+
+    def test_limits(self):
+        limits = parse_limits('post:.*:10/minute; GET:^/servers:100/HOUR;')
+        self.assertEqual(describe(limits),
+                         [('POST', '.*', 10, 'MINUTE', 10),
+                          ('GET', '^/servers', 100, 'HOUR', 100)])
+
+    def test_regex_with_colons(self):
+        limits = parse_limits('GET:^/a:b$:5/SECOND')
+        self.assertEqual(describe(limits), [('GET', '^/a:b$', 5, 'SECOND', 5)])
+
+    def test_bad_limits(self):
+        for spec in ('GET', 'GET:.*', 'GET:.*:10', 'GET:.*:ten/MINUTE',
+                     'GET:.*:10/FORTNIGHT', 'GET:.*:10/MINUTE/2'):
+            self.assertRaises(ValueError, parse_limits, spec)
+
+
+class LimitsFromApiTest(unittest.TestCase):
+
+    def test_v1_0(self):
+        body = {'limits': {'rate': [
+            {'verb': 'POST', 'URI': '*', 'regex': '.*', 'value': 10,
+             'unit': 'MINUTE', 'remaining': 2, 'resetTime': 1244425439},
+            {'verb': 'GET', 'URI': '*changes-since*',
+             'regex': 'changes-since', 'value': 3, 'unit': 'MINUTE',
+             'remaining': 3, 'resetTime': 1244511839},
+        ], 'absolute': {'maxTotalRAMSize': 51200}}}
+        self.assertEqual(describe(limits_from_api(body)),
+                         [('POST', '.*', 10, 'MINUTE', 2),
+                          ('GET', 'changes-since', 3, 'MINUTE', 3)])
+
+    def test_v1_1(self):
+        body = {'limits': {'rate': [
+            {'uri': '*', 'regex': '.*', 'limit': [
+                {'verb': 'POST', 'value': 10, 'unit': 'MINUTE',
+                 'remaining': 0, 'next-available': '2011-12-15T22:42:45Z'},
+                {'verb': 'PUT', 'value': 10, 'unit': 'MINUTE'},
+            ]},
+            {'uri': '/servers', 'regex': '^/servers', 'limit': [
+                {'verb': 'POST', 'value': 50, 'unit': 'DAY',
+                 'remaining': 49},
+            ]},
+        ], 'absolute': {}}}
+        self.assertEqual(describe(limits_from_api(body)),
+                         [('POST', '.*', 10, 'MINUTE', 0),
+                          ('PUT', '.*', 10, 'MINUTE', 10),
+                          ('POST', '^/servers', 50, 'DAY', 49)])
+
+    def test_no_limits(self):
+        self.assertEqual(limits_from_api({}), [])
+        self.assertEqual(limits_from_api({'limits': {'absolute': {}}}), [])
+
+
+class WithoutFreshTest(unittest.TestCase):
+
+    def test_without_fresh(self):
+        for path, expected in [
+            ('/servers', '/servers'),
+            ('/servers/detail?fresh=1234.5', '/servers/detail'),
+            ('/servers/detail?changes-since=1234&fresh=1234.5',
+             '/servers/detail?changes-since=1234'),
+            ('/servers?fresh=1&limit=10&marker=5',
+             '/servers?limit=10&marker=5'),
+            ('/servers?refresh=1', '/servers?refresh=1'),
+        ]:
+            self.assertEqual(_without_fresh(path), expected)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_waits_on_matching_limits(self):
+        servers = Limit('GET', '^/servers', 10)
+        changes = Limit('GET', 'changes-since', 10)
+        posts = Limit('POST', '.*', 10)
+        anything = Limit('*', '.*', 10)
+        limiter = RateLimiter([servers, changes, posts, anything])
+        limiter.wait('GET', '/servers/detail?changes-since=1&fresh=2')
+        self.assertEqual([l.bucket.tokens for l in limiter.limits],
+                         [9, 9, 10, 9])
+
+    def test_fresh_alone_doesnt_match(self):
+        limiter = RateLimiter([Limit('GET', 'fresh', 10)])
+        limiter.wait('GET', '/servers/detail?fresh=2')
+        self.assertEqual(limiter.limits[0].bucket.tokens, 10)
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    @mock.patch('time.sleep')
+    @mock.patch('time.time')
+    def test_burst_then_evenly_spaced(self, time, sleep):
+        time.return_value = 1000
+        bucket = TokenBucket(2, 'SECOND')
+        bucket.take()
+        bucket.take()
+        self.assertFalse(sleep.called)
+        bucket.take()
+        sleep.assert_called_with(0.5)
+        bucket.take()
+        sleep.assert_called_with(1.0)
+
+    @mock.patch('time.sleep')
+    @mock.patch('time.time')
+    def test_refills_over_time(self, time, sleep):
+        time.return_value = 1000
+        bucket = TokenBucket(60, 'MINUTE', remaining=0)
+        time.return_value = 1001
+        bucket.take()
+        self.assertFalse(sleep.called)
+        bucket.take()
+        sleep.assert_called_with(1.0)
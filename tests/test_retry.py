@@ -0,0 +1,144 @@
+import time
+import unittest
+
+import mock
+
+from openstack.api.retry import RetryBudget, RetryPolicy, retry_after
+
+
+class Response(dict):
+    def __init__(self, status, headers=None):
+        dict.__init__(self, headers or {})
+        self.status = status
+
+
+class DelayTest(unittest.TestCase):
+
+    def policy(self, retries=3, **kwargs):
+        # A budget big enough not to get in the way.
+        kwargs.setdefault('budget', 1)
+        return RetryPolicy(retries, **kwargs)
+
+    def test_retrying_is_off_by_default(self):
+        self.assertEqual(RetryPolicy().delay('GET', Response(503), '', 0), None)
+
+    def test_only_retryable_statuses(self):
+        policy = self.policy()
+        for status in (400, 401, 404, 409, 501):
+            self.assertEqual(policy.delay('GET', Response(status), '', 0), None)
+        for status in (408, 413, 500, 502, 503, 504):
+            self.assertNotEqual(policy.delay('GET', Response(status), '', 0),
+                                None)
+
+    def test_stops_after_retries(self):
+        policy = self.policy(retries=2)
+        self.assertNotEqual(policy.delay('GET', Response(503), '', 1), None)
+        self.assertEqual(policy.delay('GET', Response(503), '', 2), None)
+
+    def test_non_idempotent_requests_are_not_retried(self):
+        policy = self.policy()
+        self.assertEqual(policy.delay('POST', Response(503), '', 0), None)
+
+    def test_rejected_non_idempotent_requests_are_retried(self):
+        policy = self.policy()
+        self.assertNotEqual(policy.delay('POST', Response(413), '', 0), None)
+
+    def test_caller_can_say_a_request_is_idempotent(self):
+        policy = self.policy()
+        self.assertNotEqual(policy.delay('POST', Response(503), '', 0,
+                                         idempotent=True), None)
+        self.assertEqual(policy.delay('DELETE', Response(503), '', 0,
+                                      idempotent=False), None)
+
+    @mock.patch('random.uniform')
+    def test_backoff_doubles_up_to_max_backoff(self, uniform):
+        uniform.side_effect = lambda low, high: high
+        policy = self.policy(retries=10, backoff=0.5, max_backoff=3)
+        delays = [policy.delay('GET', Response(503), '', attempt)
+                  for attempt in range(5)]
+        self.assertEqual(delays, [0.5, 1, 2, 3, 3])
+        for args, kwargs in uniform.call_args_list:
+            self.assertEqual(args[0], 0)
+
+    def test_retry_after_header_overrides_backoff(self):
+        policy = self.policy(backoff=100)
+        resp = Response(503, {'retry-after': '7'})
+        self.assertEqual(policy.delay('GET', resp, '', 0), 7)
+
+    def test_retry_after_beyond_max_delay_fails(self):
+        policy = self.policy(max_delay=60)
+        resp = Response(503, {'retry-after': '61'})
+        self.assertEqual(policy.delay('GET', resp, '', 0), None)
+
+
+class BudgetTest(unittest.TestCase):
+
+    def test_starts_full(self):
+        budget = RetryBudget(0.1, limit=3)
+        self.assertEqual([budget.withdraw() for i in range(4)],
+                         [True, True, True, False])
+
+    def test_deposits_earn_retries(self):
+        budget = RetryBudget(0.25, limit=1)
+        budget.withdraw()
+        for i in range(3):
+            budget.deposit()
+            self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+
+    def test_savings_are_capped(self):
+        budget = RetryBudget(1, limit=2)
+        for i in range(10):
+            budget.deposit()
+        self.assertEqual(budget.tokens, 2)
+
+    def test_policy_stops_retrying_when_the_budget_runs_out(self):
+        policy = RetryPolicy(retries=3, budget=0.5)
+        policy.budget = RetryBudget(0.5, limit=2)
+        resp = Response(503)
+        # Each new request (attempt 0) deposits half a retry.
+        results = [policy.delay('GET', resp, '', 0) for i in range(4)]
+        self.assertEqual([r is not None for r in results],
+                         [True, True, True, False])
+
+    def test_retries_of_the_same_request_dont_deposit(self):
+        policy = RetryPolicy(retries=10, budget=1)
+        policy.budget = RetryBudget(1, limit=2)
+        resp = Response(503)
+        results = [policy.delay('GET', resp, '', attempt)
+                   for attempt in range(4)]
+        self.assertEqual([r is not None for r in results],
+                         [True, True, False, False])
+
+
+class RetryAfterTest(unittest.TestCase):
+
+    def test_nothing(self):
+        self.assertEqual(retry_after(Response(503), ''), None)
+        self.assertEqual(retry_after(Response(503), {}), None)
+
+    def test_seconds(self):
+        self.assertEqual(retry_after(Response(503, {'retry-after': ' 30 '}),
+                                     ''), 30)
+
+    def test_http_date(self):
+        when = time.strftime('%a, %d %b %Y %H:%M:%S GMT',
+                             time.gmtime(time.time() + 120))
+        delay = retry_after(Response(503, {'retry-after': when}), '')
+        self.assertTrue(115 < delay <= 120, delay)
+
+    def test_http_date_in_the_past(self):
+        resp = Response(503, {'retry-after': 'Sun, 06 Nov 1994 08:49:37 GMT'})
+        self.assertEqual(retry_after(resp, ''), 0)
+
+    def test_over_limit_body(self):
+        when = time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                             time.gmtime(time.time() + 60))
+        body = {'overLimit': {'code': 413, 'retryAfter': when}}
+        delay = retry_after(Response(413), body)
+        self.assertTrue(55 < delay <= 60, delay)
+
+    def test_bad_over_limit_body(self):
+        body = {'overLimit': {'code': 413, 'retryAfter': 'soon'}}
+        self.assertEqual(retry_after(Response(413), body), None)
@@ -0,0 +1,183 @@
+import threading
+import time
+import unittest
+
+from openstack.api.exceptions import NotFound
+from openstack.api.pool import ConnectionPool
+from openstack.compute.servers import ServerIndex, ServerManager
+from tests.utils import FakeAPI, things
+
+
+class ServerIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = things(2500, status='ACTIVE')
+        self.api = FakeAPI({'/servers/detail': ('servers', self.servers)})
+        self.manager = ServerManager(self.api)
+        self.index = self.manager.sync_index()
+
+    def changes(self):
+        return sorted((event, server.id) for (event, server)
+                                         in self.index.refresh())
+
+    def test_full_load(self):
+        self.assertEqual(len(self.index), 2500)
+        self.assertEqual(self.index[2500].name, 'thing-2500')
+        self.assertTrue(2500 in self.index)
+        self.assertFalse(2501 in self.index)
+        self.assertEqual(sorted(s.id for s in self.index), range(1, 2501))
+
+    def test_changes(self):
+        self.servers.append({'id': 2501, 'name': 'new', 'status': 'BUILD'})
+        self.servers[2399]['status'] = 'REBOOT'
+        self.servers[1499]['status'] = 'DELETED'
+        self.assertEqual(self.changes(), [(ServerIndex.ADDED, 2501),
+                                          (ServerIndex.DELETED, 1500),
+                                          (ServerIndex.UPDATED, 2400)])
+        self.assertEqual(len(self.index), 2500)
+        self.assertEqual(self.index[2400].status, 'REBOOT')
+        self.assertEqual(self.changes(), [])
+
+    def test_changes_since(self):
+        requests = self.api.connection.requests
+        del requests[:]
+        self.index.refresh()
+        for url in requests:
+            self.assertTrue('changes-since=' in url, url)
+        self.assertEqual(len(requests), 3)
+
+    def test_reset_drops_servers_gone_for_good(self):
+        del self.servers[10:]
+        self.index.reset()
+        self.assertEqual(len(self.index.refresh()), 2490)
+        self.assertEqual(len(self.index), 10)
+
+    def test_subscribe(self):
+        events = []
+        self.index.subscribe(lambda event, server:
+                             events.append((event, server.id)))
+        self.servers[0]['name'] = 'renamed'
+        self.index.refresh()
+        self.assertEqual(events, [(ServerIndex.UPDATED, 1)])
+
+
+class FindTest(unittest.TestCase):
+
+    def manager(self, **config):
+        self.servers = things(5, status='ACTIVE', imageId=1)
+        self.servers[2]['status'] = 'BUILD'
+        self.servers[3]['imageId'] = 2
+        api = FakeAPI({'/servers/detail': ('servers', self.servers)},
+                      config=config)
+        self.requests = api.connection.requests
+        return ServerManager(api)
+
+    def ids(self, servers):
+        return [server.id for server in servers]
+
+    def test_filters_go_to_the_api(self):
+        manager = self.manager()
+        self.assertEqual(self.ids(manager.findall(name='thing-2')), [2])
+        self.assertEqual(self.requests, ['/servers/detail?name=thing-2'])
+
+    def test_still_matched_exactly(self):
+        # The fake API ignores filters, as a real one may for some.
+        manager = self.manager()
+        self.assertEqual(self.ids(manager.findall(status='ACTIVE')),
+                         [1, 2, 4, 5])
+        self.assertEqual(self.ids(manager.findall(status='ACTIVE',
+                                                  imageId=2)), [4])
+
+    def test_other_attributes_are_matched_here(self):
+        manager = self.manager()
+        self.assertEqual(self.ids(manager.findall(name='thing-3',
+                                                  hostId='nonesuch')), [])
+        self.assertEqual(self.requests, ['/servers/detail?name=thing-3'])
+
+    def test_find(self):
+        manager = self.manager()
+        self.assertEqual(manager.find(name='thing-4').id, 4)
+        self.assertRaises(NotFound, manager.find, name='nonesuch')
+
+    def test_changes_since_only_goes_to_the_api(self):
+        manager = self.manager()
+        self.assertEqual(len(manager.findall(changes_since=1000)), 5)
+        self.assertEqual(self.requests,
+                         ['/servers/detail?changes-since=1000'])
+
+    def test_rackspace_image_filters(self):
+        manager = self.manager(cloud_api='RACKSPACE')
+        self.assertEqual(self.ids(manager.findall(imageId=2)), [4])
+        self.assertEqual(self.requests, ['/servers/detail?imageId=2'])
+        self.assertRaises(TypeError, manager.list, image=2)
+
+    def test_openstack_image_filters(self):
+        manager = self.manager(cloud_api='OPENSTACK')
+        # v1.1 servers' image is a dict, so the matching is the API's.
+        self.assertEqual(len(manager.findall(image=2)), 5)
+        self.assertEqual(self.requests, ['/servers/detail?image=2'])
+        self.assertRaises(TypeError, manager.list, imageId=2)
+
+
+class BulkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeAPI({'/servers/detail': ('servers', things(10))})
+        self.connection = self.api.connection
+        self.manager = ServerManager(self.api)
+
+    def test_results_in_order_with_errors(self):
+        def post(url, body, pool):
+            if url == '/servers/3/action':
+                raise NotFound(404, "No such server")
+        self.connection.on_post = post
+        results = self.manager.bulk('reboot', range(1, 6), concurrency=3)
+        self.assertEqual([server for (server, result, error) in results],
+                         range(1, 6))
+        errors = [error for (server, result, error) in results]
+        self.assertTrue(isinstance(errors[2], NotFound))
+        self.assertEqual(errors[:2] + errors[3:], [None] * 4)
+
+    def test_passes_arguments_along(self):
+        bodies = []
+        self.connection.on_post = lambda url, body, pool: bodies.append(body)
+        self.manager.bulk('reboot', [1], type='HARD')
+        self.assertEqual(bodies, [{'reboot': {'type': 'HARD'}}])
+
+    def test_runs_concurrently_over_a_pool_of_its_own(self):
+        in_flight = []
+        most = []
+        pools = []
+        cond = threading.Condition()
+
+        def post(url, body, pool):
+            cond.acquire()
+            try:
+                pools.append(pool)
+                in_flight.append(url)
+                most.append(len(in_flight))
+                cond.notifyAll()
+                # Hold on until all five are in flight (or give up).
+                deadline = time.time() + 5
+                while len(most) < 5 and time.time() < deadline:
+                    cond.wait(0.1)
+                in_flight.remove(url)
+            finally:
+                cond.release()
+        self.connection.on_post = post
+        self.manager.bulk('reboot', range(1, 11), concurrency=5)
+        self.assertEqual(max(most), 5)
+        pool = pools[0]
+        self.assertTrue(isinstance(pool, ConnectionPool))
+        self.assertEqual(pool.max_per_host, 5)
+        self.assertEqual([p for p in pools if p is not pool], [])
+        self.assertEqual(getattr(self.connection._local, 'pool', None), None)
+
+    def test_fewer_servers_than_concurrency(self):
+        pools = []
+        self.connection.on_post = lambda url, body, pool: pools.append(pool)
+        self.manager.bulk('reboot', [1, 2], concurrency=10)
+        self.assertEqual(pools[0].max_per_host, 2)
+
+    def test_unknown_action(self):
+        self.assertRaises(ValueError, self.manager.bulk, 'get', [1])
@@ -0,0 +1,188 @@
+import StringIO
+import csv
+import sys
+import unittest
+
+from openstack.api.codecs import get_codec
+from openstack.compute.flavors import FlavorManager
+from openstack.compute.images import ImageManager
+from openstack.compute.servers import ServerManager
+from openstack.compute.shell import CommandError, ComputeShell
+from tests.utils import FakeAPI, things
+
+codec = get_codec()
+
+
+class FakeCompute(FakeAPI):
+    """
+    Just enough of a :class:`~openstack.compute.Compute` client for the
+    shell, over a :class:`~tests.utils.FakeConnection`.
+    """
+    def __init__(self, servers):
+        flavors = [{'id': 1, 'name': '256 server', 'ram': 256, 'disk': 10}]
+        images = [{'id': 2, 'name': 'Ubuntu', 'status': 'ACTIVE'}]
+        collections = {}
+        for (name, items) in (('servers', servers), ('flavors', flavors),
+                              ('images', images)):
+            collections['/' + name] = collections['/%s/detail' % name] = \
+                (name, items)
+        FakeAPI.__init__(self, collections,
+                         config={'username': 'user', 'apikey': 'key',
+                                 'index_ttl': 0})
+        self.servers = ServerManager(self)
+        self.flavors = FlavorManager(self)
+        self.images = ImageManager(self)
+
+    def authenticate(self):
+        pass
+
+
+def servers(n):
+    return things(n, status='ACTIVE', flavorId=1, imageId=2,
+                  addresses={'public': ['10.0.0.1'], 'private': []})
+
+
+class ShellTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = servers(3)
+        self.servers[1]['name'] = u'caf\xe9'
+        self.compute = FakeCompute(self.servers)
+
+    def run_shell(self, *argv, **kwargs):
+        """
+        Run a command line, with ``stdin`` as its input, and return what
+        it printed (which is kept in ``self.output`` too, should it exit).
+        """
+        shell = ComputeShell()
+        shell.allow_session = False
+        shell._api_class = lambda **kwargs: self.compute
+        stdin, stdout = sys.stdin, sys.stdout
+        sys.stdin = StringIO.StringIO(kwargs.get('stdin', ''))
+        sys.stdout = output = StringIO.StringIO()
+        try:
+            shell.main(list(argv))
+        finally:
+            sys.stdin, sys.stdout = stdin, stdout
+            self.output = output.getvalue()
+        return self.output
+
+
+class FormatTest(ShellTestCase):
+
+    def test_json(self):
+        output = self.run_shell('--format', 'json', 'list')
+        servers = codec.loads(output)
+        self.assertEqual([s['name'] for s in servers],
+                         [u'thing-1', u'caf\xe9', u'thing-3'])
+        self.assertEqual(servers[0], {'id': 1, 'name': 'thing-1',
+                                      'status': 'ACTIVE',
+                                      'public_ip': '10.0.0.1',
+                                      'private_ip': ''})
+
+    def test_json_keeps_the_fields_in_order(self):
+        output = self.run_shell('--format', 'jsonl', 'list')
+        self.assertTrue(output.startswith(
+            '{"id": 1, "name": "thing-1", "status": "ACTIVE", '
+            '"public_ip": "10.0.0.1", "private_ip": ""}\n'), output)
+
+    def test_jsonl(self):
+        lines = self.run_shell('--format', 'jsonl', 'list').splitlines()
+        self.assertEqual([codec.loads(line)['id'] for line in lines],
+                         [1, 2, 3])
+
+    def test_empty_json(self):
+        del self.servers[:]
+        self.assertEqual(codec.loads(self.run_shell('--format', 'json',
+                                                    'list')), [])
+
+    def test_csv(self):
+        output = self.run_shell('--format', 'csv', 'list')
+        rows = list(csv.reader(StringIO.StringIO(output)))
+        self.assertEqual(rows[0], ['id', 'name', 'status', 'public_ip',
+                                   'private_ip'])
+        self.assertEqual(rows[2], ['2', 'caf\xc3\xa9', 'ACTIVE', '10.0.0.1',
+                                   ''])
+        self.assertEqual(len(rows), 4)
+
+    def test_lists_a_page_at_a_time(self):
+        self.run_shell('--format', 'jsonl', 'list')
+        self.assertEqual(self.compute.connection.requests,
+                         ['/servers/detail?limit=1000'])
+
+    def test_show_json(self):
+        info = codec.loads(self.run_shell('--format', 'json', 'show', '1'))
+        self.assertEqual(info['name'], 'thing-1')
+        self.assertEqual(info['flavor'], '256 server')
+        self.assertEqual(info['image'], 'Ubuntu')
+        self.assertEqual(info['public ip'], '10.0.0.1')
+
+    def test_show_csv(self):
+        output = self.run_shell('--format', 'csv', 'show', '1')
+        rows = list(csv.reader(StringIO.StringIO(output)))
+        self.assertEqual(rows[0], ['property', 'value'])
+        self.assertTrue(['name', 'thing-1'] in rows, rows)
+        self.assertEqual(rows[1:], sorted(rows[1:]))
+
+
+
+class BatchTest(ShellTestCase):
+
+    def batch(self, commands, *argv):
+        """
+        Run ``commands`` as a batch, and return its exit status and its
+        results in line order.
+        """
+        status = 0
+        try:
+            self.run_shell(*(argv + ('batch',)), **{'stdin': commands})
+        except SystemExit, e:
+            status = e.code
+        results = [codec.loads(line) for line in self.output.splitlines()]
+        results.sort(key=lambda result: result['line'])
+        return status, results
+
+    def test_runs_each_command(self):
+        status, results = self.batch('show 1\n'
+                                     '\n'
+                                     '# A comment\n'
+                                     'reboot --hard 2\n'
+                                     '["show", "3"]\n', '--format', 'json')
+        self.assertEqual(status, 0)
+        self.assertEqual([(r['line'], r['command'], r['status'])
+                          for r in results],
+                         [(1, ['show', '1'], 0),
+                          (4, ['reboot', '--hard', '2'], 0),
+                          (5, ['show', '3'], 0)])
+        self.assertEqual(codec.loads(results[0]['stdout'])['name'],
+                         'thing-1')
+        self.assertEqual(results[1]['stdout'], '')
+        self.assertEqual(codec.loads(results[2]['stdout'])['name'],
+                         'thing-3')
+        self.assertTrue('/servers/2/action' in self.compute.connection.requests)
+
+    def test_failures(self):
+        status, results = self.batch('show 99\n'
+                                     'list\n'
+                                     'show "unclosed\n'
+                                     'nonesuch\n'
+                                     'batch\n'
+                                     'reboot\n', '--format', 'jsonl')
+        self.assertEqual(status, 1)
+        self.assertEqual([r['status'] for r in results], [1, 0, 1, 1, 1, 2])
+        self.assertEqual(results[2]['command'], ['show "unclosed'])
+        self.assertTrue(results[2]['stderr'].startswith("Can't parse line"))
+        self.assertTrue("can't be run in a batch" in results[4]['stderr'])
+        self.assertEqual(len(results[1]['stdout'].splitlines()), 3)
+
+    def test_concurrency(self):
+        commands = ''.join('show %d\n' % (i % 3 + 1) for i in range(20))
+        status, results = self.batch(commands, '--format', 'json')
+        self.assertEqual(status, 0)
+        self.assertEqual([r['line'] for r in results], range(1, 21))
+        for (i, result) in enumerate(results):
+            self.assertEqual(codec.loads(result['stdout'])['id'], i % 3 + 1)
+
+    def test_bad_concurrency(self):
+        self.assertRaises(CommandError, self.run_shell, 'batch',
+                          '--concurrency', '0')
@@ -0,0 +1,96 @@
+import random
+import unittest
+
+from openstack.api.codecs import get_codec
+from openstack.api.streaming import iter_items
+
+codec = get_codec()
+
+# Strings with the characters that could throw the parser: JSON structure,
+# quotes, escapes and non-ASCII.
+STRINGS = [u'', u'web1', u'a "quoted" name', u'back\\slash', u'[not, a list]',
+           u'{"not": "an object"}', u'tab\tnew\nline', u'caf\xe9 \u2603',
+           u'trailing \\', u',', u']', u'}']
+
+
+def random_value(rng, depth=0):
+    kind = rng.randint(0, depth < 3 and 7 or 4)
+    if kind == 0:
+        return rng.choice(STRINGS)
+    if kind == 1:
+        return rng.randint(-10 ** 6, 10 ** 6)
+    if kind == 2:
+        return rng.uniform(-1000, 1000)
+    if kind == 3:
+        return rng.choice([True, False, None])
+    if kind == 4:
+        return rng.choice(STRINGS) + unicode(rng.randint(0, 99))
+    if kind == 5:
+        return [random_value(rng, depth + 1)
+                for i in range(rng.randint(0, 4))]
+    obj = {}
+    for i in range(rng.randint(0, 4)):
+        obj[rng.choice(STRINGS + [u'servers', u'id'])] = \
+            random_value(rng, depth + 1)
+    return obj
+
+
+def random_document(rng):
+    items = [random_value(rng) for i in range(rng.randint(0, 30))]
+    doc = {u'servers': items}
+    # Other keys, some of them holding decoy lists, before and after it.
+    for i in range(rng.randint(0, 3)):
+        doc[u'other%d' % i] = random_value(rng)
+    if rng.random() < 0.3:
+        doc[u'nested'] = {u'servers': [1, 2, 3]}
+    return doc
+
+
+def random_chunks(rng, text):
+    chunks = []
+    pos = 0
+    while pos < len(text):
+        size = rng.choice([1, 1, 2, 3, 7, 64, 4096])
+        chunks.append(text[pos:pos + size])
+        pos += size
+    return chunks
+
+
+class IterItemsTest(unittest.TestCase):
+
+    def test_matches_loads_on_randomly_chunked_documents(self):
+        rng = random.Random(1234)
+        for i in range(300):
+            doc = random_document(rng)
+            if rng.random() < 0.5:
+                text = codec.dumps(doc)
+            else:
+                text = codec.dumps(doc, indent=rng.randint(0, 4))
+            expected = codec.loads(text)[u'servers']
+            chunks = random_chunks(rng, text)
+            items = list(iter_items(chunks, [('servers',)], codec.loads))
+            self.assertEqual(items, expected,
+                             "Mismatch parsing %r in %r" % (text, chunks))
+
+    def test_nested_path(self):
+        text = '{"tenants": {"values": [{"id": 1}, {"id": 2}], "links": []}}'
+        items = iter_items(random_chunks(random.Random(1), text),
+                           [('servers',), ('tenants', 'values')], codec.loads)
+        self.assertEqual(list(items), [{'id': 1}, {'id': 2}])
+
+    def test_no_array_at_path(self):
+        text = '{"other": [1, 2], "servers": {"id": 1}}'
+        self.assertEqual(list(iter_items([text], [('servers',)], codec.loads)),
+                         [])
+
+    def test_consumes_the_rest_of_the_chunks(self):
+        chunks = iter(['{"servers": [1, 2]', ', "more": [3]', '}'])
+        self.assertEqual(list(iter_items(chunks, [('servers',)], codec.loads)),
+                         [1, 2])
+        self.assertEqual(list(chunks), [])
+
+    def test_truncated_document(self):
+        items = iter_items(['{"servers": [{"id": 1}, {"id"'], [('servers',)],
+                           codec.loads)
+        self.assertEqual(items.next(), {'id': 1})
+        self.assertRaises(ValueError, items.next)
@@ -0,0 +1,172 @@
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+
+from openstack.api.codecs import get_codec
+from openstack.api.tokencache import TokenCache
+
+AUTH_URL = 'https://auth.example.com/v1.0'
+MANAGEMENT_URL = 'https://servers.example.com/v1.0/1234'
+KEY = 'secret'
+
+
+class TokenCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # Tokens are shared by every cache in the process; start afresh.
+        TokenCache._memory.clear()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'openstack', 'tokens.json')
+
+    def tearDown(self):
+        TokenCache._memory.clear()
+        shutil.rmtree(self.directory)
+
+    def set(self, cache, token='token', username='user', expires=3600):
+        cache.set(AUTH_URL, username, KEY, token, MANAGEMENT_URL,
+                  time.time() + expires)
+
+    def get(self, cache, username='user', apikey=KEY, **kwargs):
+        return cache.get(AUTH_URL, username, apikey, **kwargs)
+
+    def token(self, cache, username='user', apikey=KEY):
+        entry = self.get(cache, username, apikey)
+        return entry and entry[0]
+
+    def saved(self):
+        f = open(self.path)
+        try:
+            return get_codec().loads(f.read())
+        finally:
+            f.close()
+
+
+class MemoryTest(TokenCacheTestCase):
+
+    def test_get_what_was_set(self):
+        cache = TokenCache()
+        expires = time.time() + 3600
+        cache.set(AUTH_URL, 'user', KEY, 'token', MANAGEMENT_URL, expires)
+        self.assertEqual(self.get(cache), ('token', MANAGEMENT_URL, expires))
+        self.assertEqual(self.get(cache, 'other'), None)
+        self.assertEqual(cache.get(AUTH_URL + '/', 'user', KEY), None)
+
+    def test_keyed_by_api_key(self):
+        cache = TokenCache()
+        self.set(cache)
+        self.assertEqual(self.token(cache, apikey='wrong'), None)
+        self.assertEqual(self.token(cache, apikey=None), None)
+        self.assertEqual(self.token(cache, apikey=u'secret'), 'token')
+
+    def test_api_key_isnt_kept(self):
+        cache = TokenCache()
+        self.set(cache)
+        for key in TokenCache._memory:
+            self.assertFalse(KEY in key, key)
+
+    def test_shared_between_caches(self):
+        self.set(TokenCache())
+        self.assertEqual(self.token(TokenCache()), 'token')
+
+    def test_expired(self):
+        cache = TokenCache()
+        self.set(cache, expires=-1)
+        self.assertEqual(self.get(cache), None)
+
+    def test_margin(self):
+        cache = TokenCache()
+        self.set(cache, expires=100)
+        self.assertNotEqual(self.get(cache, margin=90), None)
+        self.assertEqual(self.get(cache, margin=110), None)
+
+    def test_invalidate(self):
+        cache = TokenCache()
+        self.set(cache)
+        cache.invalidate(AUTH_URL, 'user', KEY, 'token')
+        self.assertEqual(self.get(cache), None)
+
+    def test_invalidate_leaves_a_newer_token(self):
+        cache = TokenCache()
+        self.set(cache, 'new')
+        cache.invalidate(AUTH_URL, 'user', KEY, 'old')
+        self.assertEqual(self.token(cache), 'new')
+
+    def test_invalidate_leaves_other_users(self):
+        cache = TokenCache()
+        self.set(cache)
+        self.set(cache, username='other')
+        cache.invalidate(AUTH_URL, 'user', KEY, 'token')
+        self.assertEqual(self.token(cache, 'other'), 'token')
+
+
+class FileTest(TokenCacheTestCase):
+
+    def test_read_by_other_processes(self):
+        expires = time.time() + 3600
+        TokenCache(self.path).set(AUTH_URL, 'user', KEY, 'token',
+                                  MANAGEMENT_URL, expires)
+        # As if in a new process.
+        TokenCache._memory.clear()
+        self.assertEqual(self.get(TokenCache(self.path)),
+                         ('token', MANAGEMENT_URL, expires))
+        TokenCache._memory.clear()
+        self.assertEqual(self.get(TokenCache(self.path), apikey='wrong'),
+                         None)
+
+    def test_api_key_isnt_saved(self):
+        self.set(TokenCache(self.path))
+        f = open(self.path)
+        try:
+            self.assertFalse(KEY in f.read())
+        finally:
+            f.close()
+
+    def test_readable_only_by_owner(self):
+        self.set(TokenCache(self.path))
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0600)
+        self.assertEqual(
+            stat.S_IMODE(os.stat(os.path.dirname(self.path)).st_mode), 0700)
+
+    def test_expired_tokens_are_dropped_from_the_file(self):
+        cache = TokenCache(self.path)
+        self.set(cache, username='old', expires=-1)
+        self.set(cache)
+        self.assertEqual(len(self.saved()), 1)
+
+    def test_invalidate_removes_from_the_file(self):
+        cache = TokenCache(self.path)
+        self.set(cache)
+        cache.invalidate(AUTH_URL, 'user', KEY, 'token')
+        self.assertEqual(self.saved(), {})
+        TokenCache._memory.clear()
+        self.assertEqual(self.get(cache), None)
+
+    def test_invalidate_leaves_a_newer_token_in_the_file(self):
+        cache = TokenCache(self.path)
+        self.set(cache, 'old')
+        # Another process replaces the token...
+        TokenCache._memory.clear()
+        self.set(TokenCache(self.path), 'new')
+        TokenCache._memory.clear()
+        # ...before this one finds out the old one was revoked.
+        cache.invalidate(AUTH_URL, 'user', KEY, 'old')
+        self.assertEqual(self.token(cache), 'new')
+
+    def test_unreadable_file(self):
+        os.makedirs(os.path.dirname(self.path))
+        f = open(self.path, 'w')
+        f.write('{"not json')
+        f.close()
+        cache = TokenCache(self.path)
+        self.assertEqual(self.get(cache), None)
+        self.set(cache)
+        self.assertEqual(len(self.saved()), 1)
+
+    def test_unwritable_directory(self):
+        cache = TokenCache(os.path.join(self.directory, 'file', 'tokens.json'))
+        open(os.path.join(self.directory, 'file'), 'w').close()
+        self.set(cache)
+        self.assertEqual(self.token(cache), 'token')
@@ -0,0 +1,108 @@
+import threading
+import urlparse
+
+from openstack.api import base
+from openstack.api.codecs import get_codec
+from openstack.api.config import Config
+from openstack.api.exceptions import NotFound
+# Imported for its Python 2.4 urlparse.parse_qsl fix.
+from openstack.api import connection
+
+
+def make_config(**overrides):
+    # A non-empty env, so nothing is read from the real environment.
+    return Config('/dev/null', {'OPENSTACK_COMPUTE_TESTING': '1'}, overrides)
+
+
+class FakeConnection(object):
+    """
+    Serves GETs of collections of dicts from memory, paging them with
+    ``limit`` and ``marker`` as the API does, and remembers every URL asked
+    for in ``requests``.
+
+    :param collections: Maps each path to a ``(response_key, items)`` pair.
+    :param max_limit: The most items sent back at once.
+    :param honor_marker: Set False to act like an API that ignores
+                         ``marker``.
+    """
+    def __init__(self, collections, max_limit=1000, honor_marker=True):
+        self.collections = collections
+        self.max_limit = max_limit
+        self.honor_marker = honor_marker
+        self.codec = get_codec()
+        self.observers = []
+        self.requests = []
+        self.on_post = None
+        self._local = threading.local()
+
+    def use_pool(self, pool):
+        self._local.pool = pool
+
+    def post(self, url, body=None, **kwargs):
+        """
+        Record the POST, along with the pool the calling thread would use,
+        then pass it on to ``on_post`` if set.
+        """
+        self.requests.append(url)
+        if self.on_post:
+            self.on_post(url, body, getattr(self._local, 'pool', None))
+        return {'status': '202'}, None
+
+    def get(self, url, **kwargs):
+        self.requests.append(url)
+        path, query = urlparse.urlsplit(url)[2:4]
+        params = dict(urlparse.parse_qsl(query))
+        if path not in self.collections:
+            return self._get_one(path)
+        response_key, items = self.collections[path]
+        items = [dict(item) for item in items]
+        if 'marker' in params and self.honor_marker:
+            ids = [str(item['id']) for item in items]
+            items = items[ids.index(params['marker']) + 1:]
+        limit = min(int(params.get('limit', self.max_limit)), self.max_limit)
+        return {'status': '200'}, {response_key: items[:limit]}
+
+    def _get_one(self, path):
+        collection, id = path.rsplit('/', 1)
+        response_key, items = self.collections[collection]
+        for item in items:
+            if str(item['id']) == id:
+                return {'status': '200'}, {response_key[:-1]: dict(item)}
+        raise NotFound(404, "Not found")
+
+    def stream(self, url, **kwargs):
+        resp, body = self.get(url, **kwargs)
+        text = self.codec.dumps(body)
+        return [text[i:i + 7] for i in range(0, len(text), 7)]
+
+
+class FakeAPI(object):
+    def __init__(self, collections, **kwargs):
+        self.config = make_config(**kwargs.pop('config', {}))
+        self.connection = FakeConnection(collections, **kwargs)
+
+
+class Thing(base.Resource):
+    pass
+
+
+class ThingManager(base.ManagerWithFind):
+    resource_class = Thing
+
+    def get(self, thing):
+        return self._get('/things/%s' % base.getid(thing), 'thing')
+
+    def list(self):
+        return self._list('/things', 'things')
+
+    def iter_list(self, page_size=None):
+        return self._iter_list('/things', 'things', page_size)
+
+
+def things(n, **extra):
+    items = []
+    for i in range(1, n + 1):
+        item = {'id': i, 'name': 'thing-%d' % i}
+        item.update(extra)
+        items.append(item)
+    return items